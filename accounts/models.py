@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
@@ -63,6 +64,16 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_role_display()}"
 
+    def save(self, *args, **kwargs):
+        # Newly assigned avatar: strip EXIF, shrink and re-encode before storing
+        if self.avatar and not self.avatar._committed:
+            from config.images import recompress_image
+
+            recompressed = recompress_image(self.avatar.file, max_pixels=settings.AVATAR_MAX_PIXELS)
+            if recompressed is not None:
+                self.avatar.save(recompressed.name, recompressed, save=False)
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.user.first_name} {self.user.last_name}".strip() or self.user.username
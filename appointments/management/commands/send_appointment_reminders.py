@@ -7,6 +7,8 @@ Business rules:
 - Only for CONFIRMED or RESCHEDULED appointments with reminders_enabled=True
 - Never sends on appointment day (even if <24h away) — missed window
 - Records every attempt in AppointmentSMSLog
+- Sends to the stored Patient.phone_e164; invalid numbers are logged as FAILED
+  without calling the provider
 - Safety cap to prevent mass accidental sends
 
 Designed to run as a Render Cron Job at 16:00 UTC (= 17:00 Africa/Kinshasa).
@@ -135,6 +137,12 @@ class Command(BaseCommand):
         total_candidates = candidates.count()
         self.stdout.write(f"Found {total_candidates} candidate(s) from DB query")
 
+        invalid_phones = candidates.filter(patient__phone_e164__isnull=True).count()
+        if invalid_phones:
+            self.stdout.write(
+                self.style.WARNING(f"{invalid_phones} candidate(s) have a missing or invalid phone number")
+            )
+
         if total_candidates == 0:
             self.stdout.write(self.style.SUCCESS("No reminders to send."))
             return
@@ -189,20 +197,38 @@ class Command(BaseCommand):
                 failed_count += 1
                 continue
 
+            # phone_e164 is normalized on Patient.save; NULL means the stored number is invalid
+            if not patient.phone_e164:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"  Invalid phone {mask_phone(phone_raw)} for {patient} (appt #{appointment.id})"
+                    )
+                )
+                AppointmentSMSLog.objects.create(
+                    appointment=appointment,
+                    phone=phone_raw,
+                    provider="africastalking",
+                    status="FAILED",
+                    message_id="",
+                    error_message="Patient phone number is invalid",
+                )
+                failed_count += 1
+                continue
+
             # --- Build message ---
             scheduled_local = appointment.scheduled_at.astimezone(clinic_tz)
             message = build_sms_message(patient, scheduled_local, appointment.doctor)
 
-            masked = mask_phone(phone_raw)
+            masked = mask_phone(patient.phone_e164)
             self.stdout.write(f"  Sending reminder to {patient} at {masked}...")
 
             # --- Send SMS ---
-            result = send_sms(phone_raw, message)
+            result = send_sms(patient.phone_e164, message)
 
             # --- Log attempt ---
             AppointmentSMSLog.objects.create(
                 appointment=appointment,
-                phone=result.get("phone_normalised") or phone_raw,
+                phone=result.get("phone_normalised") or patient.phone_e164,
                 provider=result.get("provider", "africastalking"),
                 status="SUCCESS" if result["ok"] else "FAILED",
                 message_id=result.get("message_id") or "",
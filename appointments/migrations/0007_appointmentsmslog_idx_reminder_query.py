@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointmentsmslog_alter_appointment_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSMSLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(help_text='E.164 phone number sent to', max_length=30)),
+                ('provider', models.CharField(default='africastalking', max_length=30)),
+                ('status', models.CharField(choices=[('SUCCESS', 'Success'), ('FAILED', 'Failed')], max_length=10)),
+                ('message_id', models.CharField(blank=True, default='', help_text='Provider message ID for delivery tracking', max_length=100)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['reminders_enabled', 'reminder_sent_at', 'scheduled_at', 'status'], name='idx_reminder_query'),
+        ),
+        migrations.AddField(
+            model_name='appointmentsmslog',
+            name='appointment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_logs', to='appointments.appointment'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentsmslog',
+            index=models.Index(fields=['appointment', 'status'], name='appointment_appoint_0f4406_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_appointmentsmslog_idx_reminder_query'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', '-scheduled_at', 'id'], name='appt_patient_sched_id_idx'),
+        ),
+    ]
@@ -61,6 +61,8 @@ class Appointment(models.Model):
         indexes = [
             models.Index(fields=["scheduled_at"]),
             models.Index(fields=["status"]),
+            # Per-patient pages (patient chart, timeline)
+            models.Index(fields=["patient", "-scheduled_at", "id"], name="appt_patient_sched_id_idx"),
             # Optimise the daily reminder query
             models.Index(
                 fields=["reminders_enabled", "reminder_sent_at", "scheduled_at", "status"],
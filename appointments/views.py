@@ -57,6 +57,8 @@ class DoctorListAPIView(APIView):
 class AppointmentListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Stable ordering for ?cursor= pagination
+    cursor_ordering = ("-scheduled_at", "id")
 
     def get_queryset(self):
         """
@@ -0,0 +1,178 @@
+# config/downloads.py
+"""
+File download helpers.
+
+- presigned_url(): short-lived signed URL on the R2 (S3) bucket, so the
+  client downloads straight from storage instead of through a gunicorn worker.
+- ranged_file_response(): local (FileSystemStorage) serving with ETag /
+  If-None-Match (304) and single-range Range / If-Range (206) support, so
+  slow mobile clients can resume interrupted downloads.
+- zip_stream(): ZIP archive generated on the fly from storage, block by
+  block, for StreamingHttpResponse.
+"""
+
+import posixpath
+import re
+import zipfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def presigned_url(fieldfile, filename, content_type, expires_in=None, as_attachment=True):
+    """Signed GET URL that makes R2 answer with our filename / content type."""
+    expires_in = expires_in or settings.FILE_URL_EXPIRY_SECONDS
+    return fieldfile.storage.url(
+        fieldfile.name,
+        parameters={
+            "ResponseContentDisposition": content_disposition_header(as_attachment, filename),
+            "ResponseContentType": content_type,
+        },
+        expire=expires_in,
+    )
+
+
+def _parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single "bytes=" range, None to serve
+    the whole file (absent / multi-range / malformed), or False if unsatisfiable.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(fh, start, length):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = fh.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        fh.close()
+
+
+def ranged_file_response(request, fieldfile, filename, content_type, etag, as_attachment=True):
+    """
+    Serve ``fieldfile`` honouring If-None-Match, Range and If-Range.
+
+    ``etag`` must change whenever the file content changes; it is quoted here.
+    """
+    etag = quote_etag(etag)
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*"):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    size = fieldfile.size
+    byte_range = _parse_range(request.headers.get("Range", ""), size)
+    if_range = request.headers.get("If-Range")
+    if byte_range is not None and if_range and if_range.strip() != etag:
+        # The client's partial copy is stale: send the whole file again
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        response = FileResponse(fieldfile.open("rb"), content_type=content_type)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(fieldfile.open("rb"), start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    # Medical documents: browser cache only, always revalidated with the ETag
+    response["Cache-Control"] = "private, no-cache"
+    response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+class _ZipSink:
+    """
+    Write-only, non-seekable output for zipfile: it then writes each entry's
+    sizes and CRC in a trailing data descriptor instead of seeking back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def unique_arcname(name, seen):
+    """Archive member name unique within ``seen`` ("scan.pdf", "scan (2).pdf")."""
+    stem, ext = posixpath.splitext(name)
+    candidate, counter = name, 1
+    while candidate in seen:
+        counter += 1
+        candidate = f"{stem} ({counter}){ext}"
+    seen.add(candidate)
+    return candidate
+
+
+def zip_stream(entries):
+    """
+    Yield a ZIP archive of ``entries`` — (arcname, fieldfile, size, datetime)
+    tuples — without temporary files: memory holds one STREAM_BLOCK_SIZE
+    block at a time whatever the archive size. Members are stored
+    uncompressed (scans, photos and PDFs are compressed already); ZIP64 is
+    used for members over 4 GiB.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, fieldfile, size, modified in entries:
+            info = zipfile.ZipInfo(arcname, date_time=modified.timetuple()[:6])
+            # Lets zipfile pick ZIP64 up front (it cannot seek back later)
+            info.file_size = size
+            with fieldfile.storage.open(fieldfile.name, "rb") as source, archive.open(info, "w") as member:
+                for block in iter(lambda: source.read(STREAM_BLOCK_SIZE), b""):
+                    member.write(block)
+                    yield sink.drain()
+            # Data descriptor
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
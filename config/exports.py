@@ -0,0 +1,140 @@
+# config/exports.py
+"""
+Streaming CSV / NDJSON exports (ministry reporting, full table dumps).
+
+An export is a values() projection iterated with .iterator(chunk_size=...)
+and encoded line by line into a StreamingHttpResponse: no model instances,
+no serializers and no buffered pages, so memory stays flat whatever the
+table size. On PostgreSQL .iterator() uses a server-side cursor. CSV text
+cells that Excel would run as a formula are prefixed with a quote.
+
+Common query params:
+- ?file_format=csv|ndjson   (default csv; ?format= is reserved by DRF)
+- ?date_from=YYYY-MM-DD     inclusive
+- ?date_to=YYYY-MM-DD       inclusive
+- ?doctor=<user_id>
+"""
+
+import csv
+import json
+import re
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+EXPORT_FORMAT_PARAM = "file_format"
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+# Excel runs cells starting with these as formulas (CSV injection)
+_CSV_FORMULA_PREFIXES = ("=", "@", "\t", "\r")
+# ... and these too, unless the cell is a plain number or phone ("+243 81 234 5678", "-2")
+_CSV_SIGN_PREFIXES = ("+", "-")
+_CSV_NUMBER_OR_PHONE = re.compile(r"^[+-]?[\d\s().]+$")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and (
+        value.startswith(_CSV_FORMULA_PREFIXES)
+        or (value.startswith(_CSV_SIGN_PREFIXES) and not _CSV_NUMBER_OR_PHONE.match(value))
+    ):
+        # Free text (complaints, plans, addresses) is typed by users: force it to text
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows, headers):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens accented French text correctly
+    yield "\ufeff" + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[h]) for h in headers])
+
+
+def _ndjson_lines(rows, headers):
+    for row in rows:
+        yield json.dumps({h: row[h] for h in headers}, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def _parse_day(request, param):
+    raw = request.query_params.get(param)
+    if not raw:
+        return None
+    try:
+        day = parse_date(raw)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({param: "Use the YYYY-MM-DD format."})
+    return day
+
+
+def export_filters(request, date_field, doctor_field):
+    """
+    Translate ?date_from / ?date_to / ?doctor into filter kwargs.
+
+    Date bounds are turned into datetimes (not a __date lookup) so the
+    filter can use the index on ``date_field``.
+    """
+    filters = {}
+
+    date_from = _parse_day(request, "date_from")
+    if date_from:
+        filters[f"{date_field}__gte"] = timezone.make_aware(datetime.combine(date_from, time.min))
+
+    date_to = _parse_day(request, "date_to")
+    if date_to:
+        filters[f"{date_field}__lt"] = timezone.make_aware(
+            datetime.combine(date_to + timedelta(days=1), time.min)
+        )
+
+    doctor = request.query_params.get("doctor")
+    if doctor:
+        if not doctor.isdigit():
+            raise ValidationError({"doctor": "Must be a user id."})
+        filters[doctor_field] = int(doctor)
+
+    return filters
+
+
+def export_response(request, queryset, columns, filename):
+    """
+    Stream ``queryset`` as CSV or NDJSON.
+
+    ``columns`` is a sequence of (header, lookup) pairs, e.g.
+    ("patient_code", "patient__patient_code"); the header is also the NDJSON key.
+    """
+    fmt = request.query_params.get(EXPORT_FORMAT_PARAM, "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValidationError({EXPORT_FORMAT_PARAM: f"Use one of: {', '.join(EXPORT_FORMATS)}."})
+
+    headers = [header for header, _ in columns]
+    fields = [header for header, lookup in columns if header == lookup]
+    expressions = {header: F(lookup) for header, lookup in columns if header != lookup}
+    rows = queryset.values(*fields, **expressions).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    lines = _csv_lines(rows, headers) if fmt == "csv" else _ndjson_lines(rows, headers)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[fmt])
+    stamp = timezone.localdate().isoformat()
+    response["Content-Disposition"] = f'attachment; filename="{filename}-{stamp}.{fmt}"'
+    return response
@@ -0,0 +1,89 @@
+# config/images.py
+"""
+Upload-time image recompression (patient files, avatars).
+
+Camera JPEGs and PNG screenshots are re-encoded before they are stored:
+
+- EXIF (GPS position, device, timestamps) is dropped after applying its
+  orientation; the ICC colour profile is kept
+- images above a pixel cap are downsized
+- images too large to decode safely in a request worker (over
+  IMAGE_UPLOAD_MAX_SOURCE_PIXELS after JPEG draft scaling) are kept as is
+- the result is WebP: lossy at a quality target for photos (JPEG sources),
+  lossless for PNG sources so text in screenshots stays sharp
+
+Anything that is not a decodable JPEG/PNG is left untouched.
+"""
+
+import math
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+RECOMPRESSIBLE_FORMATS = {"JPEG", "PNG"}
+OUTPUT_CONTENT_TYPE = "image/webp"
+
+
+def _fit_size(width, height, max_pixels):
+    if width * height <= max_pixels:
+        return None
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def recompress_image(uploaded, max_pixels=None, quality=None):
+    """
+    Re-encode an uploaded image. Returns a ContentFile named "<stem>.webp",
+    or None when the upload should be stored as is (not a JPEG/PNG,
+    undecodable, or re-encoding would not help).
+    """
+    max_pixels = max_pixels or settings.IMAGE_UPLOAD_MAX_PIXELS
+    quality = quality or settings.IMAGE_UPLOAD_QUALITY
+
+    try:
+        uploaded.seek(0)
+        image = Image.open(uploaded)
+        source_format = image.format
+        if source_format not in RECOMPRESSIBLE_FORMATS:
+            return None
+
+        had_exif = bool(image.getexif())
+        icc_profile = image.info.get("icc_profile")
+        target = _fit_size(image.width, image.height, max_pixels)
+        if target:
+            # JPEG: decode directly at a reduced scale when possible
+            image.draft("RGB", target)
+        # Checked before anything decodes: a big PNG would be decoded in full
+        if image.width * image.height > settings.IMAGE_UPLOAD_MAX_SOURCE_PIXELS:
+            return None
+        image = ImageOps.exif_transpose(image)
+        if target:
+            image.thumbnail(target, Image.Resampling.LANCZOS)
+
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        buffer = BytesIO()
+        options = {"method": 4}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if source_format == "PNG":
+            options["lossless"] = True
+        else:
+            options["quality"] = quality
+        image.save(buffer, "WEBP", **options)
+    except Exception:
+        # Not an image Pillow can handle (or a decompression bomb): keep as uploaded
+        return None
+    finally:
+        uploaded.seek(0)
+
+    if not target and not had_exif and buffer.tell() >= uploaded.size:
+        return None
+
+    stem = os.path.splitext(os.path.basename(uploaded.name or "image"))[0]
+    return ContentFile(buffer.getvalue(), name=f"{stem}.webp")
@@ -1,4 +1,52 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(values, reverse=False):
+    """Opaque keyset cursor: the ordering values of the boundary row."""
+    payload = json.dumps({"v": values, "r": int(reverse)}, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload["v"]), bool(payload.get("r"))
+    except (ValueError, TypeError, KeyError):
+        raise NotFound("Invalid cursor.")
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Rows strictly after ``values`` in ``ordering`` (before, when reverse):
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+    Fields prefixed with "-" are descending.
+    """
+    clauses = []
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != reverse
+        clauses.append(Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value}))
+        equal[name] = value
+    return reduce(or_, clauses)
+
+
+def keyset_values(obj, ordering):
+    return [getattr(obj, field.lstrip("-")) for field in ordering]
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
 
 
 class FlexiblePageNumberPagination(PageNumberPagination):
@@ -7,7 +55,103 @@ class FlexiblePageNumberPagination(PageNumberPagination):
     - Default: 10 items per page
     - Max: 500 items per page
     - Query param: ?page_size=50
+
+    Two opt-in modes for deep history, neither of which runs COUNT(*):
+    - ?cursor=       keyset pagination on the view's ``cursor_ordering``
+                     (stable at any depth; ?ordering= is ignored)
+    - ?count=false   page numbers without the total count
     """
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 500
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    default_cursor_ordering = ("id",)
+
+    mode = "page"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if self.cursor_query_param in request.query_params:
+            self.mode = "cursor"
+            return self.paginate_keyset(queryset, request, view)
+        if request.query_params.get(self.count_query_param, "").lower() == "false":
+            self.mode = "nocount"
+            return self.paginate_without_count(queryset, request)
+        self.mode = "page"
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == "page":
+            return super().get_paginated_response(data)
+        return Response({
+            "next": self.next_link,
+            "previous": self.previous_link,
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["required"] = ["results"]
+        return response_schema
+
+    # -- ?count=false -----------------------------------------------------
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            number = max(1, int(request.query_params.get(self.page_query_param, 1)))
+        except ValueError:
+            raise NotFound("Invalid page.")
+
+        offset = (number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        url = request.build_absolute_uri()
+        self.next_link = replace_query_param(url, self.page_query_param, number + 1) if has_next else None
+        if number <= 1:
+            self.previous_link = None
+        elif number == 2:
+            self.previous_link = remove_query_param(url, self.page_query_param)
+        else:
+            self.previous_link = replace_query_param(url, self.page_query_param, number - 1)
+        return rows
+
+    # -- ?cursor= -----------------------------------------------------------
+    def get_cursor_ordering(self, view):
+        return tuple(getattr(view, "cursor_ordering", None) or self.default_cursor_ordering)
+
+    def paginate_keyset(self, queryset, request, view):
+        page_size = self.get_page_size(request)
+        ordering = self.get_cursor_ordering(view)
+        token = request.query_params.get(self.cursor_query_param, "")
+
+        reverse = False
+        if token:
+            values, reverse = decode_cursor(token)
+            if len(values) != len(ordering):
+                raise NotFound("Invalid cursor.")
+            queryset = queryset.filter(keyset_filter(ordering, values, reverse))
+
+        queryset = queryset.order_by(*(reverse_ordering(ordering) if reverse else ordering))
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        url = request.build_absolute_uri()
+        self.next_link = None
+        self.previous_link = None
+        if rows:
+            first = encode_cursor(keyset_values(rows[0], ordering), reverse=True)
+            last = encode_cursor(keyset_values(rows[-1], ordering))
+            # A forward page has a previous page unless it is the first one;
+            # a backward page always has a next page
+            if (has_more and not reverse) or (reverse and token):
+                self.next_link = replace_query_param(url, self.cursor_query_param, last)
+            if (has_more and reverse) or (token and not reverse):
+                self.previous_link = replace_query_param(url, self.cursor_query_param, first)
+        return rows
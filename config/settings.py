@@ -140,6 +140,7 @@ INSTALLED_APPS = [
     "visits",
     "prescriptions",
     "appointments",
+    "documents",
 ]
 
 # =============================================================================
@@ -196,6 +197,10 @@ DATABASES = {
 
 print(f"[SETTINGS] DB engine: {DATABASES['default'].get('ENGINE', 'unknown')}", file=sys.stderr)
 
+# Trigram lookups used by patient search (patients/search.py) on PostgreSQL
+if DATABASES["default"].get("ENGINE") == "django.db.backends.postgresql":
+    INSTALLED_APPS.append("django.contrib.postgres")
+
 # =============================================================================
 # AUTH
 # =============================================================================
@@ -240,6 +245,37 @@ STATICFILES_DIRS = []
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Chunked upload sessions (/api/patients/<id>/uploads/) for large files
+PATIENT_FILE_UPLOAD_MAX_SIZE = int(os.getenv("PATIENT_FILE_UPLOAD_MAX_SIZE", 500 * 1024 * 1024))  # 500MB
+# Suggested chunk size; also the S3/R2 minimum multipart part size
+PATIENT_FILE_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # 5MB
+
+# Thumbnails for uploaded files (patients.services.previews): rendered in a
+# small in-process thread pool after commit; False renders inline (tests, scripts)
+PATIENT_FILE_PREVIEWS_ASYNC = os.getenv("PATIENT_FILE_PREVIEWS_ASYNC", "true").lower() == "true"
+PATIENT_FILE_PREVIEW_WORKERS = int(os.getenv("PATIENT_FILE_PREVIEW_WORKERS", "2"))
+
+# Uploaded JPEG/PNG images are re-encoded to WebP without EXIF (config.images)
+# unless the upload sets preserve_original. Larger images are downsized.
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", 12_000_000))  # ~4000x3000
+IMAGE_UPLOAD_QUALITY = int(os.getenv("IMAGE_UPLOAD_QUALITY", "82"))  # lossy WebP quality for photos
+# Images that would still decode to more pixels than this are stored as uploaded
+IMAGE_UPLOAD_MAX_SOURCE_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_SOURCE_PIXELS", 50_000_000))
+AVATAR_MAX_PIXELS = 512 * 512
+
+# Rendered prescription / visit summary PDFs kept in the Django cache
+# (documents.cache), keyed on a hash of their content
+PDF_CACHE_TIMEOUT = int(os.getenv("PDF_CACHE_TIMEOUT", 7 * 24 * 3600))  # 7 days
+# POST .../pdf/jobs/ renders in a pool of worker processes (documents.jobs);
+# False renders inline after commit (tests, scripts)
+PDF_RENDER_ASYNC = os.getenv("PDF_RENDER_ASYNC", "true").lower() == "true"
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Most documents bound into one batch PDF (day sheet, patient dossier)
+PDF_BATCH_MAX_DOCUMENTS = int(os.getenv("PDF_BATCH_MAX_DOCUMENTS", "200"))
+# Batch and job PDFs larger than this are spooled to a temporary file on disk
+# while they stream out (documents.builders.render_spooled)
+PDF_SPOOL_MAX_MEMORY = int(os.getenv("PDF_SPOOL_MAX_MEMORY", str(1024 * 1024)))  # 1 MB
+
 # =============================================================================
 # STORAGES - Django 4.2+ unified configuration
 # =============================================================================
@@ -248,10 +284,14 @@ R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
 R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "clinicflow")
 R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
+R2_ENABLED = bool(R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY and R2_ENDPOINT_URL)
+
+# Lifetime of presigned R2 download URLs (patient file downloads redirect there)
+FILE_URL_EXPIRY_SECONDS = int(os.getenv("FILE_URL_EXPIRY_SECONDS", "300"))
 
 # Use simpler static files storage that doesn't require manifest
 # CompressedManifestStaticFilesStorage can fail if manifest is missing
-if R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY and R2_ENDPOINT_URL:
+if R2_ENABLED:
     STORAGES = {
         "default": {
             "BACKEND": "storages.backends.s3.S3Storage",
@@ -27,6 +27,7 @@ urlpatterns = [
     path("api/visits/", include("visits.urls")),
     path("api/prescriptions/", include("prescriptions.urls")),
     path("api/appointments/", include("appointments.urls")),
+    path("api/documents/", include("documents.urls")),
 ]
 
 # Serve media files in development
@@ -0,0 +1,77 @@
+# documents/batch.py
+"""
+Several documents bound into one PDF: the day's prescriptions for the
+pharmacy printer, every visit summary of a patient for a referral.
+
+One query set (items, vitals and doctors prefetched), one ReportLab build
+with the shared styles, a page break between documents, and a streamed
+response instead of N requests and N renders. The PDF is spooled to a
+temporary file (builders.render_spooled), not held in memory, while it is
+sent.
+
+Query params (at least one):
+- ?ids=1,2,3
+- ?patient=<patient_id>
+- ?date_from=YYYY-MM-DD / ?date_to=YYYY-MM-DD   inclusive (config.exports)
+- ?doctor=<user_id>
+"""
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from config.exports import export_filters
+
+from .blocks import Doctor
+from .builders import combined_flowables, render_spooled
+from .cache import pdf_file_response
+
+
+def _id_param(request, param):
+    raw = request.query_params.get(param, "")
+    values = [value.strip() for value in raw.split(",") if value.strip()]
+    if not all(value.isdigit() for value in values):
+        raise ValidationError({param: "Must be a comma-separated list of ids."})
+    return [int(value) for value in values]
+
+
+def batch_filters(request, date_field, doctor_field):
+    """Filter kwargs from the batch query params; ValidationError when none is given."""
+    filters = export_filters(request, date_field, doctor_field)
+    ids = _id_param(request, "ids")
+    if ids:
+        filters["pk__in"] = ids
+    patients = _id_param(request, "patient")
+    if len(patients) > 1:
+        raise ValidationError({"patient": "Must be a single patient id."})
+    if patients:
+        filters["patient_id"] = patients[0]
+    if not filters:
+        raise ValidationError({"detail": "Select documents with ids, patient, date_from / date_to or doctor."})
+    return filters
+
+
+def bounded(queryset):
+    """The documents of ``queryset``, refusing batches over PDF_BATCH_MAX_DOCUMENTS."""
+    documents = list(queryset[:settings.PDF_BATCH_MAX_DOCUMENTS + 1])
+    if len(documents) > settings.PDF_BATCH_MAX_DOCUMENTS:
+        raise ValidationError({
+            "detail": f"More than {settings.PDF_BATCH_MAX_DOCUMENTS} documents match; narrow the filters."
+        })
+    return documents
+
+
+class DoctorCache:
+    """Doctor blocks by user, built once per batch."""
+
+    def __init__(self):
+        self._doctors = {}
+
+    def get(self, user):
+        if user.pk not in self._doctors:
+            self._doctors[user.pk] = Doctor.from_user(user)
+        return self._doctors[user.pk]
+
+
+def batch_response(stories, filename):
+    """Render the stories (one list of flowables per document) as one streamed PDF."""
+    return pdf_file_response(render_spooled(combined_flowables(stories)), filename)
@@ -0,0 +1,101 @@
+# documents/blocks.py
+"""
+Reusable pieces of a clinical document, each a list of flowables:
+doctor header, title, patient table, text sections, prescriber box and
+signature lines. Builders (documents.builders) stack them.
+"""
+
+from reportlab.platypus import Paragraph, Spacer, Table
+
+from .styles import info_table_style, paragraph_styles, signature_table_style
+
+
+class Doctor:
+    """What a document shows about the signing doctor (from User + UserProfile)."""
+
+    def __init__(self, name, specialty="", bio="", license_number="", clinic_address=""):
+        self.name = name
+        self.specialty = specialty
+        self.bio = bio
+        self.license_number = license_number
+        self.clinic_address = clinic_address
+
+    @classmethod
+    def from_user(cls, user):
+        profile = getattr(user, "profile", None)
+        display_name = getattr(profile, "display_name", "") or ""
+        name = display_name
+        if not name:
+            name = f"Dr. {user.first_name} {user.last_name}".strip()
+            if name == "Dr.":
+                name = f"Dr. {user.username}"
+        return cls(
+            name=name,
+            specialty=getattr(profile, "specialization", "") or "",
+            bio=getattr(profile, "bio", "") or "",
+            license_number=getattr(profile, "license_number", "") or "",
+            clinic_address=getattr(profile, "clinic_address", "") or "",
+        )
+
+
+def lines(text):
+    """Non-empty lines of a multiline text field."""
+    return [line for line in (text or "").split('\n') if line.strip()]
+
+
+def doctor_header(doctor):
+    """Name, specialty and bio lines at the top left."""
+    styles = paragraph_styles()
+    content = [Paragraph(doctor.name, styles.doctor_name)]
+    if doctor.specialty:
+        content.append(Paragraph(doctor.specialty.upper(), styles.specialty))
+    # Additional bio info - for things like certifications, clinic hours
+    for line in lines(doctor.bio):
+        content.append(Paragraph(line.strip(), styles.doctor_info))
+    content.append(Spacer(1, 15))
+    return content
+
+
+def title(text):
+    return [Paragraph(text, paragraph_styles().title), Spacer(1, 10)]
+
+
+def patient_table(rows, col_widths, padding):
+    """Four-column label / value table (labels in columns 0 and 2)."""
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(info_table_style(padding, (0, 2)))
+    return [table, Spacer(1, 15)]
+
+
+def info_table(rows, col_widths):
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(info_table_style())
+    return [table]
+
+
+def text_section(heading, text, style="content"):
+    """A heading followed by one paragraph per line of ``text``; [] when empty."""
+    paragraphs = lines(text)
+    if not paragraphs:
+        return []
+    styles = paragraph_styles()
+    body = getattr(styles, style)
+    return [Paragraph(heading, styles.heading)] + [Paragraph(line, body) for line in paragraphs]
+
+
+def prescriber_block(doctor, date_text, t):
+    """Doctor, licence, date and clinic address box above the signature."""
+    rows = [[t["prescriber"], doctor.name]]
+    if doctor.license_number:
+        rows.append([t["license"], doctor.license_number])
+    rows.append([t["date"], date_text])
+    if doctor.clinic_address:
+        # Multiline address on a single line
+        rows.append([t["location"], ", ".join(line.strip() for line in lines(doctor.clinic_address))])
+    return [Spacer(1, 30)] + info_table(rows, [100, 200])
+
+
+def signature_block(t):
+    table = Table([["_" * 35, "_" * 25], [t["signature"], t["stamp"]]], colWidths=[200, 150])
+    table.setStyle(signature_table_style())
+    return [Spacer(1, 20), table]
@@ -0,0 +1,293 @@
+# documents/builders.py
+"""
+PDF documents, assembled from documents.blocks with the shared styles.
+
+*_flowables() return the story of one document so several can be bound
+into a single file (combined_flowables, documents.batch); *_pdf() render
+one document to bytes.
+
+ReportLab lays the whole file out in memory and hands it to its output in a
+single write(). render() keeps that one bytes object instead of copying it
+out of a BytesIO; render_spooled() moves it into a temporary file that goes
+to disk past PDF_SPOOL_MAX_MEMORY, so a long dossier is not held in memory
+while it streams to the client or to storage.
+"""
+
+from datetime import date
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table
+
+from . import blocks
+from .styles import grid_table_style, paragraph_styles
+
+# Bump when the layout of a document changes: cached PDFs (documents.cache) are keyed on it
+DOCUMENT_VERSION = 1
+
+# Labels (French only)
+PRESCRIPTION_PDF_TRANSLATIONS = {
+    "title": "ORDONNANCE MÉDICALE",
+    "first_name": "Prénom :",
+    "last_name": "Nom :",
+    "age": "Âge :",
+    "weight": "Poids :",
+    "years": "ans",
+    "months": "mois",
+    "code": "Code :",
+    "visit_date": "Date de visite :",
+    "prescription_num": "Ordonnance N° :",
+    "created": "Créée le :",
+    "prescriber": "Prescripteur :",
+    "license": "N°COM :",
+    "department": "Service :",
+    "specialty": "Spécialité :",
+    "medications": "Médicaments",
+    "med_num": "N°",
+    "medication": "Médicament",
+    "dosage": "Posologie",
+    "route": "Voie",
+    "frequency": "Fréquence",
+    "duration": "Durée",
+    "instructions": "Instructions",
+    "no_medications": "Aucun médicament listé.",
+    "additional_notes": "Notes supplémentaires",
+    "signature": "Signature du prescripteur",
+    "date": "Date :",
+    "location": "Lieu :",
+    "stamp": "Cachet",
+}
+
+VISIT_PDF_TRANSLATIONS = {
+    "title": "RÉSUMÉ DE CONSULTATION",
+    "patient": "Patient :",
+    "code": "Code :",
+    "visit_date": "Date de visite :",
+    "visit_type": "Type :",
+    "chief_complaint": "Motif de consultation",
+    "medical_history": "Antécédents médicaux",
+    "history_present_illness": "Histoire de la maladie",
+    "physical_exam": "Examen physique",
+    "complementary_exam": "Examens complémentaires",
+    "assessment": "Diagnostic / Évaluation",
+    "plan": "Plan de traitement",
+    "treatment": "Traitement",
+    "notes": "Notes supplémentaires",
+    "vitals": "Signes vitaux",
+    "temperature": "Température",
+    "blood_pressure": "Tension artérielle",
+    "heart_rate": "Fréquence cardiaque",
+    "respiratory_rate": "Fréquence respiratoire",
+    "oxygen_saturation": "Saturation O2",
+    "weight": "Poids",
+    "height": "Taille",
+    "prescriber": "Médecin :",
+    "license": "N°COM :",
+    "date": "Date :",
+    "location": "Lieu :",
+    "signature": "Signature du médecin",
+    "stamp": "Cachet",
+    "consultation": "Consultation",
+    "follow_up": "Suivi",
+}
+
+
+class _PdfSink:
+    """Write target keeping ReportLab's output as is (no getvalue() copy)."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+
+def render_to(flowables, output):
+    """Lay out ``flowables`` on A4 pages into the file-like ``output``."""
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        rightMargin=20*mm,
+        leftMargin=20*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm,
+    )
+    doc.build(flowables)
+
+
+def render(flowables):
+    """The PDF bytes of ``flowables``."""
+    sink = _PdfSink()
+    render_to(flowables, sink)
+    return sink.chunks[0] if len(sink.chunks) == 1 else b"".join(sink.chunks)
+
+
+def render_spooled(flowables):
+    """The PDF of ``flowables`` in a temporary file, rewound; the caller closes it."""
+    spool = SpooledTemporaryFile(max_size=settings.PDF_SPOOL_MAX_MEMORY)
+    try:
+        render_to(flowables, spool)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def patient_age(birth_date, t, today=None):
+    """"7 ans", or "14 mois" under two years."""
+    today = today or date.today()
+    years = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    if years < 2:
+        months = (today.year - birth_date.year) * 12 + today.month - birth_date.month
+        if today.day < birth_date.day:
+            months -= 1
+        return f"{months} {t['months']}"
+    return f"{years} {t['years']}"
+
+
+def combined_flowables(stories):
+    """Several documents in one story, each starting on a new page."""
+    content = []
+    for story in stories:
+        if content:
+            content.append(PageBreak())
+        content += story
+    return content
+
+
+def latest_vitals(visit):
+    # Batches prefetch the vitals (ordered newest first) instead of one query per document
+    if "vital_signs" in getattr(visit, "_prefetched_objects_cache", {}):
+        return next(iter(visit.vital_signs.all()), None)
+    return visit.vital_signs.order_by("-measured_at").first()
+
+
+def prescription_flowables(rx, doctor):
+    t = PRESCRIPTION_PDF_TRANSLATIONS
+    styles = paragraph_styles()
+    patient = rx.patient
+    created_date = rx.created_at.strftime("%d/%m/%Y %H:%M") if rx.created_at else "-"
+
+    age = patient_age(patient.date_of_birth, t) if patient.date_of_birth else "-"
+    weight = "-"
+    vitals = latest_vitals(rx.visit) if rx.visit_id else None
+    if vitals and vitals.weight_kg is not None:
+        weight = f"{vitals.weight_kg} kg"
+
+    content = blocks.doctor_header(doctor) + blocks.title(t["title"])
+    content += blocks.patient_table(
+        [
+            [t["first_name"], patient.first_name, t["last_name"], patient.last_name],
+            [t["age"], age, t["weight"], weight],
+            [t["created"], created_date, "", ""],
+        ],
+        col_widths=[70, 140, 70, 120],
+        padding=5,
+    )
+
+    content.append(Paragraph(t["medications"], styles.heading))
+    items = list(rx.items.all())
+    if items:
+        rows = [[t["med_num"], t["medication"], t["dosage"], t["route"], t["frequency"], t["duration"]]]
+        for i, item in enumerate(items, 1):
+            rows.append([
+                str(i),
+                str(item.medication) if item.medication else "-",
+                item.dosage or "-",
+                item.route or "-",
+                item.frequency or "-",
+                item.duration or "-",
+            ])
+        table = Table(rows, colWidths=[25, 200, 80, 60, 90, 60])
+        table.setStyle(grid_table_style())
+        content.append(table)
+
+        if any(item.instructions for item in items):
+            content.append(Spacer(1, 10))
+            content.append(Paragraph(t["instructions"], styles.heading))
+            for i, item in enumerate(items, 1):
+                if item.instructions:
+                    name = str(item.medication) if item.medication else f"Item {i}"
+                    content.append(Paragraph(f"<b>{name}:</b> {item.instructions}", styles.normal))
+    else:
+        content.append(Paragraph(t["no_medications"], styles.normal))
+
+    notes = blocks.text_section(t["additional_notes"], rx.notes, style="normal")
+    if notes:
+        content += [Spacer(1, 15)] + notes
+
+    content += blocks.prescriber_block(doctor, created_date, t)
+    content += blocks.signature_block(t)
+    return content
+
+
+def prescription_pdf(rx, doctor):
+    return render(prescription_flowables(rx, doctor))
+
+
+def _vitals_rows(vitals, t):
+    rows = []
+    if vitals.temperature_c is not None:
+        rows.append([t["temperature"], f"{vitals.temperature_c} °C"])
+    if vitals.bp_systolic is not None and vitals.bp_diastolic is not None:
+        rows.append([t["blood_pressure"], f"{vitals.bp_systolic}/{vitals.bp_diastolic} mmHg"])
+    if vitals.heart_rate_bpm is not None:
+        rows.append([t["heart_rate"], f"{vitals.heart_rate_bpm} bpm"])
+    if vitals.respiratory_rate_rpm is not None:
+        rows.append([t["respiratory_rate"], f"{vitals.respiratory_rate_rpm} rpm"])
+    if vitals.oxygen_saturation_pct is not None:
+        rows.append([t["oxygen_saturation"], f"{vitals.oxygen_saturation_pct}%"])
+    if vitals.weight_kg is not None:
+        rows.append([t["weight"], f"{vitals.weight_kg} kg"])
+    if vitals.height_cm is not None:
+        rows.append([t["height"], f"{vitals.height_cm} cm"])
+    return rows
+
+
+def visit_summary_flowables(visit, doctor):
+    t = VISIT_PDF_TRANSLATIONS
+    styles = paragraph_styles()
+    patient = visit.patient
+    visit_date = visit.visit_date.strftime("%d/%m/%Y %H:%M") if visit.visit_date else "-"
+    visit_type = t["consultation"] if visit.visit_type == "CONSULTATION" else t["follow_up"]
+
+    content = blocks.doctor_header(doctor) + blocks.title(t["title"])
+    content += blocks.patient_table(
+        [
+            [t["patient"], f"{patient.first_name} {patient.last_name}", t["code"], patient.patient_code or "-"],
+            [t["visit_date"], visit_date, t["visit_type"], visit_type],
+        ],
+        col_widths=[90, 150, 70, 90],
+        padding=6,
+    )
+
+    content += blocks.text_section(t["chief_complaint"], visit.chief_complaint)
+    content += blocks.text_section(t["medical_history"], visit.medical_history)
+    content += blocks.text_section(t["history_present_illness"], visit.history_of_present_illness)
+    content += blocks.text_section(t["physical_exam"], visit.physical_exam)
+    content += blocks.text_section(t["complementary_exam"], visit.complementary_exam)
+
+    vitals = latest_vitals(visit)
+    if vitals:
+        content.append(Paragraph(t["vitals"], styles.heading))
+        rows = _vitals_rows(vitals, t)
+        if rows:
+            content += blocks.info_table(rows, [150, 100])
+
+    content += blocks.text_section(t["assessment"], visit.assessment)
+    content += blocks.text_section(t["plan"], visit.plan)
+    content += blocks.text_section(t["treatment"], visit.treatment)
+    content += blocks.text_section(t["notes"], visit.notes)
+
+    date_text = visit.visit_date.strftime("%d/%m/%Y") if visit.visit_date else "-"
+    content += blocks.prescriber_block(doctor, date_text, t)
+    content += blocks.signature_block(t)
+    return content
+
+
+def visit_summary_pdf(visit, doctor):
+    return render(visit_summary_flowables(visit, doctor))
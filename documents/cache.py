@@ -0,0 +1,122 @@
+# documents/cache.py
+"""
+Cache of rendered PDFs, keyed on a hash of everything the document shows.
+
+A prescription rarely changes after signing but is downloaded again and
+again (doctor, pharmacy, reprints). Each document gets a fingerprint: a
+SHA-256 of its rows' updated_at, the item rows, the patient fields and
+derived values printed on it (age, weight), the doctor's header fields and
+builders.DOCUMENT_VERSION. The fingerprint costs a few small queries and no
+layout; it is both the cache key check and the HTTP ETag:
+
+- If-None-Match matching the fingerprint: 304, nothing rendered or read
+- cached PDF with the same fingerprint: served from the Django cache
+- otherwise: rendered, stored (one entry per document), served
+
+Any change to an input changes the fingerprint, so a stale PDF is never
+served. Signals on Prescription, PrescriptionItem, Visit and VitalSign
+also drop the entry right away (invalidate()) to free the cache.
+
+The cached bytes are streamed as they are (pdf_file_response): no second
+copy of the PDF per request.
+"""
+
+import hashlib
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from .builders import DOCUMENT_VERSION, PRESCRIPTION_PDF_TRANSLATIONS, latest_vitals, patient_age
+
+VITAL_FIELDS = (
+    "id", "temperature_c", "bp_systolic", "bp_diastolic", "heart_rate_bpm",
+    "respiratory_rate_rpm", "oxygen_saturation_pct", "weight_kg", "height_cm",
+)
+
+
+def cache_key(kind, pk):
+    return f"documents:pdf:{kind}:{pk}"
+
+
+def invalidate(kind, pk):
+    if pk is not None:
+        cache.delete(cache_key(kind, pk))
+
+
+def _hash(kind, *parts):
+    payload = json.dumps([DOCUMENT_VERSION, kind, *parts], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _patient_parts(patient):
+    age = patient_age(patient.date_of_birth, PRESCRIPTION_PDF_TRANSLATIONS) if patient.date_of_birth else None
+    return [patient.pk, patient.first_name, patient.last_name, patient.patient_code, age]
+
+
+def _doctor_parts(doctor):
+    return [doctor.name, doctor.specialty, doctor.bio, doctor.license_number, doctor.clinic_address]
+
+
+def _vitals_parts(visit):
+    vitals = latest_vitals(visit) if visit is not None else None
+    return [getattr(vitals, field) for field in VITAL_FIELDS] if vitals else None
+
+
+def prescription_fingerprint(rx, doctor):
+    items = list(
+        rx.items.order_by("id").values_list(
+            "id", "medication__name", "medication__strength", "medication__form",
+            "dosage", "route", "frequency", "duration", "instructions",
+        )
+    )
+    return _hash(
+        "prescription", rx.pk, rx.updated_at, items,
+        _patient_parts(rx.patient), _vitals_parts(rx.visit), _doctor_parts(doctor),
+    )
+
+
+def visit_summary_fingerprint(visit, doctor):
+    return _hash(
+        "visit_summary", visit.pk, visit.updated_at,
+        _patient_parts(visit.patient), _vitals_parts(visit), _doctor_parts(doctor),
+    )
+
+
+def cached_pdf(kind, pk, fingerprint, render):
+    """The PDF for ``fingerprint``, rendered with ``render()`` on a miss."""
+    key = cache_key(kind, pk)
+    entry = cache.get(key)
+    if entry and entry[0] == fingerprint:
+        return entry[1]
+    pdf = render()
+    cache.set(key, (fingerprint, pdf), settings.PDF_CACHE_TIMEOUT)
+    return pdf
+
+
+def pdf_response(request, kind, pk, fingerprint, render, filename):
+    """Attachment response honouring If-None-Match, served from the cache when possible."""
+    etag = quote_etag(fingerprint)
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and etag in parse_etags(if_none_match):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    # BytesIO over bytes shares the buffer until written to: no copy
+    response = pdf_file_response(BytesIO(cached_pdf(kind, pk, fingerprint, render)), filename)
+    response["ETag"] = etag
+    # Medical documents: browser cache only, always revalidated with the ETag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def pdf_file_response(file, filename):
+    """
+    Stream the seekable PDF ``file`` as an attachment; FileResponse sets
+    Content-Length from its size and closes it once sent.
+    """
+    return FileResponse(file, as_attachment=True, filename=filename, content_type="application/pdf")
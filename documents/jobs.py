@@ -0,0 +1,155 @@
+# documents/jobs.py
+"""
+PDF rendering outside the request/response cycle.
+
+A ReportLab build is pure CPU: inside a gunicorn worker it holds the GIL and
+the worker serves nothing else until the PDF is done, so an end-of-day burst
+of prints stalls the API. POST .../pdf/jobs/ instead records a PdfRenderJob
+and, once the transaction commits, hands its id to a ProcessPoolExecutor.
+Each pool process (documents.worker) sets Django up once and renders jobs
+with its own database connection; the API worker only polls the job row.
+
+- a document whose PDF is already stored (same fingerprint) is returned
+  done, without queuing anything
+- PDF_RENDER_ASYNC=False renders inline after commit (tests, scripts)
+- jobs left pending by a restart or a broken pool are swept up by the
+  render_pdf_jobs command, which can also run as a separate worker
+
+GET .../pdf/ stays synchronous and cached (documents.cache): small one-off
+documents do not need the round trip.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from prescriptions.models import Prescription
+from visits.models import Visit
+
+from . import builders, worker
+from .blocks import Doctor
+from .cache import prescription_fingerprint, visit_summary_fingerprint
+from .models import PdfRenderJob
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentType:
+    """How to load, fingerprint, lay out and name one kind of document."""
+
+    def __init__(self, queryset, fingerprint, flowables, filename):
+        self.queryset = queryset
+        self.fingerprint = fingerprint
+        self.flowables = flowables
+        self.filename = filename
+
+    def load(self, object_id):
+        return self.queryset().get(pk=object_id)
+
+
+DOCUMENT_TYPES = {
+    "prescription": DocumentType(
+        lambda: Prescription.objects.select_related("patient", "visit").prefetch_related("items__medication"),
+        prescription_fingerprint,
+        builders.prescription_flowables,
+        lambda pk: f"ordonnance_{pk}.pdf",
+    ),
+    "visit_summary": DocumentType(
+        lambda: Visit.objects.select_related("patient"),
+        visit_summary_fingerprint,
+        builders.visit_summary_flowables,
+        lambda pk: f"resume_visite_{pk}.pdf",
+    ),
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn, not fork: a forked child would share the parent's database sockets
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=worker.init,
+        )
+    return _executor
+
+
+def enqueue(kind, obj, doctor_user, requested_by):
+    """
+    Job rendering ``obj`` (a Prescription or Visit) with ``doctor_user``'s
+    header. Reuses the requester's finished job of an unchanged document.
+    """
+    fingerprint = DOCUMENT_TYPES[kind].fingerprint(obj, Doctor.from_user(doctor_user))
+    finished = (
+        PdfRenderJob.objects
+        .filter(kind=kind, object_id=obj.pk, fingerprint=fingerprint, requested_by=requested_by, status="done")
+        .exclude(file="")
+        .first()
+    )
+    if finished:
+        return finished
+
+    job = PdfRenderJob.objects.create(
+        kind=kind,
+        object_id=obj.pk,
+        doctor=doctor_user,
+        requested_by=requested_by,
+        fingerprint=fingerprint,
+    )
+    if settings.PDF_RENDER_ASYNC:
+        transaction.on_commit(lambda: _submit(job.pk))
+    else:
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+def _submit(job_id):
+    global _executor
+    try:
+        _get_executor().submit(worker.render_job, job_id)
+    except (BrokenProcessPool, RuntimeError):
+        # A pool process died: start a fresh pool next time, the sweep picks this job up
+        logger.exception("PDF render pool unavailable, job %s left pending", job_id)
+        _executor = None
+
+
+def run_job(job_id):
+    """Render one pending job; returns it (None if another worker took it)."""
+    claimed = PdfRenderJob.objects.filter(pk=job_id, status="pending").update(
+        status="running", started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    job = PdfRenderJob.objects.get(pk=job_id)
+    document = DOCUMENT_TYPES[job.kind]
+    try:
+        obj = document.load(job.object_id)
+        doctor = Doctor.from_user(get_user_model().objects.select_related("profile").get(pk=job.doctor_id))
+        # The document may have changed since the job was queued
+        job.fingerprint = document.fingerprint(obj, doctor)
+        # Uploaded from the spooled file in chunks, not from one bytes object
+        with builders.render_spooled(document.flowables(obj, doctor)) as pdf:
+            job.file.save(document.filename(obj.pk), File(pdf), save=False)
+    except Exception as exc:
+        logger.warning("PDF render failed for job %s", job_id, exc_info=True)
+        job.status = "failed"
+        job.error = str(exc) or exc.__class__.__name__
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        return job
+
+    job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["fingerprint", "file", "status", "finished_at"])
+    return job
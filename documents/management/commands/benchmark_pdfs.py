@@ -0,0 +1,123 @@
+"""
+Management command to measure PDF rendering cost.
+
+Renders the same prescription and visit summary repeatedly in two modes:
+
+- cold: styles, table styles and assets rebuilt for every PDF, as the
+  prescription and visit views did before documents.styles
+- warm: built once per process and shared (what the views do now)
+
+and reports per-PDF CPU time (time.process_time) and allocations
+(tracemalloc: peak memory allocated while rendering one PDF).
+
+Usage:
+    python manage.py benchmark_pdfs
+    python manage.py benchmark_pdfs --iterations 200
+    python manage.py benchmark_pdfs --prescription 12 --visit 40
+"""
+
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import builders
+from documents.blocks import Doctor
+from documents.styles import clear_caches
+from prescriptions.models import Prescription
+from visits.models import Visit
+
+
+class Command(BaseCommand):
+    help = "Compare per-PDF CPU time and allocations with and without shared styles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="PDFs rendered per document and mode",
+        )
+        parser.add_argument(
+            "--prescription",
+            type=int,
+            default=None,
+            help="Prescription id (default: the latest)",
+        )
+        parser.add_argument(
+            "--visit",
+            type=int,
+            default=None,
+            help="Visit id (default: the latest)",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        if iterations < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        documents = []
+        rx = self._get(
+            Prescription.objects.select_related("patient", "visit", "prescriber").prefetch_related("items__medication"),
+            options["prescription"],
+        )
+        if rx is not None:
+            prescriber = Doctor.from_user(rx.prescriber or get_user_model().objects.order_by("pk").first())
+            documents.append(("prescription", lambda: builders.prescription_pdf(rx, prescriber)))
+        visit = self._get(Visit.objects.select_related("patient", "created_by"), options["visit"])
+        if visit is not None and visit.created_by is not None:
+            author = Doctor.from_user(visit.created_by)
+            documents.append(("visit summary", lambda: builders.visit_summary_pdf(visit, author)))
+        if not documents:
+            raise CommandError("Nothing to render: create a prescription or a visit first.")
+
+        for name, render in documents:
+            render()  # Warm-up: imports, fonts, database connection
+            cold = self._measure(render, iterations, cold=True)
+            warm = self._measure(render, iterations, cold=False)
+            self.stdout.write(f"{name} ({iterations} PDFs per mode)")
+            for label, result in (("cold", cold), ("warm", warm)):
+                self.stdout.write(
+                    f"  {label}:  {result['cpu_ms']:.2f} ms CPU, {result['peak_kb']:.0f} KB peak allocations per PDF"
+                )
+            self.stdout.write(f"  CPU time saved: {100 * (1 - warm['cpu_ms'] / cold['cpu_ms']):.0f}%")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
+
+    def _get(self, queryset, pk):
+        if pk is None:
+            return queryset.order_by("-pk").first()
+        obj = queryset.filter(pk=pk).first()
+        if obj is None:
+            raise CommandError(f"{queryset.model.__name__} {pk} not found.")
+        return obj
+
+    def _measure(self, render, iterations, cold):
+        clear_caches()
+        cpu = 0.0
+        for _ in range(iterations):
+            if cold:
+                clear_caches()
+            start = time.process_time()
+            render()
+            cpu += time.process_time() - start
+
+        # Allocations in a separate pass: tracing would skew the CPU figures
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(iterations):
+                if cold:
+                    clear_caches()
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                render()
+                peak += tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "cpu_ms": 1000 * cpu / iterations,
+            "peak_kb": peak / iterations / 1024,
+        }
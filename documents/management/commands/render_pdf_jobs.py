@@ -0,0 +1,76 @@
+"""
+Management command to render queued PDF jobs.
+
+POST .../pdf/jobs/ hands jobs to an in-process pool; this sweeps up the ones
+left pending (process restart, broken pool) or stuck running, and can run
+on its own as a separate render worker. Old finished jobs and their files
+can be purged.
+
+Usage:
+    python manage.py render_pdf_jobs
+    python manage.py render_pdf_jobs --limit 100
+    python manage.py render_pdf_jobs --purge-days 7
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documents.jobs import run_job
+from documents.models import PdfRenderJob
+
+# A job running for longer than this was lost with its process
+STALE_RUNNING = timedelta(minutes=15)
+
+
+class Command(BaseCommand):
+    help = "Render pending PDF jobs and optionally purge old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of jobs to render",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=None,
+            help="Delete finished or failed jobs (and their files) older than N days",
+        )
+
+    def handle(self, *args, **options):
+        requeued = PdfRenderJob.objects.filter(
+            status="running", started_at__lt=timezone.now() - STALE_RUNNING
+        ).update(status="pending", started_at=None)
+        if requeued:
+            self.stdout.write(f"Re-queued {requeued} stale running job(s).")
+
+        job_ids = PdfRenderJob.objects.filter(status="pending").order_by("created_at").values_list("pk", flat=True)
+        if options["limit"]:
+            job_ids = job_ids[:options["limit"]]
+
+        done = failed = 0
+        for job_id in list(job_ids):
+            job = run_job(job_id)
+            if job is None:
+                continue
+            if job.status == "done":
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Job {job_id} failed: {job.error}")
+
+        if options["purge_days"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["purge_days"])
+            purged = 0
+            for job in PdfRenderJob.objects.filter(status__in=["done", "failed"], created_at__lt=cutoff).iterator():
+                if job.file:
+                    job.file.delete(save=False)
+                job.delete()
+                purged += 1
+            self.stdout.write(f"Purged {purged} old job(s).")
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} PDF(s), {failed} failed."))
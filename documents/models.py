@@ -0,0 +1,54 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class PdfRenderJob(models.Model):
+    """
+    A PDF rendered outside the request (see documents.jobs): queued by
+    POST .../pdf/jobs/, rendered in a worker process, polled by the client.
+    """
+    KIND_CHOICES = [
+        ("prescription", "Prescription"),
+        ("visit_summary", "Visit summary"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField(help_text="Prescription or Visit id")
+    # Whose name, licence and signature block the document carries
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="pdf_render_jobs"
+    )
+    # documents.cache fingerprint of the content when the job was queued
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    file = models.FileField(upload_to="documents/pdf_jobs/", blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["kind", "object_id", "fingerprint"], name="pdfjob_document_idx"),
+            models.Index(fields=["status", "created_at"], name="pdfjob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} PDF ({self.status})"
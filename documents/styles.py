@@ -0,0 +1,129 @@
+# documents/styles.py
+"""
+Styles shared by every generated PDF.
+
+Building a stylesheet (getSampleStyleSheet, ParagraphStyle, TableStyle) costs
+more CPU than laying out a one-page prescription, so each one is built on
+first use and kept for the life of the process. They are never mutated after
+creation, which makes them safe to share between requests and threads.
+
+clear_caches() drops everything (tests, benchmark_pdfs).
+"""
+
+from functools import lru_cache
+from types import SimpleNamespace
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import TableStyle
+
+TEXT_COLOR = colors.HexColor('#1f2937')
+MUTED_TEXT_COLOR = colors.HexColor('#4b5563')
+HEADER_TEXT_COLOR = colors.HexColor('#374151')
+HEADER_BACKGROUND = colors.HexColor('#f3f4f6')
+GRID_COLOR = colors.HexColor('#e5e7eb')
+
+@lru_cache(maxsize=None)
+def paragraph_styles():
+    """Paragraph styles by role: title, doctor_name, specialty, doctor_info, heading, normal, content."""
+    base = getSampleStyleSheet()
+    return SimpleNamespace(
+        title=ParagraphStyle(
+            'CustomTitle',
+            parent=base['Heading1'],
+            fontSize=16,
+            spaceAfter=6,
+            alignment=1,  # Center
+            textColor=TEXT_COLOR,
+        ),
+        doctor_name=ParagraphStyle(
+            'DoctorName',
+            parent=base['Normal'],
+            fontSize=12,
+            fontName='Helvetica-Bold',
+            spaceAfter=2,
+        ),
+        specialty=ParagraphStyle(
+            'SpecialtyStyle',
+            parent=base['Normal'],
+            fontSize=11,
+            fontName='Helvetica-Bold',
+            spaceAfter=2,
+        ),
+        doctor_info=ParagraphStyle(
+            'DoctorInfo',
+            parent=base['Normal'],
+            fontSize=10,
+            textColor=MUTED_TEXT_COLOR,
+            spaceAfter=1,
+        ),
+        heading=ParagraphStyle(
+            'CustomHeading',
+            parent=base['Heading2'],
+            fontSize=12,
+            spaceBefore=12,
+            spaceAfter=6,
+            textColor=TEXT_COLOR,
+        ),
+        normal=ParagraphStyle(
+            'CustomNormal',
+            parent=base['Normal'],
+            fontSize=10,
+            spaceAfter=4,
+        ),
+        # Free-text sections of the visit summary (indented)
+        content=ParagraphStyle(
+            'ContentStyle',
+            parent=base['Normal'],
+            fontSize=10,
+            spaceAfter=8,
+            leftIndent=10,
+        ),
+    )
+
+
+@lru_cache(maxsize=None)
+def info_table_style(padding=4, label_columns=(0,)):
+    """Label / value tables: bold grey labels in ``label_columns``."""
+    commands = [('FONTSIZE', (0, 0), (-1, -1), 10)]
+    for column in label_columns:
+        commands += [
+            ('FONTNAME', (column, 0), (column, -1), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (column, 0), (column, -1), colors.grey),
+        ]
+    commands += [
+        ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+        ('TOPPADDING', (0, 0), (-1, -1), padding),
+    ]
+    return TableStyle(commands)
+
+
+@lru_cache(maxsize=None)
+def grid_table_style():
+    """Tables with a shaded header row and a light grid (medication list)."""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_BACKGROUND),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TEXTCOLOR', (0, 0), (-1, 0), HEADER_TEXT_COLOR),
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, GRID_COLOR),
+    ])
+
+
+@lru_cache(maxsize=None)
+def signature_table_style():
+    return TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TEXTCOLOR', (0, 1), (-1, 1), colors.grey),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ])
+
+
+def clear_caches():
+    for cached in (paragraph_styles, info_table_style, grid_table_style, signature_table_style):
+        cached.cache_clear()
@@ -0,0 +1,340 @@
+"""
+Tests for the documents app.
+
+Covers:
+- Prescription and visit summary PDFs built from the shared blocks
+- Styles built once per process, not per PDF
+- benchmark_pdfs command
+- Content-hash PDF cache (ETag / 304, signal invalidation)
+- Off-request render jobs (process pool, status polling, sweep command)
+- Batch PDFs (day sheet, patient dossier) in one render
+- PDFs streamed with Content-Length, batches spooled to disk past PDF_SPOOL_MAX_MEMORY
+"""
+
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import FileResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from documents import builders, styles
+from documents import worker
+from documents.cache import cache_key
+from documents.models import PdfRenderJob
+from documents.blocks import Doctor
+from patients.models import Patient
+from prescriptions.models import Medication, Prescription, PrescriptionItem
+from visits.models import Visit, VitalSign
+
+User = get_user_model()
+
+
+class DocumentTestData:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="doc_pdf", password="testpass123", first_name="Jean", last_name="Mbuyi",
+        )
+        cls.patient = Patient.objects.create(
+            first_name="Marie", last_name="Kabila", sex="F", date_of_birth=date(2015, 6, 15),
+            phone="+243812345678", address="Kinshasa", created_by=cls.user,
+        )
+        cls.visit = Visit.objects.create(
+            patient=cls.patient, created_by=cls.user, chief_complaint="Fièvre",
+            medical_history="Asthme\nPaludisme 2023", plan="Repos",
+        )
+        VitalSign.objects.create(visit=cls.visit, weight_kg=21, temperature_c=38.5)
+        cls.rx = Prescription.objects.create(
+            patient=cls.patient, visit=cls.visit, prescriber=cls.user, notes="Revoir dans 7 jours",
+        )
+        medication = Medication.objects.create(name="Paracétamol", strength="250 mg")
+        PrescriptionItem.objects.create(
+            prescription=cls.rx, medication=medication, dosage="5 ml", instructions="Après le repas",
+        )
+
+
+class DocumentPdfTest(DocumentTestData, TestCase):
+    """The two views render through documents.builders with shared styles."""
+
+    def setUp(self):
+        styles.clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_views_return_pdfs(self):
+        response = self.client.get(f"/api/prescriptions/{self.rx.id}/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn(f"ordonnance_{self.rx.id}.pdf", response["Content-Disposition"])
+        self.assertTrue(response.getvalue().startswith(b"%PDF"))
+
+        response = self.client.get(f"/api/visits/{self.visit.id}/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"resume_visite_{self.visit.id}.pdf", response["Content-Disposition"])
+        self.assertTrue(response.getvalue().startswith(b"%PDF"))
+
+    def test_streamed_with_content_length(self):
+        response = self.client.get(f"/api/prescriptions/{self.rx.id}/pdf/")
+        self.assertIsInstance(response, FileResponse)
+        pdf = response.getvalue()
+        self.assertEqual(int(response["Content-Length"]), len(pdf))
+        self.assertTrue(pdf.rstrip().endswith(b"%%EOF"))
+
+    def test_styles_built_once_per_process(self):
+        doctor = Doctor.from_user(self.user)
+        with mock.patch("documents.styles.getSampleStyleSheet", wraps=styles.getSampleStyleSheet) as stylesheet:
+            for _ in range(3):
+                builders.prescription_pdf(self.rx, doctor)
+                builders.visit_summary_pdf(self.visit, doctor)
+        self.assertEqual(stylesheet.call_count, 1)
+        self.assertIs(styles.grid_table_style(), styles.grid_table_style())
+
+    def test_blocks(self):
+        self.assertEqual(Doctor.from_user(self.user).name, "Dr. Jean Mbuyi")
+        t = builders.PRESCRIPTION_PDF_TRANSLATIONS
+        self.assertEqual(builders.patient_age(date(2024, 3, 20), t, today=date(2025, 5, 19)), "13 mois")
+        self.assertEqual(builders.patient_age(date(2015, 6, 15), t, today=date(2025, 6, 14)), "9 ans")
+
+        story = builders.visit_summary_flowables(self.visit, Doctor.from_user(self.user))
+        texts = [flowable.text for flowable in story if hasattr(flowable, "text")]
+        self.assertIn("Paludisme 2023", texts)
+        # Empty sections are left out
+        self.assertNotIn(builders.VISIT_PDF_TRANSLATIONS["assessment"], texts)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_pdfs", "--iterations", "1", stdout=out)
+        self.assertIn("prescription (1 PDFs per mode)", out.getvalue())
+        self.assertIn("visit summary", out.getvalue())
+        self.assertIn("Benchmark complete.", out.getvalue())
+
+
+class PdfCacheTest(DocumentTestData, TestCase):
+    """Re-downloads are served from the cache or answered 304 until an input changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/prescriptions/{self.rx.id}/pdf/"
+
+    def _get(self, **extra):
+        with mock.patch("documents.builders.render", wraps=builders.render) as render:
+            response = self.client.get(self.url, **extra)
+        return response, render.call_count
+
+    def test_hit_and_not_modified(self):
+        first, rendered = self._get()
+        self.assertEqual((first.status_code, rendered), (200, 1))
+        etag = first["ETag"]
+
+        again, rendered = self._get()
+        self.assertEqual((again.status_code, rendered), (200, 0))
+        self.assertEqual(again.getvalue(), first.getvalue())
+        self.assertEqual(again["ETag"], etag)
+
+        not_modified, rendered = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((not_modified.status_code, rendered), (304, 0))
+        self.assertEqual(not_modified["ETag"], etag)
+
+    def test_inputs_change_the_etag(self):
+        etags = {self._get()[0]["ETag"]}
+
+        item = self.rx.items.get()
+        item.dosage = "10 ml"
+        item.save()
+        # Signal dropped the entry
+        self.assertIsNone(cache.get(cache_key("prescription", self.rx.pk)))
+        response, rendered = self._get(HTTP_IF_NONE_MATCH=next(iter(etags)))
+        self.assertEqual((response.status_code, rendered), (200, 1))
+        etags.add(response["ETag"])
+
+        # Header fields of the prescriber (no signal: the hash alone catches it)
+        self.user.profile.display_name = "Dr J. Mbuyi"
+        self.user.profile.save()
+        response, rendered = self._get()
+        self.assertEqual(rendered, 1)
+        etags.add(response["ETag"])
+
+        VitalSign.objects.create(visit=self.visit, weight_kg=22)
+        etags.add(self._get()[0]["ETag"])
+        self.assertEqual(len(etags), 4)
+
+    def test_visit_summary(self):
+        url = f"/api/visits/{self.visit.id}/pdf/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.visit.plan = "Repos et hydratation"
+        self.visit.save()
+        self.assertIsNone(cache.get(cache_key("visit_summary", self.visit.pk)))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(PDF_RENDER_ASYNC=False)
+class PdfRenderJobTest(DocumentTestData, TestCase):
+    """POST .../pdf/jobs/ queues a render; the status URL redirects to the file when done."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/prescriptions/{self.rx.id}/pdf/jobs/"
+
+    def _post(self, url=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url or self.url)
+
+    def test_job_lifecycle(self):
+        response = self._post()
+        self.assertEqual(response.status_code, 202)
+        job = PdfRenderJob.objects.get(pk=response.data["id"])
+        self.assertEqual((job.status, job.kind, job.object_id), ("done", "prescription", self.rx.id))
+
+        status_url = f"/api/documents/pdf-jobs/{job.id}/"
+        redirect = self.client.get(status_url)
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(redirect["Location"], f"{status_url}file/")
+        self.assertEqual(self.client.get(status_url, {"redirect": "false"}).data["status"], "done")
+
+        download = self.client.get(redirect["Location"])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(f"ordonnance_{self.rx.id}.pdf", download["Content-Disposition"])
+        self.assertTrue(b"".join(download.streaming_content).startswith(b"%PDF"))
+
+        # Unchanged document: the finished job is reused
+        again = self._post()
+        self.assertEqual((again.status_code, again.data["id"]), (200, str(job.id)))
+        self.assertEqual(PdfRenderJob.objects.count(), 1)
+
+        # Other users cannot poll it
+        other = User.objects.create_user(username="other_pdf", password="testpass123")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_visit_summary_job(self):
+        response = self._post(f"/api/visits/{self.visit.id}/pdf/jobs/")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(PdfRenderJob.objects.get().status, "done")
+        self.assertEqual(self.client.post("/api/visits/999999/pdf/jobs/").status_code, 404)
+
+    @override_settings(PDF_RENDER_ASYNC=True)
+    def test_async_mode_submits_to_the_pool(self):
+        executor = mock.Mock()
+        with mock.patch("documents.jobs._get_executor", return_value=executor):
+            response = self._post()
+        job_id = response.data["id"]
+        executor.submit.assert_called_once_with(worker.render_job, mock.ANY)
+        self.assertEqual(str(executor.submit.call_args.args[1]), job_id)
+        self.assertEqual(self.client.get(f"/api/documents/pdf-jobs/{job_id}/").data["status"], "pending")
+        self.assertEqual(self.client.get(f"/api/documents/pdf-jobs/{job_id}/file/").status_code, 409)
+
+        # A pool that never ran it: the sweep renders it
+        out = StringIO()
+        call_command("render_pdf_jobs", stdout=out)
+        self.assertIn("Rendered 1 PDF(s), 0 failed.", out.getvalue())
+        self.assertEqual(PdfRenderJob.objects.get(pk=job_id).status, "done")
+
+    def test_failed_render(self):
+        with mock.patch("documents.builders.render_to", side_effect=ValueError("layout error")), \
+                self.assertLogs("documents.jobs", "WARNING"):
+            response = self._post()
+        job = PdfRenderJob.objects.get(pk=response.data["id"])
+        self.assertEqual((job.status, job.error), ("failed", "layout error"))
+        self.assertEqual(self.client.get(f"/api/documents/pdf-jobs/{job.id}/").data["status"], "failed")
+
+
+def page_count(pdf):
+    return pdf.count(b"/Type /Page") - pdf.count(b"/Type /Pages")
+
+
+class BatchPdfTest(DocumentTestData, TestCase):
+    """Several documents, one query set and one ReportLab build, one page break apart."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate().isoformat()
+
+    def _add_prescriptions(self, count, prescriber=None):
+        for _ in range(count):
+            visit = Visit.objects.create(patient=self.patient, created_by=self.user)
+            VitalSign.objects.create(visit=visit, weight_kg=20)
+            rx = Prescription.objects.create(patient=self.patient, visit=visit, prescriber=prescriber or self.user)
+            PrescriptionItem.objects.create(prescription=rx, medication=Medication.objects.first(), dosage="5 ml")
+
+    def _get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        pdf = b"".join(response.streaming_content) if response.status_code == 200 else None
+        return response, pdf, len(queries)
+
+    def test_day_sheet(self):
+        other = User.objects.create_user(username="doc_pdf_2", password="testpass123")
+        self._add_prescriptions(1, prescriber=other)
+        params = {"date_from": self.today, "date_to": self.today}
+
+        response, pdf, few = self._get("/api/prescriptions/pdf/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn(f"ordonnances_{self.today}.pdf", response["Content-Disposition"])
+        self.assertEqual(page_count(pdf), 2)
+
+        self._add_prescriptions(5)
+        _, pdf, many = self._get("/api/prescriptions/pdf/", params)
+        self.assertEqual(page_count(pdf), 7)
+        # Items, vitals and doctors are prefetched: no query per document
+        self.assertEqual(few, many)
+
+        _, pdf, _ = self._get("/api/prescriptions/pdf/", {**params, "doctor": other.id})
+        self.assertEqual(page_count(pdf), 1)
+        _, pdf, _ = self._get("/api/prescriptions/pdf/", {"ids": f"{self.rx.id}"})
+        self.assertEqual(page_count(pdf), 1)
+
+    def test_patient_dossier(self):
+        Visit.objects.create(patient=self.patient, created_by=self.user, chief_complaint="Toux")
+        response, pdf, _ = self._get("/api/visits/pdf/", {"patient": self.patient.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"resumes_visites_patient_{self.patient.id}.pdf", response["Content-Disposition"])
+        self.assertEqual(page_count(pdf), 2)
+
+    def test_spooled_to_disk(self):
+        self._add_prescriptions(3)
+        with override_settings(PDF_SPOOL_MAX_MEMORY=1024):
+            spool = builders.render_spooled(builders.combined_flowables(
+                builders.prescription_flowables(rx, Doctor.from_user(self.user))
+                for rx in Prescription.objects.all()
+            ))
+        with spool:
+            self.assertTrue(spool._rolled)
+            self.assertEqual(spool.read(4), b"%PDF")
+
+        response, pdf, _ = self._get("/api/prescriptions/pdf/", {"patient": self.patient.id})
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(int(response["Content-Length"]), len(pdf))
+        self.assertEqual(page_count(pdf), 4)
+
+    def test_refused(self):
+        self.assertEqual(self.client.get("/api/prescriptions/pdf/").status_code, 400)
+        self.assertEqual(self.client.get("/api/prescriptions/pdf/", {"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/visits/pdf/", {"patient": "1,2"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/prescriptions/pdf/", {"ids": "999999"}).status_code, 404)
+        with override_settings(PDF_BATCH_MAX_DOCUMENTS=1):
+            self._add_prescriptions(1)
+            response = self.client.get("/api/prescriptions/pdf/", {"patient": self.patient.id})
+            self.assertEqual(response.status_code, 400)
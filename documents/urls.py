@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import pdf_job_detail, pdf_job_file
+
+urlpatterns = [
+    path("pdf-jobs/<uuid:job_id>/", pdf_job_detail, name="pdf-job-detail"),
+    path("pdf-jobs/<uuid:job_id>/file/", pdf_job_file, name="pdf-job-file"),
+]
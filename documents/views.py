@@ -0,0 +1,78 @@
+# documents/views.py
+from django.conf import settings
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from config.downloads import presigned_url, ranged_file_response
+from patients.permissions import _is_admin
+
+from .jobs import DOCUMENT_TYPES, enqueue
+from .models import PdfRenderJob
+
+
+def _get_job(request, job_id):
+    jobs = PdfRenderJob.objects.all()
+    if not _is_admin(request.user):
+        jobs = jobs.filter(requested_by=request.user)
+    return get_object_or_404(jobs, pk=job_id)
+
+
+def job_data(request, job):
+    data = {
+        "id": str(job.id),
+        "kind": job.kind,
+        "object_id": job.object_id,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "status_url": request.build_absolute_uri(reverse("pdf-job-detail", args=[job.id])),
+        "file_url": None,
+    }
+    if job.status == "done":
+        data["file_url"] = request.build_absolute_uri(reverse("pdf-job-file", args=[job.id]))
+    return data
+
+
+def job_response(request, kind, obj, doctor_user):
+    """Queue (or reuse) a render job: 202 while it runs, 200 when already done."""
+    job = enqueue(kind, obj, doctor_user, request.user)
+    code = status.HTTP_200_OK if job.status == "done" else status.HTTP_202_ACCEPTED
+    return Response(job_data(request, job), status=code)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def pdf_job_detail(request, job_id):
+    """
+    GET /api/documents/pdf-jobs/<job_id>/
+    Poll a render job. Pending, running or failed: the job as JSON.
+    Done: redirect to the PDF (?redirect=false returns the JSON with file_url).
+    """
+    job = _get_job(request, job_id)
+    if job.status == "done" and request.query_params.get('redirect', '').lower() != 'false':
+        return HttpResponseRedirect(reverse("pdf-job-file", args=[job.id]))
+    return Response(job_data(request, job))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def pdf_job_file(request, job_id):
+    """
+    GET /api/documents/pdf-jobs/<job_id>/file/
+    The rendered PDF: presigned R2 redirect, or served locally with ETag.
+    """
+    job = _get_job(request, job_id)
+    if job.status != "done" or not job.file:
+        return Response({"detail": "The PDF is not ready."}, status=status.HTTP_409_CONFLICT)
+
+    filename = DOCUMENT_TYPES[job.kind].filename(job.object_id)
+    if settings.R2_ENABLED:
+        return HttpResponseRedirect(presigned_url(job.file, filename, "application/pdf"))
+    return ranged_file_response(request, job.file, filename, "application/pdf", etag=job.fingerprint)
@@ -0,0 +1,33 @@
+# documents/worker.py
+"""
+Entry points of the PDF render pool processes (documents.jobs).
+
+Spawned processes unpickle these by module path before Django is set up,
+so this module must not import models at import time.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def init():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+
+
+def render_job(job_id):
+    from django.db import close_old_connections, connections
+
+    from documents.jobs import run_job
+
+    close_old_connections()
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("PDF render worker crashed for job %s", job_id)
+    finally:
+        connections.close_all()
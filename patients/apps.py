@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PatientsConfig(AppConfig):
     name = 'patients'
+
+    def ready(self):
+        from .search import ensure_search_shadow_table
+
+        # SQLite FTS5 shadow table for patient search (see patients.search)
+        post_migrate.connect(ensure_search_shadow_table, sender=self)
@@ -0,0 +1,57 @@
+"""
+Management command to backfill Patient.phone_e164 (and the search columns
+that embed it) for rows saved before the column existed.
+
+Patients whose phone cannot be normalized keep phone_e164 = NULL and are
+listed, so invalid numbers can be fixed before reminder SMS go out.
+
+Usage:
+    python manage.py backfill_phone_e164
+    python manage.py backfill_phone_e164 --batch-size 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from appointments.services.sms import mask_phone
+from patients.models import DERIVED_FIELDS, Patient
+
+
+class Command(BaseCommand):
+    help = "Normalize stored patient phone numbers to E.164 (+243...)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Patients per bulk UPDATE",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        updated = 0
+        invalid = []
+
+        batch = []
+        for patient in Patient.objects.order_by("pk").iterator(chunk_size=batch_size):
+            patient.refresh_derived_fields()
+            if patient.phone.strip() and not patient.phone_e164:
+                invalid.append(patient)
+            batch.append(patient)
+            if len(batch) >= batch_size:
+                Patient.objects.bulk_update(batch, DERIVED_FIELDS)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Patient.objects.bulk_update(batch, DERIVED_FIELDS)
+            updated += len(batch)
+
+        for patient in invalid:
+            self.stdout.write(
+                self.style.WARNING(f"  Invalid phone for {patient} ({patient.patient_code}): {mask_phone(patient.phone)}")
+            )
+
+        self.stdout.write(f"Patients processed: {updated}")
+        if invalid:
+            self.stdout.write(self.style.ERROR(f"Invalid phone numbers: {len(invalid)}"))
+        self.stdout.write(self.style.SUCCESS("Done."))
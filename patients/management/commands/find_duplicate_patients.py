@@ -0,0 +1,48 @@
+"""
+Management command to report likely duplicate patients.
+
+Compares patients block by block on their stored blocking keys (phonetic
+name, date of birth, phone; see patients.services.duplicates), so it never
+compares every patient with every other one.
+
+Usage:
+    python manage.py find_duplicate_patients
+    python manage.py find_duplicate_patients --limit 50
+    python manage.py find_duplicate_patients --rebuild-keys   # after changing the phonetic rules
+"""
+
+from django.core.management.base import BaseCommand
+
+from patients.services.duplicates import duplicate_report, refresh_all_blocking_keys
+
+
+class Command(BaseCommand):
+    help = "List candidate duplicate patient pairs, best match first"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Only list the N best pairs",
+        )
+        parser.add_argument(
+            "--rebuild-keys",
+            action="store_true",
+            help="Recompute every patient's blocking keys first",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild_keys"]:
+            count = refresh_all_blocking_keys()
+            self.stdout.write(f"Rebuilt blocking keys for {count} patient(s).")
+
+        pairs = duplicate_report(limit=options["limit"])
+        for pair in pairs:
+            first, second = pair["patients"]
+            self.stdout.write(
+                f"{pair['score']:.2f}  {first['patient_code']} {first['last_name']} {first['first_name']}"
+                f"  <->  {second['patient_code']} {second['last_name']} {second['first_name']}"
+                f"  ({', '.join(pair['matched_on'])})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Found {len(pairs)} candidate duplicate pair(s)."))
@@ -0,0 +1,55 @@
+"""
+Management command to delete stored file blobs no PatientFile uses anymore.
+
+PatientFile content is deduplicated by SHA-256 (patients.services.blobs), so
+deleting a PatientFile never deletes the content directly. This batch job
+removes blobs that have had no references for the grace period, and aborts
+upload sessions left "committing" by a killed worker (their stored bytes
+would otherwise never be removed).
+
+Designed to run as a daily Render Cron Job.
+
+Usage:
+    python manage.py gc_blobs
+    python manage.py gc_blobs --grace-hours 72
+    python manage.py gc_blobs --dry-run
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from patients.services.blobs import collect_garbage
+from patients.services.uploads import abort_stale_commits
+
+
+class Command(BaseCommand):
+    help = "Delete deduplicated file blobs that are no longer referenced by any patient file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=24,
+            help="Only delete blobs unreferenced for at least this long",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be deleted without deleting anything",
+        )
+
+    def handle(self, *args, **options):
+        aborted = abort_stale_commits(dry_run=options["dry_run"])
+        if aborted:
+            verb = "Would abort" if options["dry_run"] else "Aborted"
+            self.stdout.write(f"{verb} {aborted} stale committing upload(s).")
+
+        count, freed = collect_garbage(
+            grace=timedelta(hours=options["grace_hours"]),
+            dry_run=options["dry_run"],
+        )
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {count} unreferenced blob(s), {freed / (1024 * 1024):.1f} MB."
+        ))
@@ -0,0 +1,49 @@
+"""
+Management command to render missing thumbnails for patient files.
+
+New uploads are previewed in the background right after they are saved;
+this sweeps up files that predate previews or were pending when the
+process restarted.
+
+Usage:
+    python manage.py generate_file_previews
+    python manage.py generate_file_previews --retry-failed
+    python manage.py generate_file_previews --limit 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from patients.models import PatientFile
+from patients.services.previews import generate_previews
+
+
+class Command(BaseCommand):
+    help = "Generate WebP thumbnails for patient files that do not have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry files whose previous preview attempt failed",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Process at most this many files",
+        )
+
+    def handle(self, *args, **options):
+        statuses = ["pending", "failed"] if options["retry_failed"] else ["pending"]
+        qs = PatientFile.objects.filter(preview_status__in=statuses).order_by("pk")
+        if options["limit"]:
+            qs = qs[:options["limit"]]
+
+        counts = {}
+        for patient_file in qs.iterator(chunk_size=100):
+            generate_previews(patient_file)
+            counts[patient_file.preview_status] = counts.get(patient_file.preview_status, 0) + 1
+
+        for status_, count in sorted(counts.items()):
+            self.stdout.write(f"  {status_}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {sum(counts.values())} file(s)."))
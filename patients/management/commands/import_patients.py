@@ -0,0 +1,81 @@
+"""
+Management command to bulk import patients from a CSV or NDJSON file.
+
+Rows are validated with the same rules as POST /api/patients/; invalid rows
+are reported with their line number and skipped, valid rows are inserted in
+batches (see patients.services.importer).
+
+Usage:
+    python manage.py import_patients register.csv --user admin
+    python manage.py import_patients legacy.ndjson --user admin --batch-size 1000
+    python manage.py import_patients register.csv --user admin --dry-run
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.services.importer import (
+    DEFAULT_BATCH_SIZE, FORMATS, first_invalid_utf8_line, guess_format, import_patients,
+)
+
+
+class Command(BaseCommand):
+    help = "Bulk import patients from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file to import")
+        parser.add_argument(
+            "--user",
+            required=True,
+            help="Username recorded as created_by for the imported patients",
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format (default: guessed from the extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Patients per bulk INSERT",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate only, do not insert anything",
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        if not fmt:
+            raise CommandError("Cannot guess the file format, pass --format csv|ndjson.")
+
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        with open(options["path"], "rb") as raw:
+            bad_line = first_invalid_utf8_line(raw)
+        if bad_line:
+            raise CommandError(f"File must be UTF-8 encoded (line {bad_line}). Nothing was imported.")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+            report = import_patients(
+                lines,
+                fmt,
+                user,
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+            )
+
+        for error in report["errors"]:
+            self.stdout.write(self.style.WARNING(f"  Line {error['line']}: {error['errors']}"))
+
+        self.stdout.write(f"Rows read: {report['rows']}")
+        if report["error_count"]:
+            self.stdout.write(self.style.ERROR(f"Rows rejected: {report['error_count']}"))
+        verb = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {report['created']} patient(s)."))
@@ -0,0 +1,52 @@
+"""
+Management command to keep Patient.last_visit_at / next_visit_at up to date.
+
+Visit create/update/delete refreshes the affected patient immediately, but a
+"next" visit becomes the "last" one simply because time passes. This command
+rolls those patients over (cheap, indexed on next_visit_at).
+
+Designed to run as a Render Cron Job every 15 minutes.
+
+--all also rebuilds the carry-forward pointers (latest medical history,
+treatment...), e.g. after adding a field to CARRY_FORWARD_FIELDS.
+
+Usage:
+    python manage.py refresh_visit_summaries          # roll over due patients
+    python manage.py refresh_visit_summaries --all    # full backfill
+"""
+
+from django.core.management.base import BaseCommand
+
+from patients.services.carry_forward import refresh_all_carry_forward
+from patients.services.visit_summary import (
+    refresh_all_visit_summaries,
+    roll_over_visit_summaries,
+)
+
+
+class Command(BaseCommand):
+    help = "Roll over (or backfill with --all) the denormalized last/next visit columns on Patient"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every patient (and carry-forward pointers) instead of only those with a past next_visit_at",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Patients per UPDATE statement when using --all",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            updated = refresh_all_visit_summaries(batch_size=options["batch_size"])
+            pointers = refresh_all_carry_forward(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Backfilled visit summary for {updated} patient(s) and {pointers} carry-forward pointer(s)."
+            ))
+        else:
+            updated = roll_over_visit_summaries()
+            self.stdout.write(self.style.SUCCESS(f"Rolled over visit summary for {updated} patient(s)."))
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def backfill_visit_summary(apps, schema_editor):
+    Patient = apps.get_model("patients", "Patient")
+    Visit = apps.get_model("visits", "Visit")
+
+    now = timezone.now()
+    past = Visit.objects.filter(patient=OuterRef("pk"), visit_date__lte=now).order_by("-visit_date", "-id")
+    upcoming = Visit.objects.filter(patient=OuterRef("pk"), visit_date__gt=now).order_by("visit_date", "id")
+    Patient.objects.update(
+        last_visit_at=Subquery(past.values("visit_date")[:1]),
+        last_visit_id=Subquery(past.values("id")[:1]),
+        next_visit_at=Subquery(upcoming.values("visit_date")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0006_add_patient_file_model'),
+        ('visits', '0003_visit_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='last_visit',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='visits.visit'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_visit_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='next_visit_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_visit_at'], name='patients_pa_last_vi_09bbf5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['next_visit_at'], name='patients_pa_next_vi_7e9ad5_idx'),
+        ),
+        migrations.RunPython(backfill_visit_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:22
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copy of patients.search as of this migration: the live module
+# follows the current Patient model (phone_e164, added in 0010)
+TRIGRAM_INDEX = "patients_patient_search_trgm"
+
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+_NON_DIGITS = re.compile(r"\D")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_search_text(value):
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", str(value).translate(_LIGATURES))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", value.casefold()).strip()
+
+
+def build_search_text(patient):
+    phone_digits = _NON_DIGITS.sub("", patient.phone or "")
+    parts = [patient.patient_code, patient.first_name, patient.last_name, phone_digits, patient.address]
+    return normalize_search_text(" ".join(p for p in parts if p))
+
+
+def fill_search_text(apps, schema_editor):
+    Patient = apps.get_model("patients", "Patient")
+
+    batch = []
+    for p in Patient.objects.all().iterator(chunk_size=1000):
+        p.search_text = build_search_text(p)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Patient.objects.bulk_update(batch, ["search_text"])
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, ["search_text"])
+
+
+def create_search_index(apps, schema_editor):
+    # The SQLite FTS5 shadow table is (re)created on post_migrate instead
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+            f"ON patients_patient USING gin (search_text gin_trgm_ops)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0007_patient_visit_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
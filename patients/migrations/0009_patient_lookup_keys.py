@@ -0,0 +1,73 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:22
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of patients.search.normalize_search_text as of this migration
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_search_text(value):
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", str(value).translate(_LIGATURES))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", value.casefold()).strip()
+
+
+def fill_name_keys(apps, schema_editor):
+    Patient = apps.get_model("patients", "Patient")
+
+    batch = []
+    for p in Patient.objects.all().only("id", "first_name", "last_name").iterator(chunk_size=1000):
+        p.last_name_key = normalize_search_text(p.last_name)[:100]
+        p.first_name_key = normalize_search_text(p.first_name)[:100]
+        batch.append(p)
+        if len(batch) >= 1000:
+            Patient.objects.bulk_update(batch, ["last_name_key", "first_name_key"])
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, ["last_name_key", "first_name_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0008_patient_search_text'),
+        ('visits', '0003_visit_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='first_name_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_name_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name_key', 'first_name_key'], name='patient_last_name_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['first_name_key'], name='patient_first_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['patient_code'], name='patient_code_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['phone'], name='patient_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:24
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of appointments.services.sms.normalize_phone_drc and
+# patients.search.build_search_text as of this migration
+DRC_COUNTRY_CODE = "+243"
+
+_DIGITS_ONLY = re.compile(r"[^\d+]")
+_E164_PATTERN = re.compile(r"^\+\d{8,15}$")
+_NON_DIGITS = re.compile(r"\D")
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_phone_drc(raw):
+    if not raw:
+        return None
+    phone = _DIGITS_ONLY.sub("", raw.strip())
+    if phone.startswith("+243"):
+        pass
+    elif phone.startswith("243") and len(phone) >= 12:
+        phone = "+" + phone
+    elif phone.startswith("0") and len(phone) >= 9:
+        phone = DRC_COUNTRY_CODE + phone[1:]
+    elif len(phone) >= 9 and not phone.startswith("+"):
+        phone = DRC_COUNTRY_CODE + phone
+    if not phone.startswith("+"):
+        phone = "+" + phone
+    return phone if _E164_PATTERN.match(phone) else None
+
+
+def normalize_search_text(value):
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", str(value).translate(_LIGATURES))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", value.casefold()).strip()
+
+
+def phone_search_forms(phone_e164, raw_phone=""):
+    if not phone_e164:
+        digits = _NON_DIGITS.sub("", raw_phone or "")
+        return [digits] if digits else []
+    forms = [phone_e164[1:]]
+    if phone_e164.startswith(DRC_COUNTRY_CODE):
+        forms.append("0" + phone_e164[len(DRC_COUNTRY_CODE):])
+    return forms
+
+
+def build_search_text(patient):
+    parts = [
+        patient.patient_code,
+        patient.first_name,
+        patient.last_name,
+        *phone_search_forms(patient.phone_e164, patient.phone),
+        patient.address,
+    ]
+    return normalize_search_text(" ".join(p for p in parts if p))
+
+
+def fill_phone_e164(apps, schema_editor):
+    # Same work as `manage.py backfill_phone_e164`, so reminders keep working
+    # right after deploy; the command can be re-run to list invalid numbers.
+    Patient = apps.get_model("patients", "Patient")
+
+    batch = []
+    for p in Patient.objects.all().iterator(chunk_size=1000):
+        p.phone_e164 = normalize_phone_drc(p.phone)
+        p.search_text = build_search_text(p)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Patient.objects.bulk_update(batch, ["phone_e164", "search_text"])
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, ["phone_e164", "search_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0009_patient_lookup_keys'),
+        ('visits', '0003_visit_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='patient',
+            name='patient_phone_prefix_idx',
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(fill_phone_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['phone_e164'], name='patient_phone_e164_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
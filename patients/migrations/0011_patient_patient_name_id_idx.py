@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_patient_phone_e164'),
+        ('visits', '0003_visit_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='patient_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:33
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patient_patient_name_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientFileUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('original_filename', models.CharField(max_length=255)),
+                ('file_type', models.CharField(help_text='MIME type', max_length=100)),
+                ('category', models.CharField(choices=[('lab_result', 'Lab Result'), ('imaging', 'Imaging (X-ray, MRI, etc.)'), ('prescription', 'Prescription'), ('consent', 'Consent Form'), ('insurance', 'Insurance Document'), ('other', 'Other')], default='other', max_length=20)),
+                ('description', models.TextField(blank=True)),
+                ('total_size', models.PositiveBigIntegerField(help_text='Announced file size in bytes')),
+                ('received_size', models.PositiveBigIntegerField(default=0, help_text='Bytes stored so far (next offset)')),
+                ('storage_name', models.CharField(blank=True, max_length=255)),
+                ('multipart_upload_id', models.CharField(blank=True, max_length=255)),
+                ('parts', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('committed', 'Committed'), ('aborted', 'Aborted')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_uploads', to='patients.patient')),
+                ('patient_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='patients.patientfile')),
+                ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0012_patient_file_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfile',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed'), ('unsupported', 'Unsupported')], db_index=True, default='pending', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='patientfile',
+            name='previews',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Size name -> storage name'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:37
+
+import django.db.models.deletion
+import patients.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0013_patient_file_previews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to=patients.models.blob_path)),
+                ('size', models.PositiveBigIntegerField(help_text='Size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_linked_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='patientfileupload',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='patientfile',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='patient_files', to='patients.storedblob'),
+        ),
+    ]
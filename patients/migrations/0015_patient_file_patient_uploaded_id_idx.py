@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0014_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientfile',
+            index=models.Index(fields=['patient', '-uploaded_at', 'id'], name='file_patient_uploaded_id_idx'),
+        ),
+    ]
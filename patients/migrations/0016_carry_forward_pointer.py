@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+
+# Frozen copy of patients.services.carry_forward.CARRY_FORWARD_FIELDS
+FIELDS = {
+    "medical_history": ("medical_history", None),
+    "treatment": ("treatment", None),
+    "allergies": ("notes", Q(notes__icontains="allerg")),
+}
+
+
+def backfill_pointers(apps, schema_editor):
+    Patient = apps.get_model("patients", "Patient")
+    Visit = apps.get_model("visits", "Visit")
+    CarryForwardPointer = apps.get_model("patients", "CarryForwardPointer")
+
+    for name, (source, condition) in FIELDS.items():
+        visits = Visit.objects.filter(patient=OuterRef("pk")).exclude(**{source: ""})
+        if condition is not None:
+            visits = visits.filter(condition)
+        latest = visits.order_by("-visit_date", "-created_at", "-id").values("id")[:1]
+        rows = (
+            Patient.objects
+            .annotate(latest=Subquery(latest))
+            .filter(latest__isnull=False)
+            .values_list("pk", "latest")
+        )
+        CarryForwardPointer.objects.bulk_create(
+            (CarryForwardPointer(patient_id=pk, field=name, visit_id=visit_id) for pk, visit_id in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0015_patient_file_patient_uploaded_id_idx'),
+        ('visits', '0004_visit_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarryForwardPointer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=50)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carry_forward_pointers', to='patients.patient')),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='visits.visit')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('patient', 'field'), name='carry_forward_patient_field_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_pointers, migrations.RunPython.noop),
+    ]
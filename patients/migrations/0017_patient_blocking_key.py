@@ -0,0 +1,104 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:49
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of patients.phonetic.blocking_keys (and the search text
+# normalization it uses) as of this migration
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+_WHITESPACE = re.compile(r"\s+")
+
+_REWRITES = [
+    (re.compile(r"[^a-z]"), ""),
+    (re.compile(r"^h"), ""),
+    (re.compile(r"(tsh|tch|sch|ch|sh)"), "s"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(qu|q|ck|kh)"), "k"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"gu(?=[eiy])"), "g"),
+    (re.compile(r"(dj|g(?=[eiy]))"), "j"),
+    (re.compile(r"gn"), "n"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"(eau|au)"), "o"),
+    (re.compile(r"(ou|w)"), "u"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"(?<=.{3})(es|s|t|d|x|e)$"), ""),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+_VOWELS = re.compile(r"[aeiou]")
+
+
+def normalize_search_text(value):
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", str(value).translate(_LIGATURES))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", value.casefold()).strip()
+
+
+def phonetic_key(name):
+    codes = []
+    for word in normalize_search_text(name).replace("-", " ").split():
+        for pattern, replacement in _REWRITES:
+            word = pattern.sub(replacement, word)
+        if word:
+            codes.append((word[0] + _VOWELS.sub("", word[1:]))[:8])
+    return " ".join(codes)
+
+
+def blocking_keys(first_name, last_name, date_of_birth, phone_e164):
+    keys = {}
+    names = sorted(code for code in (phonetic_key(last_name), phonetic_key(first_name)) if code)
+    if names:
+        keys["name"] = "|".join(names)[:100]
+    if date_of_birth:
+        keys["dob"] = str(date_of_birth)
+    if phone_e164:
+        keys["phone"] = phone_e164
+    return keys
+
+
+def fill_blocking_keys(apps, schema_editor):
+    Patient = apps.get_model("patients", "Patient")
+    PatientBlockingKey = apps.get_model("patients", "PatientBlockingKey")
+
+    batch = []
+    for p in Patient.objects.only("first_name", "last_name", "date_of_birth", "phone_e164").iterator(chunk_size=1000):
+        keys = blocking_keys(p.first_name, p.last_name, p.date_of_birth, p.phone_e164)
+        batch.extend(PatientBlockingKey(patient_id=p.pk, kind=kind, key=key) for kind, key in keys.items())
+        if len(batch) >= 3000:
+            PatientBlockingKey.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PatientBlockingKey.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0016_carry_forward_pointer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientBlockingKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('name', 'Phonetic name'), ('dob', 'Date of birth'), ('phone', 'Phone (E.164)')], max_length=10)),
+                ('key', models.CharField(max_length=100)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocking_keys', to='patients.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'key'], name='blocking_kind_key_idx')],
+                'constraints': [models.UniqueConstraint(fields=('patient', 'kind'), name='blocking_patient_kind_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_blocking_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0017_patient_blocking_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientMerge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merged_patient_snapshot', models.JSONField(default=dict)),
+                ('moved', models.JSONField(default=dict)),
+                ('merged_at', models.DateTimeField(auto_now_add=True)),
+                ('merged_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('merged_patient', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='merged_into', to='patients.patient')),
+                ('survivor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='merges', to='patients.patient')),
+            ],
+            options={
+                'ordering': ['-merged_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0018_patient_merge'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patientfileupload',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('committing', 'Committing'), ('committed', 'Committed'), ('aborted', 'Aborted')], default='open', max_length=10),
+        ),
+    ]
@@ -1,5 +1,16 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from appointments.services.sms import normalize_phone_drc
+
+from .search import SEARCH_SOURCE_FIELDS, build_search_text, normalize_search_text
+
+# Stored columns recomputed by Patient.refresh_derived_fields()
+DERIVED_FIELDS = ("phone_e164", "search_text", "last_name_key", "first_name_key")
 
 
 class Patient(models.Model):
@@ -17,6 +28,8 @@ class Patient(models.Model):
 
     # Phone is optional (child may not have one)
     phone = models.CharField(max_length=30, blank=True)
+    # Normalized +243... form of phone; NULL when missing or invalid
+    phone_e164 = models.CharField(max_length=16, null=True, blank=True, editable=False)
 
     # Address is required
     address = models.TextField()
@@ -31,17 +44,79 @@ class Patient(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Normalized (accent-free, lowercase) text indexed for search, see patients.search
+    search_text = models.TextField(blank=True, default="", editable=False)
+    # Normalized names for prefix lookups (search-as-you-type)
+    last_name_key = models.CharField(max_length=100, blank=True, default="", editable=False)
+    first_name_key = models.CharField(max_length=100, blank=True, default="", editable=False)
+
+    # Denormalized visit summary, kept in sync by patients.services.visit_summary
+    # (Visit save/delete signals + the refresh_visit_summaries rollover command).
+    last_visit_at = models.DateTimeField(null=True, blank=True, editable=False)
+    next_visit_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_visit = models.ForeignKey(
+        "visits.Visit",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+
     class Meta:
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # Default ordering + keyset (?cursor=) pagination of the patient list
+            models.Index(fields=["last_name", "first_name", "id"], name="patient_name_id_idx"),
+            models.Index(fields=["last_visit_at"]),
+            models.Index(fields=["next_visit_at"]),
+            # Prefix (LIKE 'x%') indexes for /api/patients/lookup/;
+            # opclasses only apply on PostgreSQL
+            models.Index(
+                fields=["last_name_key", "first_name_key"],
+                name="patient_last_name_prefix_idx",
+                opclasses=["varchar_pattern_ops", "varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["first_name_key"],
+                name="patient_first_name_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["patient_code"],
+                name="patient_code_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # Exact (SMS callbacks) and prefix (lookup) matches on the normalized phone
+            models.Index(
+                fields=["phone_e164"],
+                name="patient_phone_e164_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def refresh_derived_fields(self):
+        """Recompute the stored columns derived from editable fields."""
+        self.phone_e164 = normalize_phone_drc(self.phone)
+        self.search_text = build_search_text(self)
+        self.last_name_key = normalize_search_text(self.last_name)[:100]
+        self.first_name_key = normalize_search_text(self.first_name)[:100]
 
     def save(self, *args, **kwargs):
         creating = self.pk is None
+        self.refresh_derived_fields()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(SEARCH_SOURCE_FIELDS):
+            kwargs["update_fields"] = {*update_fields, *DERIVED_FIELDS}
+
         super().save(*args, **kwargs)
 
         # Generate code after we have an ID (first save)
         if creating and not self.patient_code:
             self.patient_code = f"PT-{self.id:06d}"  # e.g. PT-000012
-            super().save(update_fields=["patient_code"])
+            self.refresh_derived_fields()
+            super().save(update_fields=["patient_code", "search_text"])
 
     def __str__(self):
         return f"{self.last_name} {self.first_name}"
@@ -52,6 +127,31 @@ def patient_file_path(instance, filename):
     return f"patient_files/patient_{instance.patient.id}/{filename}"
 
 
+def blob_path(instance, filename):
+    """Content-addressed path: blobs/<aa>/<bb>/<sha256>"""
+    return f"blobs/{instance.sha256[:2]}/{instance.sha256[2:4]}/{instance.sha256}"
+
+
+class StoredBlob(models.Model):
+    """
+    File content stored once under its SHA-256 (see patients.services.blobs).
+
+    Several PatientFile rows may share a blob; the reference count is simply
+    the number of those rows. Unreferenced blobs are removed by the
+    gc_blobs command after a grace period, never by PatientFile.delete().
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_path)
+    size = models.PositiveBigIntegerField(help_text="Size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever a PatientFile starts using the blob, so GC never
+    # removes a blob that is being linked right now
+    last_linked_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.size} bytes)"
+
+
 class PatientFile(models.Model):
     CATEGORY_CHOICES = [
         ("lab_result", "Lab Result"),
@@ -68,6 +168,15 @@ class PatientFile(models.Model):
         related_name="files"
     )
     file = models.FileField(upload_to=patient_file_path)
+    # Shared content; file then points at blob.file. NULL for legacy per-patient copies.
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="patient_files"
+    )
     original_filename = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField(help_text="File size in bytes")
     file_type = models.CharField(max_length=100, help_text="MIME type")
@@ -85,14 +194,212 @@ class PatientFile(models.Model):
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # Thumbnails stored next to the file, see patients.services.previews
+    PREVIEW_STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+        ("unsupported", "Unsupported"),
+    ]
+    previews = models.JSONField(default=dict, blank=True, editable=False, help_text="Size name -> storage name")
+    preview_status = models.CharField(
+        max_length=12,
+        choices=PREVIEW_STATUS_CHOICES,
+        default="pending",
+        editable=False,
+        db_index=True,
+    )
+
     class Meta:
         ordering = ["-uploaded_at"]
+        indexes = [
+            # Per-patient pages (file list, patient chart, timeline)
+            models.Index(fields=["patient", "-uploaded_at", "id"], name="file_patient_uploaded_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.original_filename} ({self.patient})"
 
     def delete(self, *args, **kwargs):
-        # Delete the file from storage when model is deleted
+        # Delete the thumbnails, and the file itself unless it is a shared
+        # blob (those are garbage-collected once unreferenced, see gc_blobs)
         if self.file:
-            self.file.delete(save=False)
+            storage = self.file.storage
+            for name in (self.previews or {}).values():
+                storage.delete(name)
+            if self.blob_id is None:
+                self.file.delete(save=False)
         super().delete(*args, **kwargs)
+
+
+class PatientFileUpload(models.Model):
+    """
+    Resumable chunked upload session (see patients.services.uploads).
+    Chunks are written straight to storage; the PatientFile row is only
+    created on commit.
+    """
+    STATUS_CHOICES = [
+        ("open", "Open"),
+        # Claimed by a commit: assembling and hashing the stored file
+        ("committing", "Committing"),
+        ("committed", "Committed"),
+        ("aborted", "Aborted"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="file_uploads"
+    )
+    original_filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=100, help_text="MIME type")
+    category = models.CharField(
+        max_length=20,
+        choices=PatientFile.CATEGORY_CHOICES,
+        default="other"
+    )
+    description = models.TextField(blank=True)
+    total_size = models.PositiveBigIntegerField(help_text="Announced file size in bytes")
+    # Optional client-computed checksum: skips the transfer when the content
+    # is already stored, and is verified on commit otherwise
+    sha256 = models.CharField(max_length=64, blank=True)
+    received_size = models.PositiveBigIntegerField(default=0, help_text="Bytes stored so far (next offset)")
+
+    # Reserved storage name, plus S3 multipart state when storage is R2
+    storage_name = models.CharField(max_length=255, blank=True)
+    multipart_upload_id = models.CharField(max_length=255, blank=True)
+    parts = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="open")
+    patient_file = models.ForeignKey(
+        PatientFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Upload {self.original_filename} ({self.received_size}/{self.total_size})"
+
+
+class CarryForwardPointer(models.Model):
+    """
+    For one patient and one carry-forward field (medical history, treatment...),
+    the visit holding its latest non-empty value. Maintained by the Visit
+    signals, see patients.services.carry_forward.
+    """
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="carry_forward_pointers"
+    )
+    field = models.CharField(max_length=50)
+    visit = models.ForeignKey(
+        "visits.Visit",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "field"], name="carry_forward_patient_field_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.field} of {self.patient_id} -> Visit #{self.visit_id}"
+
+
+class PatientBlockingKey(models.Model):
+    """
+    Blocking keys for duplicate detection (see patients.services.duplicates):
+    patients sharing a key are compared, nobody else is.
+    """
+    KIND_CHOICES = [
+        ("name", "Phonetic name"),
+        ("dob", "Date of birth"),
+        ("phone", "Phone (E.164)"),
+    ]
+
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="blocking_keys"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "key"], name="blocking_kind_key_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "kind"], name="blocking_patient_kind_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}={self.key} (patient {self.patient_id})"
+
+
+class PatientMerge(models.Model):
+    """
+    Audit record of a duplicate patient merged into another
+    (see patients.services.merge). The duplicate is kept, archived and empty.
+    """
+    survivor = models.ForeignKey(
+        Patient,
+        on_delete=models.PROTECT,
+        related_name="merges"
+    )
+    merged_patient = models.ForeignKey(
+        Patient,
+        on_delete=models.PROTECT,
+        related_name="merged_into"
+    )
+    # Identity of the duplicate at merge time (code, names, date of birth, phone)
+    merged_patient_snapshot = models.JSONField(default=dict)
+    # Rows re-pointed per table, e.g. {"visits": 12, "files": 3}
+    moved = models.JSONField(default=dict)
+    merged_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+"
+    )
+    merged_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-merged_at"]
+
+    def __str__(self):
+        return f"Patient #{self.merged_patient_id} merged into #{self.survivor_id}"
+
+
+# Render thumbnails for new files once their transaction commits.
+@receiver(post_save, sender=PatientFile)
+def queue_patient_file_previews(sender, instance, created, **kwargs):
+    if created:
+        from patients.services.previews import schedule_previews
+
+        schedule_previews(instance)
+
+
+# Keep the duplicate-detection blocking keys in sync with the patient.
+@receiver(post_save, sender=Patient)
+def refresh_patient_blocking_keys(sender, instance, update_fields=None, **kwargs):
+    from patients.services.duplicates import BLOCKING_SOURCE_FIELDS, refresh_blocking_keys
+
+    if update_fields is None or set(update_fields) & set(BLOCKING_SOURCE_FIELDS):
+        refresh_blocking_keys([instance])
@@ -1,8 +1,9 @@
 # patients/pagination.py
-from rest_framework.pagination import PageNumberPagination
+from config.pagination import FlexiblePageNumberPagination
 
 
-class PatientPagination(PageNumberPagination):
+class PatientPagination(FlexiblePageNumberPagination):
+    """Same ?cursor= / ?count=false modes as the other lists, capped at 100 per page."""
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
@@ -0,0 +1,78 @@
+# patients/phonetic.py
+"""
+Phonetic and blocking keys for duplicate patient detection.
+
+Pure functions (no models); migration 0017 keeps a frozen copy.
+
+phonetic_key() folds the spelling variants seen at registration for French
+and Lingala/Congolese names onto one key:
+
+- Tshibangu / Chibangu / Shibangu, Kabongo / Cabongo, Philippe / Filipe
+- Mwamba / Muamba / Mouamba, Ngoy / Ngoi, Djamba / Jamba
+- silent French endings and letters: Thomas / Toma, Hélène / Elene
+- doubled letters and, after the first letter, vowels: Kabila / Kabela
+
+It is deliberately coarse: it only picks candidates, which are then scored
+on date of birth and phone (see patients.services.duplicates).
+"""
+
+import re
+
+from .search import normalize_search_text
+
+# Ordered: longer patterns first
+_REWRITES = [
+    (re.compile(r"[^a-z]"), ""),
+    (re.compile(r"^h"), ""),
+    (re.compile(r"(tsh|tch|sch|ch|sh)"), "s"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"(qu|q|ck|kh)"), "k"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"gu(?=[eiy])"), "g"),
+    (re.compile(r"(dj|g(?=[eiy]))"), "j"),
+    (re.compile(r"gn"), "n"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"(eau|au)"), "o"),
+    (re.compile(r"(ou|w)"), "u"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"h"), ""),
+    # Silent French endings (Thomas, Benoît, Arnaud, Dupuis, Lambert)
+    (re.compile(r"(?<=.{3})(es|s|t|d|x|e)$"), ""),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+_VOWELS = re.compile(r"[aeiou]")
+
+PHONETIC_KEY_LENGTH = 8
+
+
+def phonetic_key(name):
+    """Coarse phonetic code of a (single or compound) name, "" if none."""
+    words = normalize_search_text(name).replace("-", " ").split()
+    codes = []
+    for word in words:
+        for pattern, replacement in _REWRITES:
+            word = pattern.sub(replacement, word)
+        if not word:
+            continue
+        # Keep the first letter, drop the other vowels
+        codes.append((word[0] + _VOWELS.sub("", word[1:]))[:PHONETIC_KEY_LENGTH])
+    return " ".join(codes)
+
+
+def blocking_keys(first_name, last_name, date_of_birth, phone_e164):
+    """
+    {kind: key} for one patient. Names are keyed order-insensitively, so a
+    first/last name swap still lands in the same block.
+    """
+    keys = {}
+    names = sorted(code for code in (phonetic_key(last_name), phonetic_key(first_name)) if code)
+    if names:
+        keys["name"] = "|".join(names)[:100]
+    if date_of_birth:
+        keys["dob"] = str(date_of_birth)  # date or "YYYY-MM-DD"
+    if phone_e164:
+        keys["phone"] = phone_e164
+    return keys
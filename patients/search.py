@@ -0,0 +1,258 @@
+# patients/search.py
+"""
+Indexed patient search.
+
+Every patient stores a normalized ``search_text`` column (accents stripped,
+case-folded) built from patient_code, names, phone digits (international
+and local forms of phone_e164) and address.
+Searching hits an index on that single column instead of five
+``ILIKE '%x%'`` scans:
+
+- PostgreSQL: pg_trgm GIN index, fuzzy ``%>`` matching, ranked by word similarity
+- SQLite (local/dev): FTS5 trigram shadow table kept in sync by triggers, ranked by bm25
+- anything else: plain substring match on search_text
+"""
+
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from appointments.services.sms import DRC_COUNTRY_CODE, normalize_phone_drc
+
+SEARCH_SOURCE_FIELDS = ("patient_code", "first_name", "last_name", "phone", "address")
+
+FTS_TABLE = "patients_patient_fts"
+TRIGRAM_INDEX = "patients_patient_search_trgm"
+
+# FTS5 trigram tokens need at least 3 characters
+_FTS_MIN_TERM_LENGTH = 3
+# Shorter digit strings are more likely part of a code than a phone number
+_PHONE_MIN_PREFIX_LENGTH = 3
+
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae"})
+_NON_DIGITS = re.compile(r"\D")
+_DRC_E164 = re.compile(r"^\+243\d{9}$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_search_text(value):
+    """Lowercase, strip accents and collapse whitespace: "Kabilá  Élodie" -> "kabila elodie"."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", str(value).translate(_LIGATURES))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", value.casefold()).strip()
+
+
+def phone_search_forms(phone_e164, raw_phone=""):
+    """
+    Digit strings a receptionist may type for a phone number:
+    "+243812345678" -> ["243812345678", "0812345678"].
+    """
+    if not phone_e164:
+        digits = _NON_DIGITS.sub("", raw_phone or "")
+        return [digits] if digits else []
+    forms = [phone_e164[1:]]
+    if phone_e164.startswith(DRC_COUNTRY_CODE):
+        forms.append("0" + phone_e164[len(DRC_COUNTRY_CODE):])
+    return forms
+
+
+def phone_search_prefix(term):
+    """
+    Map a digits-only search term to a phone_e164 prefix, or None when the
+    term is too short to be a phone number: "0812" -> "+243812".
+    """
+    digits = _NON_DIGITS.sub("", term)
+    if len(digits) < _PHONE_MIN_PREFIX_LENGTH:
+        return None
+    if digits.startswith("0"):
+        return DRC_COUNTRY_CODE + digits[1:]
+    if digits.startswith(DRC_COUNTRY_CODE[1:]):
+        return "+" + digits
+    return DRC_COUNTRY_CODE + digits
+
+
+def complete_phone(query):
+    """
+    The phone_e164 of ``query`` if it is a complete DRC number in any format
+    (+243 and 9 digits), else None: partial numbers stay prefix matches.
+    """
+    if any(ch.isalpha() for ch in query):
+        return None
+    phone = normalize_phone_drc(query)
+    if phone and _DRC_E164.match(phone):
+        return phone
+    return None
+
+
+def patients_with_phone(queryset, raw_phone):
+    """
+    Exact match on the normalized phone (inbound SMS, delivery callbacks).
+    Uses the phone_e164 index; returns an empty queryset for invalid numbers.
+    """
+    phone = normalize_phone_drc(raw_phone)
+    if not phone:
+        return queryset.none()
+    return queryset.filter(phone_e164=phone)
+
+
+def build_search_text(patient):
+    """Build the stored search_text column for a patient."""
+    parts = [
+        patient.patient_code,
+        patient.first_name,
+        patient.last_name,
+        *phone_search_forms(patient.phone_e164, patient.phone),
+        patient.address,
+    ]
+    return normalize_search_text(" ".join(p for p in parts if p))
+
+
+def search_terms(query):
+    """Split a raw query into normalized terms ("+243 Kabilá" -> ["243", "kabila"])."""
+    return [t for t in normalize_search_text(query.replace("+", " ")).split(" ") if t]
+
+
+# ---------------------------------------------------------------------------
+# Backend-specific index setup
+# ---------------------------------------------------------------------------
+def create_postgres_trigram_index(schema_editor):
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+        f"ON patients_patient USING gin (search_text gin_trgm_ops)"
+    )
+
+
+def ensure_sqlite_fts(connection, table):
+    """
+    Create the FTS5 shadow table of ``table`` and its sync triggers if missing.
+
+    SQLite migrations rebuild tables (copy + drop + rename) for most
+    ALTERs, which silently drops triggers, so this runs after every migrate.
+    Skipped until the search_text column exists (partial migrate).
+    """
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        if "search_text" not in columns:
+            return
+
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f"{FTS_TABLE}_%"],
+        )
+        if len(cursor.fetchall()) == 3:
+            return
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"search_text, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+            f"VALUES ('delete', old.id, old.search_text); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON {table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+            f"VALUES ('delete', old.id, old.search_text); "
+            f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_search_shadow_table(sender, using, **kwargs):
+    """post_migrate receiver (see PatientsConfig.ready)."""
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        ensure_sqlite_fts(connection, sender.get_model("Patient")._meta.db_table)
+
+
+# ---------------------------------------------------------------------------
+# Query side
+# ---------------------------------------------------------------------------
+def _fts_match_expression(terms):
+    return " AND ".join('"{}"'.format(t.replace('"', '""')) for t in terms)
+
+
+def search_patients(queryset, query):
+    """
+    Filter ``queryset`` to patients matching every term of ``query`` and
+    annotate ``search_rank`` (higher is better).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+
+    if vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        for term in terms:
+            queryset = queryset.filter(
+                Q(search_text__contains=term) | Q(search_text__trigram_word_similar=term)
+            )
+        rank = sum(
+            (TrigramWordSimilarity(Value(term), "search_text") for term in terms[1:]),
+            TrigramWordSimilarity(Value(terms[0]), "search_text"),
+        )
+        return queryset.annotate(search_rank=rank)
+
+    short_terms = terms
+    rank = Value(0.0, output_field=FloatField())
+
+    if vendor == "sqlite":
+        fts_terms = [t for t in terms if len(t) >= _FTS_MIN_TERM_LENGTH]
+        short_terms = [t for t in terms if len(t) < _FTS_MIN_TERM_LENGTH]
+        if fts_terms:
+            match = _fts_match_expression(fts_terms)
+            queryset = queryset.filter(pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match],
+            ))
+            # bm25 rank is negative (lower is better); flip it
+            meta = queryset.model._meta
+            rank = RawSQL(
+                f"SELECT -rank FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {meta.db_table}.{meta.pk.column}",
+                [match],
+                output_field=FloatField(),
+            )
+
+    for term in short_terms:
+        queryset = queryset.filter(search_text__contains=term)
+    return queryset.annotate(search_rank=rank)
+
+
+class PatientSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for SearchFilter on the patient list (same ?search= param).
+
+    Results are ranked by relevance unless the client asked for an explicit
+    ?ordering=, so list it after OrderingFilter in filter_backends.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        if not search_terms(query):
+            return queryset
+
+        queryset = search_patients(queryset, query)
+        if request.query_params.get(self.ordering_param):
+            return queryset
+        return queryset.order_by("-search_rank", *queryset.query.order_by)
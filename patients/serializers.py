@@ -1,6 +1,9 @@
 # patients/serializers.py
+from django.conf import settings
 from rest_framework import serializers
-from .models import Patient, PatientFile
+from .models import Patient, PatientFile, PatientFileUpload
+from .services.blobs import store_blob
+from config.images import OUTPUT_CONTENT_TYPE, recompress_image
 
 
 # Allowed file types for upload
@@ -9,6 +12,7 @@ ALLOWED_FILE_TYPES = [
     'image/jpeg',
     'image/png',
     'image/gif',
+    'image/webp',
     'application/msword',
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
 ]
@@ -20,7 +24,12 @@ MAX_FILE_SIZE = 10 * 1024 * 1024
 class PatientFileSerializer(serializers.ModelSerializer):
     file = serializers.FileField(write_only=True)
     file_url = serializers.SerializerMethodField(read_only=True)
+    # WebP previews (patients.services.previews); null until generated
+    thumbnail_url = serializers.SerializerMethodField(read_only=True)
+    thumbnails = serializers.SerializerMethodField(read_only=True)
     uploaded_by_name = serializers.SerializerMethodField(read_only=True)
+    # Store the image exactly as uploaded (no EXIF stripping / WebP re-encode)
+    preserve_original = serializers.BooleanField(default=False, write_only=True)
 
     class Meta:
         model = PatientFile
@@ -28,7 +37,11 @@ class PatientFileSerializer(serializers.ModelSerializer):
             'id',
             'patient',
             'file',
+            'preserve_original',
             'file_url',
+            'thumbnail_url',
+            'thumbnails',
+            'preview_status',
             'original_filename',
             'file_size',
             'file_type',
@@ -41,6 +54,7 @@ class PatientFileSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id',
             'patient',
+            'preview_status',
             'original_filename',
             'file_size',
             'file_type',
@@ -55,6 +69,19 @@ class PatientFileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
+    def _preview_url(self, obj, name):
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(obj.file.storage.url(name))
+        return None
+
+    def get_thumbnail_url(self, obj):
+        name = (obj.previews or {}).get('small')
+        return self._preview_url(obj, name) if name else None
+
+    def get_thumbnails(self, obj):
+        return {size: self._preview_url(obj, name) for size, name in (obj.previews or {}).items()}
+
     def get_uploaded_by_name(self, obj):
         if obj.uploaded_by:
             name = f"{obj.uploaded_by.first_name} {obj.uploaded_by.last_name}".strip()
@@ -72,26 +99,104 @@ class PatientFileSerializer(serializers.ModelSerializer):
         if value.content_type not in ALLOWED_FILE_TYPES:
             raise serializers.ValidationError(
                 f"File type '{value.content_type}' is not allowed. "
-                f"Allowed types: PDF, JPEG, PNG, GIF, DOC, DOCX."
+                f"Allowed types: PDF, JPEG, PNG, GIF, WEBP, DOC, DOCX."
             )
 
         return value
 
     def create(self, validated_data):
-        file = validated_data.get('file')
-        validated_data['original_filename'] = file.name
+        file = validated_data.pop('file')
+        # Recompression changes the stored bytes, not the name the user uploaded
+        original_filename = file.name
+        sha256 = validated_data.pop('sha256', None)
+        content_type = file.content_type
+        if not validated_data.pop('preserve_original'):
+            recompressed = recompress_image(file)
+            if recompressed is not None:
+                # New bytes: the hash computed while streaming no longer applies
+                file, sha256, content_type = recompressed, None, OUTPUT_CONTENT_TYPE
+
+        # Content is stored once per SHA-256 and shared (patients.services.blobs)
+        blob = store_blob(file, sha256=sha256)
+        validated_data['blob'] = blob
+        validated_data['file'] = blob.file.name
+        validated_data['original_filename'] = original_filename
         validated_data['file_size'] = file.size
-        validated_data['file_type'] = file.content_type
+        validated_data['file_type'] = content_type
         validated_data['uploaded_by'] = self.context['request'].user
         return super().create(validated_data)
 
 
+class PatientFileUploadSerializer(serializers.ModelSerializer):
+    """
+    Chunked upload session: POST to open it, then PUT chunks at ``offset``.
+    With a known ``sha256`` the session may come back already committed.
+    """
+    offset = serializers.IntegerField(source="received_size", read_only=True)
+    chunk_size = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = PatientFileUpload
+        fields = [
+            'id',
+            'patient',
+            'original_filename',
+            'file_type',
+            'total_size',
+            'sha256',
+            'category',
+            'description',
+            'offset',
+            'chunk_size',
+            'status',
+            'patient_file',
+            'created_at',
+        ]
+        read_only_fields = [
+            'id',
+            'patient',
+            'status',
+            'patient_file',
+            'created_at',
+        ]
+
+    def get_chunk_size(self, obj):
+        return settings.PATIENT_FILE_UPLOAD_CHUNK_SIZE
+
+    def validate_file_type(self, value):
+        if value not in ALLOWED_FILE_TYPES:
+            raise serializers.ValidationError(
+                f"File type '{value}' is not allowed. "
+                f"Allowed types: PDF, JPEG, PNG, GIF, WEBP, DOC, DOCX."
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in "0123456789abcdef" for c in value)):
+            raise serializers.ValidationError("Must be a hex-encoded SHA-256 digest.")
+        return value
+
+    def validate_total_size(self, value):
+        max_size = settings.PATIENT_FILE_UPLOAD_MAX_SIZE
+        if value <= 0:
+            raise serializers.ValidationError("File is empty.")
+        if value > max_size:
+            raise serializers.ValidationError(
+                f"File size must be less than {max_size // (1024 * 1024)}MB."
+            )
+        return value
+
+
 class PatientSerializer(serializers.ModelSerializer):
-    # annotations (not DB fields) → read-only
-    last_visit_date = serializers.DateTimeField(read_only=True)
-    next_visit_date = serializers.DateTimeField(read_only=True)
-    latest_weight_kg = serializers.SerializerMethodField(read_only=True)
-    last_visit_id = serializers.SerializerMethodField(read_only=True)
+    # denormalized visit summary (see patients.services.visit_summary) → read-only
+    last_visit_date = serializers.DateTimeField(source="last_visit_at", read_only=True)
+    next_visit_date = serializers.DateTimeField(source="next_visit_at", read_only=True)
+    # annotated by the views (patients.views.with_latest_weight) → read-only
+    latest_weight_kg = serializers.DecimalField(
+        max_digits=5, decimal_places=2, coerce_to_string=False, allow_null=True, read_only=True,
+    )
+    last_visit_id = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Patient
@@ -120,30 +225,3 @@ class PatientSerializer(serializers.ModelSerializer):
             "latest_weight_kg",
             "last_visit_id",
         ]
-
-    def get_latest_weight_kg(self, obj):
-        """Get the most recent weight from patient's visit vitals."""
-        from visits.models import VitalSign
-        latest_vital = (
-            VitalSign.objects
-            .filter(visit__patient=obj, weight_kg__isnull=False)
-            .order_by('-measured_at')
-            .first()
-        )
-        if latest_vital:
-            return latest_vital.weight_kg
-        return None
-
-    def get_last_visit_id(self, obj):
-        """Get the ID of the most recent past visit."""
-        from visits.models import Visit
-        from django.utils import timezone
-        last_visit = (
-            Visit.objects
-            .filter(patient=obj, visit_date__lte=timezone.now())
-            .order_by('-visit_date')
-            .first()
-        )
-        if last_visit:
-            return last_visit.id
-        return None
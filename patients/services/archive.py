@@ -0,0 +1,94 @@
+"""
+Bulk archive / restore of patients.
+
+archive_patient / restore_patient load and save() one patient at a time;
+yearly cleanups archive thousands. Here the permission rules are applied to
+the whole set in one SELECT (admins: any patient, others: the patients they
+created; restore is admin only and never brings back a merged patient), then
+the allowed rows flip with a single UPDATE.
+
+is_active feeds no derived column (search keys, blocking keys, visit
+summaries), so skipping save() and its signals is safe.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from patients.models import Patient, PatientMerge
+
+# Upper bound on an explicit id list (one IN (...) clause)
+MAX_BULK_IDS = 5000
+# Accepted range for the inactive_years filter (larger cutoffs overflow datetime)
+MAX_INACTIVE_YEARS = 100
+
+
+def inactive_since(years, now=None):
+    """
+    Patients with no visit in ``years`` years (never seen: registered before
+    then) and none scheduled. A next_visit_at already in the past but not yet
+    rolled over by refresh_visit_summaries also counts as scheduled.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=365 * years)
+    return (
+        (Q(last_visit_at__lt=cutoff) | Q(last_visit_at__isnull=True, created_at__lt=cutoff))
+        & Q(next_visit_at__isnull=True)
+    )
+
+
+def _scope(user, is_admin):
+    patients = Patient.objects.all()
+    return patients if is_admin else patients.filter(created_by=user)
+
+
+def bulk_archive(user, is_admin, ids=None, inactive_years=None):
+    """
+    Archive the given ``ids``, or every active patient matching the
+    ``inactive_years`` filter the user may archive.
+    Returns {"archived": n, "refused": [ids], "skipped": [ids]}.
+    """
+    if ids is None:
+        archived = (
+            _scope(user, is_admin)
+            .filter(inactive_since(inactive_years), is_active=True)
+            .update(is_active=False)
+        )
+        return {"archived": archived, "refused": [], "skipped": []}
+
+    allowed, skipped = set(), []
+    for pk, owner, is_active in Patient.objects.filter(pk__in=ids).values_list("pk", "created_by_id", "is_active"):
+        if not is_admin and owner != user.pk:
+            continue
+        if is_active:
+            allowed.add(pk)
+        else:
+            skipped.append(pk)
+    refused = sorted(set(ids) - allowed - set(skipped))
+    # is_active=True again in the UPDATE: a concurrent archive is not counted twice
+    archived = Patient.objects.filter(pk__in=allowed, is_active=True).update(is_active=False)
+    return {"archived": archived, "refused": refused, "skipped": sorted(skipped)}
+
+
+def bulk_restore(ids):
+    """
+    Restore the given archived patients (admins only, checked by the caller).
+    Merged patients are refused. Returns {"restored": n, "refused": [ids], "skipped": [ids]}.
+    """
+    rows = (
+        Patient.objects
+        .filter(pk__in=ids)
+        .annotate(merged=Exists(PatientMerge.objects.filter(merged_patient=OuterRef("pk"))))
+        .values_list("pk", "is_active", "merged")
+    )
+    allowed, skipped = set(), []
+    for pk, is_active, merged in rows:
+        if merged:
+            continue
+        if is_active:
+            skipped.append(pk)
+        else:
+            allowed.add(pk)
+    refused = sorted(set(ids) - allowed - set(skipped))
+    restored = Patient.objects.filter(pk__in=allowed, is_active=False).update(is_active=True)
+    return {"restored": restored, "refused": refused, "skipped": sorted(skipped)}
@@ -0,0 +1,188 @@
+"""
+Content-addressed, deduplicated storage for patient files.
+
+Staff often upload the same scan to several patients, or twice to the same
+one. New PatientFile content is stored once under its SHA-256
+(blobs/<aa>/<bb>/<sha256>, see StoredBlob) and shared by every PatientFile
+pointing at it:
+
+- multipart uploads are hashed while they stream in (Sha256UploadHandler),
+- chunked upload sessions are hashed once assembled, then moved under their hash,
+- a client that sends the SHA-256 first skips the transfer entirely when
+  the content is already stored.
+
+The reference count is the number of PatientFile rows on a blob; blobs
+left with none are deleted by collect_garbage() (gc_blobs command) once
+they have been unreferenced for a grace period.
+"""
+
+import hashlib
+import os
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from patients.models import StoredBlob, blob_path
+
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_GC_GRACE = timedelta(hours=24)
+
+
+class Sha256UploadHandler(FileUploadHandler):
+    """
+    Hash multipart file fields while they stream in. Must come before the
+    handlers that store the data (it passes every chunk through).
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digests = {}
+        self._hash = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._hash.hexdigest()
+        return None
+
+
+def uploaded_digest(request, field_name):
+    """SHA-256 computed by Sha256UploadHandler for ``field_name``, if any."""
+    for handler in request.upload_handlers:
+        if isinstance(handler, Sha256UploadHandler):
+            return handler.digests.get(field_name)
+    return None
+
+
+def sha256_of(fileobj):
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def find_blob(sha256):
+    """Existing blob for ``sha256`` (marked as just linked), or None."""
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is not None:
+            blob.save(update_fields=["last_linked_at"])
+    return blob
+
+
+def _register(sha256, size, name):
+    """
+    Create the StoredBlob row for content already saved at ``name``. If a
+    concurrent upload registered the same hash first, drop our copy.
+    """
+    try:
+        with transaction.atomic():
+            return StoredBlob.objects.create(sha256=sha256, size=size, file=name)
+    except IntegrityError:
+        StoredBlob._meta.get_field("file").storage.delete(name)
+        return find_blob(sha256)
+
+
+def store_blob(content, sha256=None):
+    """StoredBlob for a Django File, storing the bytes only if the hash is new."""
+    sha256 = sha256 or sha256_of(content)
+    blob = find_blob(sha256)
+    if blob is not None:
+        return blob
+
+    blob = StoredBlob(sha256=sha256, size=content.size)
+    blob.file.save(sha256, content, save=False)
+    return _register(sha256, content.size, blob.file.name)
+
+
+def _move(storage, source, target):
+    if isinstance(storage, FileSystemStorage):
+        os.makedirs(os.path.dirname(storage.path(target)), exist_ok=True)
+        os.replace(storage.path(source), storage.path(target))
+        return
+
+    if hasattr(storage, "bucket"):
+        from storages.utils import clean_name
+
+        client = storage.bucket.meta.client
+        client.copy_object(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(target)),
+            CopySource={"Bucket": storage.bucket_name, "Key": storage._normalize_name(clean_name(source))},
+        )
+    else:
+        with storage.open(source, "rb") as fh:
+            storage.save(target, fh)
+    storage.delete(source)
+
+
+def hash_stored_file(name):
+    storage = StoredBlob._meta.get_field("file").storage
+    with storage.open(name, "rb") as fh:
+        return sha256_of(fh)
+
+
+def adopt_stored_file(name, size, sha256=None):
+    """
+    StoredBlob for content already in storage at ``name`` (an assembled
+    upload session): moved under its hash, or deleted if the hash exists.
+    """
+    storage = StoredBlob._meta.get_field("file").storage
+    sha256 = sha256 or hash_stored_file(name)
+
+    blob = find_blob(sha256)
+    if blob is not None:
+        storage.delete(name)
+        return blob
+
+    target = storage.get_available_name(blob_path(StoredBlob(sha256=sha256), posixpath.basename(name)))
+    _move(storage, name, target)
+    return _register(sha256, size, target)
+
+
+def unreferenced_blobs(grace=DEFAULT_GC_GRACE, now=None):
+    cutoff = (now or timezone.now()) - grace
+    return (
+        StoredBlob.objects
+        .filter(last_linked_at__lt=cutoff)
+        .annotate(references=Count("patient_files"))
+        .filter(references=0)
+    )
+
+
+def collect_garbage(grace=DEFAULT_GC_GRACE, now=None, dry_run=False):
+    """
+    Delete blobs no PatientFile has used for ``grace``.
+    Returns (blob count, bytes freed).
+    """
+    cutoff = (now or timezone.now()) - grace
+    storage = StoredBlob._meta.get_field("file").storage
+    count = freed = 0
+
+    for blob in unreferenced_blobs(grace, now).iterator(chunk_size=500):
+        if not dry_run:
+            with transaction.atomic():
+                # Re-check under lock: an upload may have linked it meanwhile
+                locked = StoredBlob.objects.select_for_update().filter(pk=blob.pk, last_linked_at__lt=cutoff).first()
+                if locked is None or locked.patient_files.exists():
+                    continue
+                locked.delete()
+                # Remove the content only once the row is gone for good
+                transaction.on_commit(lambda name=locked.file.name: storage.delete(name))
+        count += 1
+        freed += blob.size
+
+    return count, freed
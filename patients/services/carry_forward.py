@@ -0,0 +1,107 @@
+"""
+Carry-forward fields: values a new visit form pre-fills from the patient's
+most recent visit that has one (medical history, current treatment,
+allergies noted in the free text).
+
+Instead of scanning the patient's visits (exclude empty, sort by date) every
+time a form opens, a CarryForwardPointer per (patient, field) points at the
+visit holding the latest non-empty value. Visit save/delete re-points the
+affected patients in a fixed number of queries, which also covers a visit
+being backdated behind another one, or its field being cleared.
+
+To carry another field forward, add it to CARRY_FORWARD_FIELDS and run
+``refresh_visit_summaries --all`` once.
+"""
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from patients.models import CarryForwardPointer, Patient
+from visits.models import Visit
+
+# name -> (Visit field holding the value, extra condition or None)
+CARRY_FORWARD_FIELDS = {
+    "medical_history": ("medical_history", None),
+    "treatment": ("treatment", None),
+    # No dedicated column: the latest notes that mention an allergy ("allergie", "allergic"...)
+    "allergies": ("notes", Q(notes__icontains="allerg")),
+}
+
+
+def _latest_visit_id(name):
+    source, condition = CARRY_FORWARD_FIELDS[name]
+    visits = Visit.objects.filter(patient=OuterRef("pk")).exclude(**{source: ""})
+    if condition is not None:
+        visits = visits.filter(condition)
+    return Subquery(visits.order_by("-visit_date", "-created_at", "-id").values("id")[:1])
+
+
+def refresh_carry_forward(patient_ids):
+    """
+    Re-point every carry-forward field of the given patients.
+    Returns the number of pointers written.
+    """
+    patient_ids = {pk for pk in patient_ids if pk is not None}
+    if not patient_ids:
+        return 0
+
+    rows = (
+        Patient.objects
+        .filter(pk__in=patient_ids)
+        .annotate(**{f"latest_{name}": _latest_visit_id(name) for name in CARRY_FORWARD_FIELDS})
+        .values("pk", *(f"latest_{name}" for name in CARRY_FORWARD_FIELDS))
+    )
+
+    pointers = []
+    stale = Q()
+    for row in rows:
+        for name in CARRY_FORWARD_FIELDS:
+            visit_id = row[f"latest_{name}"]
+            if visit_id:
+                pointers.append(CarryForwardPointer(patient_id=row["pk"], field=name, visit_id=visit_id))
+            else:
+                stale |= Q(patient_id=row["pk"], field=name)
+
+    with transaction.atomic():
+        if stale:
+            CarryForwardPointer.objects.filter(stale).delete()
+        CarryForwardPointer.objects.bulk_create(
+            pointers,
+            update_conflicts=True,
+            unique_fields=["patient", "field"],
+            update_fields=["visit"],
+        )
+    return len(pointers)
+
+
+def refresh_all_carry_forward(batch_size=1000):
+    """Backfill every patient, in primary-key batches."""
+    ids = Patient.objects.order_by("pk").values_list("pk", flat=True)
+    written = 0
+    last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        written += refresh_carry_forward(batch)
+        last_pk = batch[-1]
+    return written
+
+
+def carry_forward_values(patient_id, names=None):
+    """{name: {"value", "visit", "visit_date"}} for the fields that have a value."""
+    names = list(names or CARRY_FORWARD_FIELDS)
+    sources = {CARRY_FORWARD_FIELDS[name][0] for name in names}
+    pointers = (
+        CarryForwardPointer.objects
+        .filter(patient_id=patient_id, field__in=names)
+        .values("field", "visit_id", "visit__visit_date", *(f"visit__{source}" for source in sources))
+    )
+    return {
+        row["field"]: {
+            "value": row[f"visit__{CARRY_FORWARD_FIELDS[row['field']][0]}"],
+            "visit": row["visit_id"],
+            "visit_date": row["visit__visit_date"],
+        }
+        for row in pointers
+    }
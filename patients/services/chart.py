@@ -0,0 +1,164 @@
+"""
+Patient chart: everything the patient screen shows, in one response.
+
+Opening a patient used to cost seven round trips (detail, visits, vitals,
+prescriptions, appointments, files, latest medical history); on 3G the
+latency of each one dominates. The chart is one document built with a fixed
+number of queries whatever the patient's history:
+
+- the patient row, with latest weight and latest medical history
+  (carry-forward pointer) annotated
+- one sliced Prefetch per section (visits + vitals, prescriptions + items,
+  appointments, files), each limited per patient in SQL
+
+Each section returns its first ``limit`` rows (same ordering as the list
+endpoint) and, when there are more, ``next``: the list endpoint's ?cursor=
+page that continues right after the last row.
+"""
+
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.urls import reverse
+from rest_framework.utils.urls import replace_query_param
+
+from appointments.models import Appointment
+from appointments.serializers import AppointmentSerializer
+from appointments.views import AppointmentListCreateAPIView
+from config.pagination import encode_cursor, keyset_values
+from patients.models import CarryForwardPointer, PatientFile
+from patients.serializers import PatientFileSerializer, PatientSerializer
+from prescriptions.models import Prescription, PrescriptionItem
+from prescriptions.serializers import PrescriptionDetailSerializer
+from prescriptions.views import PrescriptionViewSet
+from visits.models import Visit, VitalSign
+from visits.serializers import VisitSerializer
+from visits.views import VisitListCreateAPIView
+
+# Ordering of PatientFileViewSet's ?cursor= pages
+FILE_CURSOR_ORDERING = ("-uploaded_at", "id")
+DEFAULT_SECTION_LIMIT = 10
+MAX_SECTION_LIMIT = 50
+
+
+class Section:
+    def __init__(self, name, related_name, queryset, ordering, serializer_class, list_url):
+        self.name = name
+        self.related_name = related_name
+        self.queryset = queryset
+        self.ordering = ordering
+        self.serializer_class = serializer_class
+        # (url name, needs patient_id kwarg)
+        self.list_url = list_url
+
+    @property
+    def to_attr(self):
+        return f"chart_{self.name}"
+
+    def prefetch(self, limit):
+        # One extra row tells whether a next page exists
+        return Prefetch(
+            self.related_name,
+            queryset=self.queryset.order_by(*self.ordering)[:limit + 1],
+            to_attr=self.to_attr,
+        )
+
+    def next_link(self, request, patient, last_row, limit):
+        url_name, nested = self.list_url
+        if nested:
+            url = reverse(url_name, kwargs={"patient_id": patient.pk})
+        else:
+            url = replace_query_param(reverse(url_name), "patient", patient.pk)
+        url = replace_query_param(url, "page_size", limit)
+        url = replace_query_param(url, "cursor", encode_cursor(keyset_values(last_row, self.ordering)))
+        return request.build_absolute_uri(url)
+
+
+SECTIONS = [
+    Section(
+        "visits",
+        "visits",
+        Visit.objects.prefetch_related(
+            Prefetch("vital_signs", queryset=VitalSign.objects.order_by("-measured_at")),
+        ),
+        VisitListCreateAPIView.cursor_ordering,
+        VisitSerializer,
+        ("visit-list-create", False),
+    ),
+    Section(
+        "prescriptions",
+        "prescriptions",
+        Prescription.objects.select_related("visit").prefetch_related(
+            Prefetch("items", queryset=PrescriptionItem.objects.select_related("medication")),
+        ),
+        PrescriptionViewSet.cursor_ordering,
+        PrescriptionDetailSerializer,
+        ("prescription-list", False),
+    ),
+    Section(
+        "appointments",
+        "appointments",
+        Appointment.objects.select_related("doctor", "doctor__profile"),
+        AppointmentListCreateAPIView.cursor_ordering,
+        AppointmentSerializer,
+        ("appointment-list-create", False),
+    ),
+    Section(
+        "files",
+        "files",
+        PatientFile.objects.select_related("uploaded_by"),
+        FILE_CURSOR_ORDERING,
+        PatientFileSerializer,
+        ("patient-files-list", True),
+    ),
+]
+
+
+def section_limits(query_params):
+    """
+    Per-section row limits: ?limit= for all sections, ?<section>_limit= for
+    one (e.g. ?visits_limit=3). Capped at MAX_SECTION_LIMIT; 0 skips a section.
+    """
+    def parse(value, default):
+        try:
+            return max(0, min(int(value), MAX_SECTION_LIMIT))
+        except (TypeError, ValueError):
+            return default
+
+    default = parse(query_params.get("limit"), DEFAULT_SECTION_LIMIT)
+    return {
+        section.name: parse(query_params.get(f"{section.name}_limit"), default)
+        for section in SECTIONS
+    }
+
+
+def chart_queryset(queryset, limits):
+    """Patient queryset with the chart annotations and section prefetches."""
+    latest_medical_history = (
+        CarryForwardPointer.objects
+        .filter(patient=OuterRef("pk"), field="medical_history")
+        .values("visit__medical_history")[:1]
+    )
+    prefetches = [section.prefetch(limits[section.name]) for section in SECTIONS if limits[section.name]]
+    return (
+        queryset
+        .annotate(chart_medical_history=Subquery(latest_medical_history))
+        .prefetch_related(*prefetches)
+    )
+
+
+def build_chart(request, patient, limits):
+    """Serialize a patient loaded through chart_queryset()."""
+    context = {"request": request}
+    chart = {
+        "patient": PatientSerializer(patient, context=context).data,
+        "latest_medical_history": patient.chart_medical_history or "",
+    }
+    for section in SECTIONS:
+        limit = limits[section.name]
+        rows = getattr(patient, section.to_attr, [])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        chart[section.name] = {
+            "results": section.serializer_class(rows, many=True, context=context).data,
+            "next": section.next_link(request, patient, rows[-1], limit) if has_more else None,
+        }
+    return chart
@@ -0,0 +1,181 @@
+"""
+Duplicate patient detection.
+
+Returning patients get re-registered under another spelling ("Tshibangu" /
+"Chibangu"), which splits their history. Every patient has up to three
+blocking keys in PatientBlockingKey (indexed on kind, key):
+
+- name:  phonetic key of the names, order-insensitive (patients.phonetic)
+- dob:   date of birth
+- phone: normalized E.164 phone
+
+A check only looks at patients sharing at least one key with the new one,
+one indexed query instead of comparing against the whole table. A candidate
+is reported when the names sound alike, or when date of birth and phone
+both match (a first name typed differently).
+
+Warnings are returned on patient create; find_duplicate_patients (and the
+admin /api/patients/duplicates/ endpoint) reports every pair in the table.
+"""
+
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from patients.models import Patient, PatientBlockingKey
+from patients.phonetic import blocking_keys
+
+# Patient fields the keys are computed from
+BLOCKING_SOURCE_FIELDS = ("first_name", "last_name", "date_of_birth", "phone", "phone_e164")
+MATCH_WEIGHTS = {"name": 0.5, "dob": 0.3, "phone": 0.2}
+# Blocks this large (a clinic phone number typed for everyone, 1 January
+# birthdays) say nothing about duplicates and would cost n² pairs
+MAX_BLOCK_SIZE = 50
+
+
+def patient_keys(patient):
+    return blocking_keys(patient.first_name, patient.last_name, patient.date_of_birth, patient.phone_e164)
+
+
+def refresh_blocking_keys(patients, replace=True):
+    """
+    Store the keys of ``patients`` (saved Patient instances), replacing their
+    previous ones unless ``replace`` is False (patients just inserted).
+    """
+    patients = [patient for patient in patients if patient.pk]
+    if not patients:
+        return
+    rows = [
+        PatientBlockingKey(patient_id=patient.pk, kind=kind, key=key)
+        for patient in patients
+        for kind, key in patient_keys(patient).items()
+    ]
+    with transaction.atomic():
+        if replace:
+            PatientBlockingKey.objects.filter(patient_id__in=[patient.pk for patient in patients]).delete()
+        PatientBlockingKey.objects.bulk_create(rows)
+
+
+def refresh_all_blocking_keys(batch_size=1000):
+    """Backfill every patient, in primary-key batches. Returns the patient count."""
+    fields = ("pk", *BLOCKING_SOURCE_FIELDS)
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(Patient.objects.filter(pk__gt=last_pk).order_by("pk").only(*fields)[:batch_size])
+        if not batch:
+            break
+        refresh_blocking_keys(batch)
+        count += len(batch)
+        last_pk = batch[-1].pk
+    return count
+
+
+def is_candidate(matched):
+    return "name" in matched or {"dob", "phone"} <= matched
+
+
+def score(matched):
+    return round(sum(MATCH_WEIGHTS[kind] for kind in matched), 2)
+
+
+def _describe(patient, matched):
+    return {
+        "id": patient.id,
+        "patient_code": patient.patient_code,
+        "first_name": patient.first_name,
+        "last_name": patient.last_name,
+        "date_of_birth": patient.date_of_birth,
+        "phone": patient.phone,
+        "is_active": patient.is_active,
+        "matched_on": sorted(matched),
+        "score": score(matched),
+    }
+
+
+def find_duplicate_candidates(patient, limit=10):
+    """
+    Likely duplicates of ``patient`` (saved or not), best match first:
+    one query on the blocking keys, one for the candidate rows.
+
+    Each key reads at most MAX_BLOCK_SIZE + 1 rows, and blocks over
+    MAX_BLOCK_SIZE (counting this patient) are ignored, as in duplicate_pairs.
+    """
+    keys = patient_keys(patient)
+    if not keys:
+        return []
+
+    condition = Q()
+    for kind, key in keys.items():
+        block = PatientBlockingKey.objects.filter(kind=kind, key=key).values("pk")[:MAX_BLOCK_SIZE + 1]
+        condition |= Q(pk__in=block)
+
+    blocks = defaultdict(list)
+    for patient_id, kind in PatientBlockingKey.objects.filter(condition).values_list("patient_id", "kind"):
+        blocks[kind].append(patient_id)
+
+    matched = defaultdict(set)
+    for kind, patient_ids in blocks.items():
+        size = len(patient_ids) + (0 if patient.pk in patient_ids else 1)
+        if size > MAX_BLOCK_SIZE:
+            continue
+        for patient_id in patient_ids:
+            if patient_id != patient.pk:
+                matched[patient_id].add(kind)
+    matched = {pk: kinds for pk, kinds in matched.items() if is_candidate(kinds)}
+    if not matched:
+        return []
+
+    best = sorted(matched, key=lambda pk: (-score(matched[pk]), pk))[:limit]
+    patients = Patient.objects.in_bulk(best)
+    return [_describe(patients[pk], matched[pk]) for pk in best if pk in patients]
+
+
+def duplicate_pairs():
+    """
+    Every candidate pair in the table, as (patient id, patient id, matched kinds).
+    Works block by block; blocks over MAX_BLOCK_SIZE are skipped.
+    """
+    shared = (
+        PatientBlockingKey.objects
+        .values("kind", "key")
+        .annotate(size=Count("id"))
+        .filter(size__gt=1, size__lte=MAX_BLOCK_SIZE)
+    )
+    blocks = defaultdict(list)
+    for kind, key, patient_id in (
+        PatientBlockingKey.objects
+        .filter(Exists(shared.filter(kind=OuterRef("kind"), key=OuterRef("key"))))
+        .values_list("kind", "key", "patient_id")
+        .iterator(chunk_size=2000)
+    ):
+        blocks[kind, key].append(patient_id)
+
+    pairs = defaultdict(set)
+    for (kind, _), patient_ids in blocks.items():
+        if not 1 < len(patient_ids) <= MAX_BLOCK_SIZE:
+            continue
+        for pair in combinations(sorted(patient_ids), 2):
+            pairs[pair].add(kind)
+    return [(a, b, kinds) for (a, b), kinds in pairs.items() if is_candidate(kinds)]
+
+
+def duplicate_report(limit=None):
+    """
+    Candidate pairs, best first:
+    [{"score", "matched_on", "patients": [patient, patient]}, ...].
+    """
+    pairs = sorted(duplicate_pairs(), key=lambda pair: (-score(pair[2]), pair[0], pair[1]))
+    if limit:
+        pairs = pairs[:limit]
+    patients = Patient.objects.in_bulk({pk for a, b, _ in pairs for pk in (a, b)})
+    return [
+        {
+            "score": score(kinds),
+            "matched_on": sorted(kinds),
+            "patients": [_describe(patients[a], kinds), _describe(patients[b], kinds)],
+        }
+        for a, b, kinds in pairs
+    ]
@@ -0,0 +1,169 @@
+"""
+Bulk patient import from CSV or NDJSON (paper registers, legacy systems).
+
+Patient.save() writes each new row twice (INSERT, then UPDATE to set
+patient_code = PT-{id:06d}). For tens of thousands of rows the importer instead:
+
+1. streams the file row by row (never loads it whole),
+2. validates each chunk with PatientSerializer, collecting per-row errors
+   without aborting the chunk,
+3. inserts the valid rows with one bulk_create, under unique temporary codes,
+4. swaps the temporary codes for PT-{id:06d} with one set-based UPDATE.
+
+Columns: first_name, last_name, sex, date_of_birth, phone, address
+(the same fields as POST /api/patients/). Unknown columns are ignored.
+"""
+
+import csv
+import json
+import uuid
+
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, Greatest, Length, Lower, LPad
+
+from patients.models import Patient
+from patients.serializers import PatientSerializer
+from patients.services.duplicates import refresh_blocking_keys
+
+FORMATS = ("csv", "ndjson")
+DEFAULT_BATCH_SIZE = 500
+# Cap the per-row error list returned to clients; the count is always exact
+MAX_REPORTED_ERRORS = 500
+
+_TEMP_CODE_PREFIX = "TMP-"
+
+
+def guess_format(filename):
+    """Pick the import format from a file name ("register.csv" -> "csv")."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def first_invalid_utf8_line(fileobj):
+    """
+    Line number of the first line of a binary file that is not valid UTF-8,
+    or None. Run before importing: batches are committed as they go, so a
+    decode error halfway through would leave a partial import.
+    Rewinds the file.
+    """
+    fileobj.seek(0)
+    try:
+        # A "\n" byte never occurs inside a UTF-8 multi-byte sequence
+        for line_number, raw in enumerate(fileobj, start=1):
+            try:
+                raw.decode("utf-8")
+            except UnicodeDecodeError:
+                return line_number
+        return None
+    finally:
+        fileobj.seek(0)
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield (line_number, row, error) for each record of a text stream.
+    ``row`` is a dict, or None when the line itself could not be parsed.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON."
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object."
+            continue
+        yield line_number, row, None
+
+
+def _patient_code_expression():
+    """SQL equivalent of f"PT-{id:06d}" (zero-padded to at least 6 digits)."""
+    id_text = Cast("id", output_field=CharField())
+    return Concat(
+        Value("PT-"),
+        LPad(id_text, Greatest(Value(6), Length(id_text)), Value("0")),
+        output_field=CharField(),
+    )
+
+
+def _insert_batch(patients):
+    """bulk_create one validated chunk and assign its real patient codes."""
+    temp_codes = [p.patient_code for p in patients]
+    code = _patient_code_expression()
+    with transaction.atomic():
+        Patient.objects.bulk_create(patients)
+        # search_text was built without a code; prepend the real one in the same UPDATE
+        Patient.objects.filter(patient_code__in=temp_codes).update(
+            patient_code=code,
+            search_text=Concat(Lower(code), Value(" "), "search_text", output_field=CharField()),
+        )
+        # bulk_create sends no post_save: store the duplicate-detection keys here
+        refresh_blocking_keys(patients, replace=False)
+
+
+def _build_patient(validated_data, user):
+    patient = Patient(**validated_data, created_by=user)
+    patient.refresh_derived_fields()
+    patient.patient_code = f"{_TEMP_CODE_PREFIX}{uuid.uuid4().hex[:16]}"
+    return patient
+
+
+def import_patients(lines, fmt, user, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Import patients from an iterable of text lines.
+
+    Returns a report dict: rows, created, error_count and errors
+    (up to MAX_REPORTED_ERRORS of {"line", "errors"}).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt!r}")
+
+    report = {"rows": 0, "created": 0, "error_count": 0, "errors": []}
+
+    def add_error(line_number, errors):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "errors": errors})
+
+    batch = []
+    for line_number, row, error in iter_rows(lines, fmt):
+        report["rows"] += 1
+        if error:
+            add_error(line_number, {"non_field_errors": [error]})
+            continue
+
+        serializer = PatientSerializer(data=row)
+        if not serializer.is_valid():
+            add_error(line_number, {
+                field: [str(message) for message in messages]
+                for field, messages in serializer.errors.items()
+            })
+            continue
+
+        batch.append(_build_patient(serializer.validated_data, user))
+        if len(batch) >= batch_size:
+            if not dry_run:
+                _insert_batch(batch)
+            report["created"] += len(batch)
+            batch = []
+
+    if batch:
+        if not dry_run:
+            _insert_batch(batch)
+        report["created"] += len(batch)
+
+    return report
@@ -0,0 +1,82 @@
+"""
+Merge a duplicate patient into the record that survives.
+
+Everything is re-pointed with one UPDATE ... WHERE patient_id = <duplicate>
+per table inside a single transaction, so the cost does not depend on how
+many visits or files the duplicate has. SMS reminder logs belong to their
+appointment and move with it.
+
+Bulk UPDATEs send no signals, so the derived data is rebuilt explicitly
+afterwards: last/next visit columns of both patients and the survivor's
+carry-forward pointers. The duplicate is archived (never deleted), loses
+its duplicate-detection keys, and the merge is recorded in PatientMerge.
+"""
+
+from django.db import transaction
+
+from appointments.models import Appointment, AppointmentSMSLog
+from patients.models import (
+    CarryForwardPointer,
+    Patient,
+    PatientBlockingKey,
+    PatientFile,
+    PatientFileUpload,
+    PatientMerge,
+)
+from patients.services.carry_forward import refresh_carry_forward
+from patients.services.visit_summary import refresh_visit_summary
+from prescriptions.models import Prescription
+from visits.models import Visit
+
+# Snapshot of the duplicate's identity kept in the audit record
+SNAPSHOT_FIELDS = ("patient_code", "first_name", "last_name", "sex", "date_of_birth", "phone", "address")
+
+
+class MergeError(ValueError):
+    """The two patients cannot be merged (message is user-facing)."""
+
+
+def merge_patients(survivor_id, duplicate_id, user):
+    """
+    Move every record of ``duplicate_id`` onto ``survivor_id``.
+    Returns the PatientMerge audit row; raises MergeError when refused.
+    """
+    if survivor_id == duplicate_id:
+        raise MergeError("A patient cannot be merged into itself.")
+
+    with transaction.atomic():
+        # Lock both rows, in a fixed order so concurrent merges cannot deadlock
+        locked = Patient.objects.select_for_update().in_bulk(sorted([survivor_id, duplicate_id]))
+        survivor, duplicate = locked.get(survivor_id), locked.get(duplicate_id)
+        if survivor is None or duplicate is None:
+            raise MergeError("Patient not found.")
+        if not survivor.is_active:
+            raise MergeError("Cannot merge into an archived patient.")
+        if PatientMerge.objects.filter(merged_patient=duplicate).exists():
+            raise MergeError("This patient has already been merged into another one.")
+
+        sms_logs = AppointmentSMSLog.objects.filter(appointment__patient_id=duplicate.pk).count()
+        moved = {
+            "visits": Visit.objects.filter(patient_id=duplicate.pk).update(patient_id=survivor.pk),
+            "prescriptions": Prescription.objects.filter(patient_id=duplicate.pk).update(patient_id=survivor.pk),
+            "appointments": Appointment.objects.filter(patient_id=duplicate.pk).update(patient_id=survivor.pk),
+            "sms_logs": sms_logs,
+            "files": PatientFile.objects.filter(patient_id=duplicate.pk).update(patient_id=survivor.pk),
+            "uploads": PatientFileUpload.objects.filter(patient_id=duplicate.pk).update(patient_id=survivor.pk),
+        }
+
+        # The duplicate is now empty: drop its derived rows and archive it
+        CarryForwardPointer.objects.filter(patient_id=duplicate.pk).delete()
+        PatientBlockingKey.objects.filter(patient_id=duplicate.pk).delete()
+        Patient.objects.filter(pk=duplicate.pk).update(is_active=False)
+
+        refresh_visit_summary({survivor.pk, duplicate.pk})
+        refresh_carry_forward({survivor.pk})
+
+        return PatientMerge.objects.create(
+            survivor=survivor,
+            merged_patient=duplicate,
+            merged_patient_snapshot={field: str(getattr(duplicate, field)) for field in SNAPSHOT_FIELDS},
+            moved=moved,
+            merged_by=user,
+        )
@@ -0,0 +1,140 @@
+"""
+Thumbnails for patient files, so a file list costs kilobytes instead of the
+5-10 MB phone photos behind it.
+
+After a PatientFile is saved (and its transaction committed) a small
+in-process thread pool renders one WebP per PREVIEW_SIZES entry and stores
+it next to the original under ``previews/``. Images are decoded with
+Pillow (JPEG at reduced scale via draft mode); PDFs get a first-page raster
+when the optional PyMuPDF package (``fitz``) is installed.
+
+Files saved while the pool was busy or the process restarted stay
+``pending``; the generate_file_previews command sweeps them up.
+"""
+
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections, transaction
+
+from PIL import Image, ImageOps
+
+try:
+    import fitz  # PyMuPDF, optional: PDF first-page previews
+except ImportError:
+    fitz = None
+
+from patients.models import PatientFile
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels
+PREVIEW_SIZES = {"small": 160, "medium": 640}
+PREVIEW_FORMAT = "WEBP"
+PREVIEW_QUALITY = 75
+# Refuse to decode absurdly large images (decompression bombs)
+MAX_SOURCE_PIXELS = 80_000_000
+# PDF first page raster resolution before downscaling
+PDF_RENDER_DPI = 110
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PATIENT_FILE_PREVIEW_WORKERS,
+            thread_name_prefix="file-previews",
+        )
+    return _executor
+
+
+def is_previewable(file_type):
+    if file_type.startswith("image/"):
+        return True
+    return file_type == "application/pdf" and fitz is not None
+
+
+def _open_source_image(patient_file):
+    largest = max(PREVIEW_SIZES.values())
+    with patient_file.file.open("rb") as fh:
+        if patient_file.file_type == "application/pdf":
+            with fitz.open(stream=fh.read(), filetype="pdf") as doc:
+                pixmap = doc[0].get_pixmap(dpi=PDF_RENDER_DPI)
+            image = Image.open(BytesIO(pixmap.tobytes("png")))
+            image.load()
+            return image
+
+        image = Image.open(fh)
+        if image.width * image.height > MAX_SOURCE_PIXELS:
+            raise ValueError(f"Image too large to preview ({image.width}x{image.height})")
+        # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale, much cheaper than a full decode
+        image.draft("RGB", (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+        return image
+
+
+def preview_name(patient_file, size):
+    directory, filename = posixpath.split(patient_file.file.name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "previews", f"{stem}_{size}.webp")
+
+
+def generate_previews(patient_file):
+    """Render and store every preview size; updates previews / preview_status."""
+    if not is_previewable(patient_file.file_type):
+        patient_file.preview_status = "unsupported"
+        patient_file.save(update_fields=["preview_status"])
+        return
+
+    storage = patient_file.file.storage
+    previews = {}
+    try:
+        image = _open_source_image(patient_file)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for size, pixels in sorted(PREVIEW_SIZES.items(), key=lambda item: -item[1]):
+            image.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, PREVIEW_FORMAT, quality=PREVIEW_QUALITY, method=4)
+            previews[size] = storage.save(preview_name(patient_file, size), ContentFile(buffer.getvalue()))
+    except Exception:
+        logger.warning("Preview generation failed for PatientFile #%s", patient_file.pk, exc_info=True)
+        for name in previews.values():
+            storage.delete(name)
+        patient_file.preview_status = "failed"
+        patient_file.save(update_fields=["preview_status"])
+        return
+
+    patient_file.previews = previews
+    patient_file.preview_status = "ready"
+    patient_file.save(update_fields=["previews", "preview_status"])
+
+
+def _generate_in_worker(patient_file_id):
+    close_old_connections()
+    try:
+        patient_file = PatientFile.objects.filter(pk=patient_file_id, preview_status="pending").first()
+        if patient_file:
+            generate_previews(patient_file)
+    except Exception:
+        logger.exception("Preview worker crashed for PatientFile #%s", patient_file_id)
+    finally:
+        # Pool threads keep their own connection; do not leak it
+        connections.close_all()
+
+
+def schedule_previews(patient_file):
+    """Queue preview generation once the current transaction commits."""
+    if not settings.PATIENT_FILE_PREVIEWS_ASYNC:
+        transaction.on_commit(lambda: generate_previews(patient_file))
+        return
+    patient_file_id = patient_file.pk
+    transaction.on_commit(lambda: _get_executor().submit(_generate_in_worker, patient_file_id))
@@ -0,0 +1,123 @@
+"""
+Unified patient timeline: visits, vitals, prescriptions, appointments, SMS
+reminders and uploaded files, newest first.
+
+Each source is its own ordered query, bounded to one page past the cursor
+(LIMIT page_size + 1, served by a (patient, -date, id) index where the
+source has a patient column), and the per-source streams are k-way merged
+lazily with heapq.merge. A page therefore reads at most
+sources x (page_size + 1) rows whatever its depth: nothing is loaded and
+sorted in Python beyond that.
+
+Events are ordered by (date desc, kind, id). The cursor is the last event's
+(date, kind, id); for each source it becomes a plain keyset filter:
+
+- kinds ranked after the cursor's: date <= cursor date
+- the cursor's kind:               date < d OR (date = d AND id > cursor id)
+- kinds ranked before:             date < cursor date
+"""
+
+import heapq
+from itertools import islice
+
+from rest_framework.exceptions import NotFound
+
+from appointments.models import Appointment, AppointmentSMSLog
+from config.pagination import decode_cursor, encode_cursor, keyset_filter
+from patients.models import PatientFile
+from prescriptions.models import Prescription
+from visits.models import Visit, VitalSign
+
+
+class Source:
+    def __init__(self, kind, model, patient_lookup, date_field, fields):
+        self.kind = kind
+        self.model = model
+        self.patient_lookup = patient_lookup
+        self.date_field = date_field
+        self.fields = fields
+
+    @property
+    def ordering(self):
+        return (f"-{self.date_field}", "id")
+
+    def events(self, patient_id, cursor, limit):
+        queryset = self.model.objects.filter(**{self.patient_lookup: patient_id})
+        if cursor:
+            date, kind, pk = cursor
+            rank, cursor_rank = KIND_RANK[self.kind], KIND_RANK[kind]
+            if rank > cursor_rank:
+                queryset = queryset.filter(**{f"{self.date_field}__lte": date})
+            elif rank == cursor_rank:
+                queryset = queryset.filter(keyset_filter(self.ordering, [date, pk]))
+            else:
+                queryset = queryset.filter(**{f"{self.date_field}__lt": date})
+
+        rows = queryset.order_by(*self.ordering).values("id", self.date_field, *self.fields)[:limit]
+        for row in rows:
+            yield {
+                "type": self.kind,
+                "id": row.pop("id"),
+                "date": row.pop(self.date_field),
+                "data": row,
+            }
+
+
+# Order of this list breaks ties between events sharing a timestamp
+SOURCES = [
+    Source("visit", Visit, "patient_id", "visit_date", (
+        "visit_type", "chief_complaint", "assessment", "created_by_id",
+    )),
+    Source("vital", VitalSign, "visit__patient_id", "measured_at", (
+        "visit_id", "weight_kg", "height_cm", "temperature_c", "bp_systolic", "bp_diastolic",
+        "heart_rate_bpm", "respiratory_rate_rpm", "oxygen_saturation_pct",
+    )),
+    Source("prescription", Prescription, "patient_id", "created_at", (
+        "visit_id", "prescriber_id", "notes",
+    )),
+    Source("appointment", Appointment, "patient_id", "scheduled_at", (
+        "status", "reason", "doctor_id", "visit_id",
+    )),
+    Source("sms", AppointmentSMSLog, "appointment__patient_id", "created_at", (
+        "appointment_id", "status", "phone",
+    )),
+    Source("file", PatientFile, "patient_id", "uploaded_at", (
+        "original_filename", "category", "file_type", "file_size",
+    )),
+]
+KIND_RANK = {source.kind: rank for rank, source in enumerate(SOURCES)}
+
+
+def _sort_key(event):
+    # heapq.merge(reverse=True): date descending, then kind and id ascending
+    return event["date"], -KIND_RANK[event["type"]], -event["id"]
+
+
+def parse_cursor(token):
+    values, _ = decode_cursor(token)
+    if len(values) != 3 or values[1] not in KIND_RANK:
+        raise NotFound("Invalid cursor.")
+    try:
+        values[2] = int(values[2])
+    except (TypeError, ValueError):
+        raise NotFound("Invalid cursor.")
+    return values
+
+
+def timeline_page(patient_id, cursor=None, page_size=20, kinds=None):
+    """
+    One page of events after ``cursor`` (a parse_cursor() value).
+    Returns (events, next cursor token or None).
+    """
+    sources = [source for source in SOURCES if not kinds or source.kind in kinds]
+    merged = heapq.merge(
+        *(source.events(patient_id, cursor, page_size + 1) for source in sources),
+        key=_sort_key,
+        reverse=True,
+    )
+    events = list(islice(merged, page_size + 1))
+    if len(events) <= page_size:
+        return events, None
+    events = events[:page_size]
+    last = events[-1]
+    return events, encode_cursor([last["date"], last["type"], last["id"]])
@@ -0,0 +1,163 @@
+"""
+Chunked, resumable patient file uploads (PatientFileUpload sessions).
+
+A multipart POST buffers the whole file in the worker and re-sends it to
+storage in one piece; a dropped mobile connection restarts from zero.
+Upload sessions instead receive the file as a series of PUT chunks at
+explicit offsets, each one written straight to its final storage:
+
+- FileSystemStorage: appended to the reserved target file
+- S3Storage (R2): one S3 multipart-upload part per chunk
+
+The PatientFile row is only created when the session is committed.
+A commit claims the session as "committing" while it assembles and hashes
+the file; a session left there by a killed worker is aborted once stale
+(abort_stale_commits, run by gc_blobs).
+"""
+
+import shutil
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from patients.models import PatientFile, PatientFileUpload, patient_file_path
+
+# S3 (and R2) reject multipart parts smaller than 5 MiB, except the last one
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+# Largest single PUT accepted; chunks are spooled to disk before being stored
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+# Chunk bytes kept in memory before spooling to a temporary file
+CHUNK_SPOOL_MEMORY = 1024 * 1024
+# A commit still "committing" after this was lost with its worker
+COMMIT_TIMEOUT = timedelta(hours=1)
+
+
+def file_storage():
+    return PatientFile._meta.get_field("file").storage
+
+
+def is_local_storage(storage):
+    return isinstance(storage, FileSystemStorage)
+
+
+def _s3_client_and_key(storage, name):
+    from storages.utils import clean_name
+
+    return storage.bucket.meta.client, storage._normalize_name(clean_name(name))
+
+
+def start_upload(session):
+    """Reserve the target name (and open the S3 multipart upload)."""
+    storage = file_storage()
+    max_length = PatientFile._meta.get_field("file").max_length
+    name = storage.get_available_name(
+        patient_file_path(session, session.original_filename), max_length=max_length,
+    )
+
+    if is_local_storage(storage):
+        # Create the empty target now so no other upload can take the name
+        session.storage_name = storage.save(name, ContentFile(b""), max_length=max_length)
+    else:
+        client, key = _s3_client_and_key(storage, name)
+        response = client.create_multipart_upload(
+            Bucket=storage.bucket_name, Key=key, ContentType=session.file_type,
+        )
+        session.storage_name = name
+        session.multipart_upload_id = response["UploadId"]
+
+
+def write_chunk(session, chunk, length):
+    """
+    Write ``length`` bytes from the file-like ``chunk`` at the session's
+    current offset. The caller advances received_size and saves the session.
+    """
+    storage = file_storage()
+
+    if is_local_storage(storage):
+        with open(storage.path(session.storage_name), "r+b") as fh:
+            # Seek rather than append: a retried chunk overwrites its own bytes
+            fh.seek(session.received_size)
+            fh.truncate()
+            shutil.copyfileobj(chunk, fh)
+        return
+
+    client, key = _s3_client_and_key(storage, session.storage_name)
+    part_number = len(session.parts) + 1
+    response = client.upload_part(
+        Bucket=storage.bucket_name,
+        Key=key,
+        UploadId=session.multipart_upload_id,
+        PartNumber=part_number,
+        Body=chunk,
+        ContentLength=length,
+    )
+    session.parts = [*session.parts, {"PartNumber": part_number, "ETag": response["ETag"]}]
+
+
+def finish_upload(session):
+    """
+    Assemble the stored object once every byte has been received. Clears
+    multipart_upload_id once assembled (the caller saves the session), so a
+    retried commit does not complete the upload twice.
+    """
+    storage = file_storage()
+    if is_local_storage(storage) or not session.multipart_upload_id:
+        return
+
+    client, key = _s3_client_and_key(storage, session.storage_name)
+    client.complete_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=key,
+        UploadId=session.multipart_upload_id,
+        MultipartUpload={"Parts": session.parts},
+    )
+    session.multipart_upload_id = ""
+
+
+def abort_upload(session):
+    """Discard everything received so far."""
+    storage = file_storage()
+    if not session.storage_name:
+        return
+
+    if is_local_storage(storage) or not session.multipart_upload_id:
+        # Local file, or an object already assembled by a commit
+        storage.delete(session.storage_name)
+        return
+
+    client, key = _s3_client_and_key(storage, session.storage_name)
+    client.abort_multipart_upload(
+        Bucket=storage.bucket_name, Key=key, UploadId=session.multipart_upload_id,
+    )
+
+
+def is_stale_commit(session, now=None):
+    """Whether ``session`` has been "committing" for longer than COMMIT_TIMEOUT."""
+    return session.status == "committing" and session.updated_at < (now or timezone.now()) - COMMIT_TIMEOUT
+
+
+def abort_stale_commits(now=None, dry_run=False):
+    """
+    Abort sessions left "committing" by a killed worker and discard their
+    stored bytes. Returns the number of sessions aborted.
+    """
+    cutoff = (now or timezone.now()) - COMMIT_TIMEOUT
+    count = 0
+    for session in PatientFileUpload.objects.filter(status="committing", updated_at__lt=cutoff).iterator():
+        if not dry_run:
+            # Claim it: the commit may have finished meanwhile
+            claimed = PatientFileUpload.objects.filter(
+                pk=session.pk, status="committing", updated_at__lt=cutoff
+            ).update(status="aborted", updated_at=timezone.now())
+            if not claimed:
+                continue
+            abort_upload(session)
+        count += 1
+    return count
+
+
+def requires_min_part_size():
+    """Whether non-final chunks must be at least S3_MIN_PART_SIZE bytes."""
+    return not is_local_storage(file_storage())
@@ -0,0 +1,79 @@
+"""
+Denormalized last/next visit columns on Patient.
+
+The patient list used to compute last/next visit dates with Max/Min over a
+JOIN to every visit on every request. Instead we store them on the patient row:
+
+- last_visit_at / last_visit: most recent visit that already happened (<= now)
+- next_visit_at: earliest upcoming visit (> now)
+
+Every refresh is a single set-based UPDATE with correlated subqueries, so it
+costs the same for one patient (Visit signals) or for the whole table (backfill).
+Because a "next" visit becomes "last" as time passes, patients whose
+next_visit_at is in the past must be rolled over periodically
+(see the refresh_visit_summaries management command).
+"""
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from patients.models import Patient
+from visits.models import Visit
+
+
+def _summary_updates(now):
+    past = (
+        Visit.objects
+        .filter(patient=OuterRef("pk"), visit_date__lte=now)
+        .order_by("-visit_date", "-id")
+    )
+    upcoming = (
+        Visit.objects
+        .filter(patient=OuterRef("pk"), visit_date__gt=now)
+        .order_by("visit_date", "id")
+    )
+    return {
+        "last_visit_at": Subquery(past.values("visit_date")[:1]),
+        "last_visit_id": Subquery(past.values("id")[:1]),
+        "next_visit_at": Subquery(upcoming.values("visit_date")[:1]),
+    }
+
+
+def refresh_visit_summary(patient_ids, now=None):
+    """
+    Recompute last/next visit columns for the given patient ids.
+    Returns the number of patient rows updated.
+    """
+    patient_ids = {pk for pk in patient_ids if pk is not None}
+    if not patient_ids:
+        return 0
+    now = now or timezone.now()
+    return Patient.objects.filter(pk__in=patient_ids).update(**_summary_updates(now))
+
+
+def refresh_all_visit_summaries(now=None, batch_size=1000):
+    """Backfill every patient, in primary-key batches to keep transactions short."""
+    now = now or timezone.now()
+    ids = Patient.objects.order_by("pk").values_list("pk", flat=True)
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        updated += Patient.objects.filter(pk__in=batch).update(**_summary_updates(now))
+        last_pk = batch[-1]
+    return updated
+
+
+def roll_over_visit_summaries(now=None):
+    """
+    Refresh only the patients whose stored "next" visit is no longer upcoming.
+    Uses the next_visit_at index, so it is cheap enough to run every few minutes.
+    """
+    now = now or timezone.now()
+    return (
+        Patient.objects
+        .filter(next_visit_at__lte=now)
+        .update(**_summary_updates(now))
+    )
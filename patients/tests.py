@@ -1,3 +1,1938 @@
-from django.test import TestCase
+"""
+Tests for the patients app.
 
-# Create your tests here.
+Covers:
+- Denormalized last/next visit columns (Visit signals, rollover, backfill)
+- Constant query count for the patient list (no per-row N+1)
+- Indexed, accent-insensitive patient search
+- Search-as-you-type lookup endpoint
+- Normalized phone_e164 column (save, backfill, search, exact lookup)
+- Keyset (?cursor=) and count-less (?count=false) list pagination
+- Bulk CSV/NDJSON import (command + admin endpoint)
+- Streaming CSV/NDJSON exports (patients, visits, prescriptions)
+- Patient file downloads (presigned R2 redirect, Range / ETag locally)
+- Chunked, resumable upload sessions (local append, S3 multipart)
+- WebP thumbnails for uploaded images
+- Content-addressed (SHA-256) file deduplication and blob GC
+- Upload-time image recompression (EXIF stripped, pixel cap, WebP)
+- Streaming ZIP archive of a patient's files
+- Single-request patient chart (fixed query count, per-section cursors)
+- Unified patient timeline (k-way merge, composite cursor)
+- Carry-forward pointers (latest medical history, treatment, allergies)
+- Duplicate detection on phonetic / date of birth / phone blocking keys
+- Set-based patient merge (one UPDATE per table, audit record)
+- Bulk archive / restore (set-wise permissions, single UPDATE)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointments.models import Appointment, AppointmentSMSLog
+from patients.models import (
+    CarryForwardPointer, Patient, PatientBlockingKey, PatientFile, PatientFileUpload, PatientMerge, StoredBlob,
+)
+from patients.phonetic import phonetic_key
+from patients.search import normalize_search_text, patients_with_phone, search_patients
+from PIL import Image
+
+from patients.services import blobs, previews, uploads
+from patients.services.duplicates import MAX_BLOCK_SIZE
+from patients.services.importer import DEFAULT_BATCH_SIZE, import_patients
+from patients.services.visit_summary import roll_over_visit_summaries
+from prescriptions.models import Medication, Prescription, PrescriptionItem
+from visits.models import Visit, VitalSign
+
+User = get_user_model()
+
+
+def make_patient(user, **kwargs):
+    data = {
+        "first_name": "Marie",
+        "last_name": "Kabila",
+        "sex": "F",
+        "date_of_birth": "2015-06-15",
+        "phone": "+243812345678",
+        "address": "Kinshasa",
+        "created_by": user,
+    }
+    data.update(kwargs)
+    return Patient.objects.create(**data)
+
+
+# =========================================================================
+# Denormalized visit summary
+# =========================================================================
+class VisitSummaryTest(TestCase):
+    """Patient.last_visit_at / next_visit_at follow Visit changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_summary", password="testpass123")
+
+    def setUp(self):
+        self.patient = make_patient(self.user)
+        self.now = timezone.now()
+
+    def test_new_patient_has_no_visits(self):
+        self.assertIsNone(self.patient.last_visit_at)
+        self.assertIsNone(self.patient.next_visit_at)
+        self.assertIsNone(self.patient.last_visit_id)
+
+    def test_past_and_future_visits(self):
+        old = Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=10))
+        recent = Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=1))
+        soon = Visit.objects.create(patient=self.patient, visit_date=self.now + timedelta(days=2))
+        Visit.objects.create(patient=self.patient, visit_date=self.now + timedelta(days=9))
+
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.last_visit_id, recent.id)
+        self.assertEqual(self.patient.last_visit_at, recent.visit_date)
+        self.assertEqual(self.patient.next_visit_at, soon.visit_date)
+        self.assertNotEqual(self.patient.last_visit_id, old.id)
+
+    def test_delete_visit_refreshes(self):
+        visit = Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=1))
+        visit.delete()
+
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.last_visit_at)
+        self.assertIsNone(self.patient.last_visit_id)
+
+    def test_moving_visit_refreshes_both_patients(self):
+        other = make_patient(self.user, first_name="Pierre")
+        visit = Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=1))
+
+        visit.patient = other
+        visit.save()
+
+        self.patient.refresh_from_db()
+        other.refresh_from_db()
+        self.assertIsNone(self.patient.last_visit_at)
+        self.assertEqual(other.last_visit_id, visit.id)
+
+    def test_rollover_moves_next_to_last(self):
+        visit = Visit.objects.create(patient=self.patient, visit_date=self.now + timedelta(hours=1))
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.next_visit_at, visit.visit_date)
+
+        updated = roll_over_visit_summaries(now=self.now + timedelta(hours=2))
+
+        self.assertEqual(updated, 1)
+        self.patient.refresh_from_db()
+        self.assertIsNone(self.patient.next_visit_at)
+        self.assertEqual(self.patient.last_visit_id, visit.id)
+
+    def test_backfill_command(self):
+        visit = Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=3))
+        Patient.objects.update(last_visit_at=None, last_visit=None)
+
+        out = StringIO()
+        call_command("refresh_visit_summaries", "--all", stdout=out)
+
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.last_visit_id, visit.id)
+        self.assertIn("Backfilled", out.getvalue())
+
+    def test_list_endpoint_orders_by_stored_column(self):
+        other = make_patient(self.user, last_name="Zola")
+        Visit.objects.create(patient=other, visit_date=self.now - timedelta(days=1))
+        Visit.objects.create(patient=self.patient, visit_date=self.now - timedelta(days=5))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/patients/", {"ordering": "-last_visit_date"})
+
+        self.assertEqual(response.status_code, 200)
+        ids = [row["id"] for row in response.data["results"]]
+        self.assertEqual(ids, [other.id, self.patient.id])
+        self.assertIsNotNone(response.data["results"][0]["last_visit_date"])
+
+
+# =========================================================================
+# Patient list query budget
+# =========================================================================
+class PatientListQueryCountTest(TestCase):
+    """latest_weight_kg / last_visit_id must not cost a query per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_queries", password="testpass123")
+        now = timezone.now()
+        for i in range(30):
+            patient = make_patient(cls.user, last_name=f"Patient{i:02d}")
+            visit = Visit.objects.create(patient=patient, visit_date=now - timedelta(days=i + 1))
+            VitalSign.objects.create(visit=visit, weight_kg=20 + i)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/patients/", {"page_size": page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), page_size)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_independent_of_page_size(self):
+        small, _ = self._count_queries(2)
+        large, _ = self._count_queries(30)
+        self.assertEqual(small, large)
+
+    def test_latest_weight_and_last_visit_values(self):
+        _, response = self._count_queries(30)
+        row = response.data["results"][0]
+        patient = Patient.objects.get(pk=row["id"])
+        self.assertEqual(row["latest_weight_kg"], 20)
+        self.assertEqual(row["last_visit_id"], patient.visits.get().id)
+
+    def test_created_patient_has_null_weight(self):
+        response = self.client.post("/api/patients/", {
+            "first_name": "Jean",
+            "last_name": "Mbuyi",
+            "sex": "M",
+            "date_of_birth": "1990-01-01",
+            "address": "Lubumbashi",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data["latest_weight_kg"])
+
+
+# =========================================================================
+# Cursor / count-less pagination
+# =========================================================================
+class ListPaginationModesTest(TestCase):
+    """?cursor= walks the stable ordering without OFFSET; neither mode runs COUNT(*)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_pages", password="testpass123")
+        now = timezone.now()
+        # Duplicate names and visit dates so the id tie-breaker matters
+        for i in range(7):
+            patient = make_patient(cls.user, last_name=f"Name{i // 2}", first_name="Same")
+            Visit.objects.create(patient=patient, visit_date=now - timedelta(days=i // 3))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url, params):
+        ids, pages = [], []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            pages.append(response)
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_patient_cursor_follows_name_order(self):
+        ids, pages = self._walk("/api/patients/", {"cursor": "", "page_size": 3})
+        expected = list(Patient.objects.order_by("last_name", "first_name", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0].data["previous"])
+
+    def test_patient_cursor_previous_link(self):
+        _, pages = self._walk("/api/patients/", {"cursor": "", "page_size": 3})
+        response = self.client.get(pages[2].data["previous"])
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]],
+            [row["id"] for row in pages[1].data["results"]],
+        )
+        self.assertIsNotNone(response.data["next"])
+
+    def test_visit_cursor_mixed_direction(self):
+        ids, _ = self._walk("/api/visits/", {"cursor": "", "page_size": 2})
+        expected = list(Visit.objects.order_by("-visit_date", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_skips_count_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/patients/", {"cursor": "", "page_size": 3})
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in ctx.captured_queries))
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get("/api/patients/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_count_false_pages(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/visits/", {"count": "false", "page_size": 5})
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in ctx.captured_queries))
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["next"])
+        ids, _ = self._walk(response.data["next"], {})
+        self.assertEqual(len(ids), 2)
+
+    def test_default_mode_keeps_count(self):
+        response = self.client.get("/api/patients/", {"page_size": 3})
+        self.assertEqual(response.data["count"], 7)
+
+
+# =========================================================================
+# Patient search
+# =========================================================================
+class NormalizeSearchTextTest(TestCase):
+    """Accents, case and ligatures are folded for French names."""
+
+    def test_accents_and_case(self):
+        self.assertEqual(normalize_search_text("  Élodie KABILÁ "), "elodie kabila")
+
+    def test_ligature(self):
+        self.assertEqual(normalize_search_text("Cœur"), "coeur")
+
+    def test_empty(self):
+        self.assertEqual(normalize_search_text(None), "")
+
+
+class PatientSearchTest(TestCase):
+    """?search= on the patient list uses the search_text index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_search", password="testpass123")
+        cls.helene = make_patient(cls.user, first_name="Hélène", last_name="Mbuyi", phone="+243 81 234 5678")
+        cls.jean = make_patient(cls.user, first_name="Jean", last_name="Lukusa", phone="0999000111",
+                                address="Avenue Kasa-Vubu")
+        cls.helena = make_patient(cls.user, first_name="Helena", last_name="Mbuyi-Kalala", phone="")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _search(self, query, **params):
+        response = self.client.get("/api/patients/", {"search": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_search_text_is_stored(self):
+        self.assertIn("helene mbuyi", self.helene.search_text)
+        self.assertIn(self.helene.patient_code.lower(), self.helene.search_text)
+        self.assertIn("243812345678", self.helene.search_text)
+
+    def test_accent_insensitive(self):
+        self.assertEqual(self._search("helene"), [self.helene.id])
+        self.assertEqual(self._search("HÉLÈNE mbuyi"), [self.helene.id])
+
+    def test_patient_code(self):
+        self.assertEqual(self._search(self.jean.patient_code), [self.jean.id])
+
+    def test_phone_digits(self):
+        self.assertEqual(self._search("2345678"), [self.helene.id])
+
+    def test_address(self):
+        self.assertEqual(self._search("kasa-vubu"), [self.jean.id])
+
+    def test_short_term(self):
+        self.assertEqual(self._search("lu"), [self.jean.id])
+
+    def test_ranking_prefers_closer_match(self):
+        ids = self._search("mbuyi")
+        self.assertEqual(set(ids), {self.helene.id, self.helena.id})
+        ranked = list(search_patients(Patient.objects.all(), "mbuyi").order_by("-search_rank"))
+        self.assertEqual(ranked[0].id, ids[0])
+
+    def test_explicit_ordering_wins(self):
+        ids = self._search("mbuyi", ordering="-first_name")
+        self.assertEqual(ids, [self.helene.id, self.helena.id])
+
+    def test_search_follows_updates(self):
+        self.jean.last_name = "Tshisekedi"
+        self.jean.save()
+        self.assertEqual(self._search("tshisekedi"), [self.jean.id])
+        self.assertEqual(self._search("lukusa"), [])
+
+    def test_search_follows_partial_update(self):
+        self.jean.first_name = "Jérôme"
+        self.jean.save(update_fields=["first_name"])
+        self.assertEqual(self._search("jerome"), [self.jean.id])
+
+
+# =========================================================================
+# Lookup endpoint
+# =========================================================================
+class PatientLookupTest(TestCase):
+    """/api/patients/lookup/ matches by prefix and returns a minimal payload."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_lookup", password="testpass123")
+        cls.emile = make_patient(cls.user, first_name="Émile", last_name="Ngoy", phone="0812000111")
+        cls.emilie = make_patient(cls.user, first_name="Emilie", last_name="Ilunga", phone="0999000222")
+        cls.archived = make_patient(cls.user, first_name="Emil", last_name="Ngoyi", is_active=False)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _lookup(self, q, **params):
+        response = self.client.get("/api/patients/lookup/", {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_minimal_payload(self):
+        rows = self._lookup("ngoy")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            set(rows[0]),
+            {"id", "patient_code", "first_name", "last_name", "date_of_birth", "phone"},
+        )
+
+    def test_prefix_on_first_name_is_accent_insensitive(self):
+        ids = [row["id"] for row in self._lookup("emil")]
+        self.assertEqual(ids, [self.emilie.id, self.emile.id])  # ordered by last name
+
+    def test_prefix_only(self):
+        self.assertEqual(self._lookup("goy"), [])
+
+    def test_multiple_terms(self):
+        ids = [row["id"] for row in self._lookup("emi ngo")]
+        self.assertEqual(ids, [self.emile.id])
+
+    def test_patient_code(self):
+        ids = [row["id"] for row in self._lookup(self.emilie.patient_code.lower())]
+        self.assertEqual(ids, [self.emilie.id])
+
+    def test_phone_digits(self):
+        ids = [row["id"] for row in self._lookup("0999")]
+        self.assertEqual(ids, [self.emilie.id])
+
+    def test_limit(self):
+        self.assertEqual(len(self._lookup("emil", limit=1)), 1)
+
+    def test_empty_query(self):
+        self.assertEqual(self._lookup(""), [])
+
+
+# =========================================================================
+# Normalized phone
+# =========================================================================
+class PhoneE164Test(TestCase):
+    """Patient.phone_e164 is maintained on save and used for lookups."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_phone", password="testpass123")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_normalized_on_save(self):
+        patient = make_patient(self.user, phone="+243 81 234 5678")
+        self.assertEqual(patient.phone_e164, "+243812345678")
+
+    def test_invalid_phone_is_null(self):
+        patient = make_patient(self.user, phone="12")
+        self.assertIsNone(patient.phone_e164)
+
+    def test_updated_with_phone(self):
+        patient = make_patient(self.user)
+        patient.phone = "0999000111"
+        patient.save(update_fields=["phone"])
+        patient.refresh_from_db()
+        self.assertEqual(patient.phone_e164, "+243999000111")
+
+    def test_search_local_format_matches_international(self):
+        patient = make_patient(self.user, phone="+243 81 234 5678")
+        response = self.client.get("/api/patients/", {"search": "0812345678"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [patient.id])
+
+    def test_exact_lookup(self):
+        patient = make_patient(self.user, phone="+243 81 234 5678")
+        self.assertEqual(list(patients_with_phone(Patient.objects.all(), "0812345678")), [patient])
+        self.assertFalse(patients_with_phone(Patient.objects.all(), "garbage").exists())
+
+    def test_lookup_endpoint_phone_prefix_and_exact(self):
+        patient = make_patient(self.user, phone="+243 81 234 5678")
+        make_patient(self.user, first_name="Paul", phone="0999000111")
+
+        response = self.client.get("/api/patients/lookup/", {"q": "0812"})
+        self.assertEqual([row["id"] for row in response.data], [patient.id])
+
+        response = self.client.get("/api/patients/lookup/", {"q": "+243 812 345 678"})
+        self.assertEqual([row["id"] for row in response.data], [patient.id])
+
+    def test_lookup_endpoint_partial_numbers_while_typing(self):
+        patient = make_patient(self.user, phone="+243 81 234 5678")
+        # 8 and 9 digits already normalize but are not a complete number yet
+        for q in ("0812345", "08123456", "081234567", "0812345678"):
+            response = self.client.get("/api/patients/lookup/", {"q": q})
+            self.assertEqual([row["id"] for row in response.data], [patient.id], q)
+
+    def test_backfill_command(self):
+        patient = make_patient(self.user, phone="0812345678")
+        bad = make_patient(self.user, first_name="Bad", phone="1234")
+        Patient.objects.update(phone_e164=None)
+
+        out = StringIO()
+        call_command("backfill_phone_e164", stdout=out)
+
+        patient.refresh_from_db()
+        self.assertEqual(patient.phone_e164, "+243812345678")
+        self.assertIn("Invalid phone numbers: 1", out.getvalue())
+        self.assertIn(bad.patient_code, out.getvalue())
+
+
+# =========================================================================
+# Bulk import
+# =========================================================================
+IMPORT_CSV = """first_name,last_name,sex,date_of_birth,phone,address
+Élodie,Tshisekedi,F,1980-03-02,0812345678,Goma
+Jean,Mbuyi,X,1990-01-01,,Lubumbashi
+Paul,Ilunga,M,not-a-date,,Kinshasa
+Grace,Lukusa,F,2001-12-24,,Kisangani
+"""
+
+
+class PatientImportTest(TestCase):
+    """Chunked bulk_create with set-based patient_code assignment."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin_import", password="testpass123")
+        cls.nurse = User.objects.create_user(username="nurse_import", password="testpass123")
+
+    def test_csv_rows_and_errors(self):
+        report = import_patients(StringIO(IMPORT_CSV), "csv", self.admin, batch_size=1)
+
+        self.assertEqual(report["rows"], 4)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["error_count"], 2)
+        self.assertEqual([e["line"] for e in report["errors"]], [3, 4])
+        self.assertIn("sex", report["errors"][0]["errors"])
+
+        patient = Patient.objects.get(last_name="Tshisekedi")
+        self.assertEqual(patient.patient_code, f"PT-{patient.id:06d}")
+        self.assertEqual(patient.phone_e164, "+243812345678")
+        self.assertEqual(patient.created_by, self.admin)
+        fresh = Patient(**{f: getattr(patient, f) for f in ("patient_code", "first_name", "last_name", "phone", "address")})
+        fresh.refresh_derived_fields()
+        self.assertEqual(patient.search_text, fresh.search_text)
+
+    def test_searchable_after_import(self):
+        import_patients(StringIO(IMPORT_CSV), "csv", self.admin)
+        patient = Patient.objects.get(last_name="Lukusa")
+        self.assertEqual(list(search_patients(Patient.objects.all(), patient.patient_code)), [patient])
+        self.assertEqual(list(search_patients(Patient.objects.all(), "elodie")), [Patient.objects.get(last_name="Tshisekedi")])
+
+    def test_query_count_per_batch(self):
+        rows = "\n".join(
+            json.dumps({"first_name": f"P{i}", "last_name": "Bulk", "sex": "M",
+                        "date_of_birth": "2000-01-01", "address": "Kinshasa"})
+            for i in range(50)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            report = import_patients(StringIO(rows + "\n{broken"), "ndjson", self.admin, batch_size=25)
+        self.assertEqual(report["created"], 50)
+        self.assertEqual(report["errors"], [{"line": 51, "errors": {"non_field_errors": ["Invalid JSON."]}}])
+        writes = [q for q in ctx.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+        # Per batch: patients INSERT, patient_code UPDATE, blocking keys INSERT
+        self.assertEqual(len(writes), 6)
+        codes = set(Patient.objects.values_list("patient_code", flat=True))
+        self.assertFalse(any(code.startswith("TMP-") for code in codes))
+
+    def test_dry_run_inserts_nothing(self):
+        report = import_patients(StringIO(IMPORT_CSV), "csv", self.admin, dry_run=True)
+        self.assertEqual(report["created"], 2)
+        self.assertFalse(Patient.objects.exists())
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as handle:
+            handle.write(IMPORT_CSV)
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        call_command("import_patients", handle.name, user="admin_import", stdout=out)
+        self.assertIn("Rows rejected: 2", out.getvalue())
+        self.assertIn("Imported 2 patient(s).", out.getvalue())
+
+    def test_endpoint_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.nurse)
+        upload = SimpleUploadedFile("register.csv", IMPORT_CSV.encode())
+        response = client.post("/api/patients/import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile("register.csv", IMPORT_CSV.encode())
+        response = client.post("/api/patients/import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_endpoint_rejects_non_utf8_before_inserting(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        rows = "".join(
+            json.dumps({"first_name": f"P{i}", "last_name": "Bulk", "sex": "M",
+                        "date_of_birth": "2000-01-01", "address": "Kinshasa"}) + "\n"
+            for i in range(DEFAULT_BATCH_SIZE + 1)
+        )
+        # A full batch precedes the Latin-1 line
+        latin1 = '{"first_name": "Élodie", "last_name": "Kabila", "sex": "F"}\n'.encode("latin-1")
+        upload = SimpleUploadedFile("register.ndjson", rows.encode() + latin1)
+        response = client.post("/api/patients/import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f"line {DEFAULT_BATCH_SIZE + 2}", response.data["detail"])
+        self.assertFalse(Patient.objects.exists())
+
+    def test_endpoint_rejects_unknown_format(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile("register.xlsx", b"whatever")
+        response = client.post("/api/patients/import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+
+
+# =========================================================================
+# Streaming exports
+# =========================================================================
+class ExportTest(TestCase):
+    """values().iterator() streamed through StreamingHttpResponse."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin_export", password="testpass123")
+        cls.doctor = User.objects.create_user(username="doc_export", password="testpass123")
+        cls.other = User.objects.create_user(username="doc_other", password="testpass123")
+        cls.patient = make_patient(cls.doctor, first_name="Élodie")
+        make_patient(cls.other, first_name="Paul")
+
+        now = timezone.now()
+        cls.recent = Visit.objects.create(patient=cls.patient, created_by=cls.doctor, visit_date=now)
+        Visit.objects.create(patient=cls.patient, created_by=cls.other, visit_date=now - timedelta(days=40))
+
+        rx = Prescription.objects.create(patient=cls.patient, visit=cls.recent, prescriber=cls.doctor)
+        for name in ("Paracetamol", "Amoxicilline"):
+            medication = Medication.objects.create(name=name)
+            PrescriptionItem.objects.create(prescription=rx, medication=medication, dosage="1 cp")
+        Prescription.objects.create(patient=cls.patient, prescriber=cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+
+    def test_patients_csv(self):
+        response = self.client.get("/api/patients/export/")
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = self._lines(response)
+        self.assertTrue(lines[0].startswith("id,patient_code,last_name"))
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Élodie", lines[1])
+
+    def test_patients_doctor_filter_ndjson(self):
+        response = self.client.get("/api/patients/export/", {"file_format": "ndjson", "doctor": self.doctor.id})
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual([row["id"] for row in rows], [self.patient.id])
+        self.assertEqual(rows[0]["created_by_username"], "doc_export")
+
+    def test_visits_date_range(self):
+        today = timezone.localdate()
+        response = self.client.get("/api/visits/export/", {
+            "file_format": "ndjson",
+            "date_from": (today - timedelta(days=7)).isoformat(),
+            "date_to": today.isoformat(),
+        })
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual([row["id"] for row in rows], [self.recent.id])
+        self.assertEqual(rows[0]["doctor"], "doc_export")
+        self.assertEqual(rows[0]["patient_code"], self.patient.patient_code)
+
+    def test_prescriptions_flattened_per_item(self):
+        response = self.client.get("/api/prescriptions/export/", {"file_format": "ndjson"})
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row["medication"] for row in rows}, {"Paracetamol", "Amoxicilline", None})
+
+        response = self.client.get("/api/prescriptions/export/", {"doctor": self.other.id})
+        self.assertEqual(len(self._lines(response)), 2)
+
+    def test_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._lines(self.client.get("/api/visits/export/"))
+        selects = [q for q in ctx.captured_queries if "visits_visit" in q["sql"]]
+        self.assertEqual(len(selects), 1)
+
+    def test_csv_formula_cells_escaped(self):
+        Visit.objects.filter(pk=self.recent.pk).update(chief_complaint="=HYPERLINK(\"http://x\")", plan="-2 cp/j")
+        lines = self._lines(self.client.get("/api/visits/export/"))
+        row = next(line for line in lines if line.startswith(f"{self.recent.id},"))
+        self.assertIn('"\'=HYPERLINK(""http://x"")"', row)
+        self.assertIn("'-2 cp/j", row)
+
+        # NDJSON keeps the raw value
+        response = self.client.get("/api/visits/export/", {"file_format": "ndjson"})
+        rows = {row["id"]: row for row in map(json.loads, self._lines(response))}
+        self.assertEqual(rows[self.recent.id]["plan"], "-2 cp/j")
+
+    def test_csv_keeps_phones_and_numbers(self):
+        Patient.objects.filter(pk=self.patient.pk).update(phone="+243 81 234 5678", address="-12")
+        lines = self._lines(self.client.get("/api/patients/export/"))
+        row = next(line for line in lines if line.startswith(f"{self.patient.id},"))
+        self.assertIn(",+243 81 234 5678,", row)
+        self.assertIn(",-12", row)
+        self.assertNotIn("'", row)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.doctor)
+        for url in ("/api/patients/export/", "/api/visits/export/", "/api/prescriptions/export/"):
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get("/api/visits/export/", {"date_from": "01/02/2024"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/visits/export/", {"doctor": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/visits/export/", {"file_format": "xlsx"}).status_code, 400)
+
+
+# =========================================================================
+# File downloads
+# =========================================================================
+class PatientFileDownloadTest(TestCase):
+    """Presigned redirect on R2, resumable Range / ETag serving locally."""
+
+    CONTENT = bytes(range(256)) * 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_download", password="testpass123")
+        cls.patient = make_patient(cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.file = PatientFile.objects.create(
+            patient=self.patient,
+            file=SimpleUploadedFile("scan.png", self.CONTENT),
+            original_filename="radio thorax.png",
+            file_size=len(self.CONTENT),
+            file_type="image/png",
+            uploaded_by=self.user,
+        )
+        self.url = f"/api/patients/{self.patient.id}/files/{self.file.id}/download/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_download_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Length"], str(len(self.CONTENT)))
+        self.assertIn("attachment", response["Content-Disposition"])
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.CONTENT)}")
+        self.assertEqual(self._body(response), self.CONTENT[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10000-")
+        self.assertEqual(self._body(response), self.CONTENT[10000:])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-16")
+        self.assertEqual(self._body(response), self.CONTENT[-16:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.CONTENT)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.CONTENT)}")
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+
+    @override_settings(R2_ENABLED=True, FILE_URL_EXPIRY_SECONDS=120)
+    def test_r2_presigned_redirect(self):
+        storage = PatientFile._meta.get_field("file").storage
+        with mock.patch.object(storage, "url", return_value="https://r2.example/signed") as url:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response["Location"], "https://r2.example/signed")
+            self.assertEqual(url.call_args.kwargs["expire"], 120)
+
+            response = self.client.get(self.url, {"redirect": "false"})
+            self.assertEqual(response.data, {"url": "https://r2.example/signed", "expires_in": 120})
+
+
+# =========================================================================
+# Chunked uploads
+# =========================================================================
+class PatientFileUploadTest(TestCase):
+    """init -> PUT chunks at offsets -> commit creates the PatientFile."""
+
+    CONTENT = bytes(range(256)) * 100
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_upload", password="testpass123")
+        cls.stranger = User.objects.create_user(username="doc_stranger", password="testpass123")
+        cls.patient = make_patient(cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.base = f"/api/patients/{self.patient.id}/uploads/"
+
+    def _open(self, **overrides):
+        data = {
+            "original_filename": "irm.pdf",
+            "file_type": "application/pdf",
+            "total_size": len(self.CONTENT),
+            "category": "imaging",
+        }
+        data.update(overrides)
+        return self.client.post(self.base, data, format="json")
+
+    def _put(self, upload_id, offset, body):
+        return self.client.generic(
+            "PUT", f"{self.base}{upload_id}/", body,
+            content_type="application/octet-stream", HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_full_flow(self):
+        response = self._open()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data["id"]
+        self.assertEqual(response.data["offset"], 0)
+
+        for start in range(0, len(self.CONTENT), 10000):
+            response = self._put(upload_id, start, self.CONTENT[start:start + 10000])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["offset"], len(self.CONTENT))
+
+        response = self.client.post(f"{self.base}{upload_id}/commit/")
+        self.assertEqual(response.status_code, 201)
+        patient_file = PatientFile.objects.get(pk=response.data["id"])
+        self.assertEqual(patient_file.file_size, len(self.CONTENT))
+        self.assertEqual(patient_file.category, "imaging")
+        with patient_file.file.open("rb") as fh:
+            self.assertEqual(fh.read(), self.CONTENT)
+        self.assertEqual(PatientFileUpload.objects.get(pk=upload_id).status, "committed")
+
+    def test_resume_after_wrong_offset(self):
+        upload_id = self._open().data["id"]
+        self._put(upload_id, 0, self.CONTENT[:5000])
+
+        response = self._put(upload_id, 8000, self.CONTENT[8000:9000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], 5000)
+
+        status_response = self.client.get(f"{self.base}{upload_id}/")
+        self.assertEqual(status_response.data["offset"], 5000)
+
+        response = self._put(upload_id, 5000, self.CONTENT[5000:])
+        self.assertEqual(response.data["offset"], len(self.CONTENT))
+
+    def test_commit_requires_every_byte(self):
+        upload_id = self._open().data["id"]
+        self._put(upload_id, 0, self.CONTENT[:100])
+        response = self.client.post(f"{self.base}{upload_id}/commit/")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(PatientFile.objects.exists())
+
+    def test_chunk_past_total_size(self):
+        upload_id = self._open(total_size=10).data["id"]
+        self.assertEqual(self._put(upload_id, 0, b"x" * 11).status_code, 400)
+
+    def test_abort_removes_partial_file(self):
+        upload_id = self._open().data["id"]
+        self._put(upload_id, 0, self.CONTENT[:100])
+        session = PatientFileUpload.objects.get(pk=upload_id)
+        storage = uploads.file_storage()
+        self.assertTrue(storage.exists(session.storage_name))
+
+        self.assertEqual(self.client.delete(f"{self.base}{upload_id}/").status_code, 204)
+        self.assertFalse(storage.exists(session.storage_name))
+        self.assertEqual(self._put(upload_id, 100, b"x").status_code, 409)
+
+    def test_stale_committing_session_is_aborted(self):
+        upload_id = self._open().data["id"]
+        self._put(upload_id, 0, self.CONTENT)
+        session = PatientFileUpload.objects.get(pk=upload_id)
+        storage = uploads.file_storage()
+
+        # A worker killed mid-commit leaves the session claimed
+        PatientFileUpload.objects.filter(pk=upload_id).update(status="committing")
+        self.assertEqual(self.client.delete(f"{self.base}{upload_id}/").status_code, 409)
+        self.assertEqual(self.client.post(f"{self.base}{upload_id}/commit/").status_code, 409)
+
+        stale = timezone.now() - uploads.COMMIT_TIMEOUT - timedelta(minutes=1)
+        PatientFileUpload.objects.filter(pk=upload_id).update(updated_at=stale)
+        out = StringIO()
+        call_command("gc_blobs", "--dry-run", stdout=out)
+        self.assertIn("Would abort 1 stale committing upload(s).", out.getvalue())
+        self.assertTrue(storage.exists(session.storage_name))
+
+        call_command("gc_blobs", stdout=StringIO())
+        self.assertEqual(PatientFileUpload.objects.get(pk=upload_id).status, "aborted")
+        self.assertFalse(storage.exists(session.storage_name))
+
+    def test_delete_aborts_stale_committing_session(self):
+        upload_id = self._open().data["id"]
+        self._put(upload_id, 0, self.CONTENT)
+        session = PatientFileUpload.objects.get(pk=upload_id)
+        stale = timezone.now() - uploads.COMMIT_TIMEOUT - timedelta(minutes=1)
+        PatientFileUpload.objects.filter(pk=upload_id).update(status="committing", updated_at=stale)
+
+        self.assertEqual(self.client.delete(f"{self.base}{upload_id}/").status_code, 204)
+        self.assertEqual(PatientFileUpload.objects.get(pk=upload_id).status, "aborted")
+        self.assertFalse(uploads.file_storage().exists(session.storage_name))
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self._open(file_type="application/x-msdownload").status_code, 400)
+        self.assertEqual(self._open(total_size=10 ** 12).status_code, 400)
+
+        self.client.force_authenticate(self.stranger)
+        self.assertEqual(self._open().status_code, 403)
+
+    def test_s3_multipart_parts(self):
+        session = PatientFileUpload.objects.create(
+            patient=self.patient, original_filename="scan.png", file_type="image/png", total_size=12,
+        )
+        storage = mock.MagicMock(bucket_name="clinicflow")
+        storage.get_available_name.return_value = "patient_files/scan.png"
+        storage._normalize_name.side_effect = lambda name: name
+        client = storage.bucket.meta.client
+        client.create_multipart_upload.return_value = {"UploadId": "up-1"}
+        client.upload_part.side_effect = [{"ETag": '"a"'}, {"ETag": '"b"'}]
+
+        with mock.patch.object(uploads, "file_storage", return_value=storage):
+            uploads.start_upload(session)
+            uploads.write_chunk(session, StringIO("chunk-one"), 9)
+            uploads.write_chunk(session, StringIO("two"), 3)
+            uploads.finish_upload(session)
+            # Already assembled (a retried commit): not completed twice
+            uploads.finish_upload(session)
+            # Aborting now deletes the assembled object
+            uploads.abort_upload(session)
+
+        self.assertEqual(session.multipart_upload_id, "")
+        client.abort_multipart_upload.assert_not_called()
+        storage.delete.assert_called_once_with("patient_files/scan.png")
+        self.assertEqual(client.upload_part.call_args.kwargs["PartNumber"], 2)
+        client.complete_multipart_upload.assert_called_once_with(
+            Bucket="clinicflow",
+            Key="patient_files/scan.png",
+            UploadId="up-1",
+            MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": '"a"'}, {"PartNumber": 2, "ETag": '"b"'}]},
+        )
+
+
+# =========================================================================
+# Thumbnails
+# =========================================================================
+def make_jpeg(width=1200, height=900):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@override_settings(PATIENT_FILE_PREVIEWS_ASYNC=False)
+class PatientFilePreviewTest(TestCase):
+    """Uploads get small/medium WebP previews exposed as thumbnail_url."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_preview", password="testpass123")
+        cls.patient = make_patient(cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/patients/{self.patient.id}/files/"
+
+    def _upload(self, name, content, content_type):
+        upload = SimpleUploadedFile(name, content, content_type=content_type)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"file": upload, "category": "lab_result"}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return PatientFile.objects.get(pk=response.data["id"])
+
+    def test_image_upload_gets_previews(self):
+        patient_file = self._upload("photo.jpg", make_jpeg(), "image/jpeg")
+
+        self.assertEqual(patient_file.preview_status, "ready")
+        self.assertEqual(set(patient_file.previews), set(previews.PREVIEW_SIZES))
+        with patient_file.file.storage.open(patient_file.previews["small"]) as fh:
+            thumb = Image.open(fh)
+            self.assertEqual(thumb.format, "WEBP")
+            self.assertEqual(max(thumb.size), previews.PREVIEW_SIZES["small"])
+
+        row = self.client.get(self.url).data["results"][0]
+        self.assertTrue(row["thumbnail_url"].endswith("_small.webp"))
+        self.assertEqual(set(row["thumbnails"]), set(previews.PREVIEW_SIZES))
+
+    def test_delete_removes_previews(self):
+        patient_file = self._upload("photo.jpg", make_jpeg(), "image/jpeg")
+        storage = patient_file.file.storage
+        names = list(patient_file.previews.values())
+
+        response = self.client.delete(f"{self.url}{patient_file.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+    def test_corrupt_image_marked_failed(self):
+        with self.assertLogs("patients.services.previews", level="WARNING"):
+            patient_file = self._upload("broken.png", b"not an image", "image/png")
+        self.assertEqual(patient_file.preview_status, "failed")
+        self.assertIsNone(self.client.get(self.url).data["results"][0]["thumbnail_url"])
+
+    def test_document_without_renderer_is_unsupported(self):
+        patient_file = self._upload("report.docx", b"PK", "application/msword")
+        self.assertEqual(patient_file.preview_status, "unsupported")
+
+    def test_sweep_command(self):
+        with mock.patch("patients.services.previews.schedule_previews"):
+            patient_file = PatientFile.objects.create(
+                patient=self.patient,
+                file=SimpleUploadedFile("old.jpg", make_jpeg(400, 300)),
+                original_filename="old.jpg",
+                file_size=1,
+                file_type="image/jpeg",
+            )
+        self.assertEqual(patient_file.preview_status, "pending")
+
+        out = StringIO()
+        call_command("generate_file_previews", stdout=out)
+        patient_file.refresh_from_db()
+        self.assertEqual(patient_file.preview_status, "ready")
+        self.assertIn("Processed 1 file(s).", out.getvalue())
+
+
+# =========================================================================
+# Deduplicated blobs
+# =========================================================================
+class StoredBlobTest(TestCase):
+    """Same content is stored once, shared, and garbage-collected when unused."""
+
+    CONTENT = b"%PDF-1.4 scan " * 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="admin_blobs", password="testpass123")
+        cls.patient = make_patient(cls.user)
+        cls.other = make_patient(cls.user, first_name="Paul")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.storage = StoredBlob._meta.get_field("file").storage
+        self.sha256 = hashlib.sha256(self.CONTENT).hexdigest()
+
+    def _upload(self, patient, content=None):
+        upload = SimpleUploadedFile("scan.pdf", content or self.CONTENT, content_type="application/pdf")
+        response = self.client.post(f"/api/patients/{patient.id}/files/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return PatientFile.objects.get(pk=response.data["id"])
+
+    def _gc(self):
+        return blobs.collect_garbage(now=timezone.now() + timedelta(days=2))
+
+    def test_reupload_shares_one_blob(self):
+        # Hashed by the upload handler while streaming, never re-read afterwards
+        with mock.patch.object(blobs, "sha256_of", side_effect=AssertionError("re-read")):
+            first = self._upload(self.patient)
+            second = self._upload(self.other)
+
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.sha256, self.sha256)
+        self.assertEqual(first.blob, blob)
+        self.assertEqual(second.file.name, blob.file.name)
+        self.assertTrue(blob.file.name.startswith(f"blobs/{self.sha256[:2]}/"))
+
+    def test_delete_keeps_blob_until_gc(self):
+        first = self._upload(self.patient)
+        second = self._upload(self.other)
+        name = first.file.name
+
+        self.client.delete(f"/api/patients/{self.patient.id}/files/{first.id}/")
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self._gc(), (0, 0))
+
+        self.client.delete(f"/api/patients/{self.other.id}/files/{second.id}/")
+        # Still inside the grace period
+        self.assertEqual(blobs.collect_garbage(), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._gc(), (1, len(self.CONTENT)))
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(self.storage.exists(name))
+
+    def test_gc_command_dry_run(self):
+        patient_file = self._upload(self.patient)
+        patient_file.delete()
+        StoredBlob.objects.update(last_linked_at=timezone.now() - timedelta(days=3))
+
+        out = StringIO()
+        call_command("gc_blobs", "--dry-run", stdout=out)
+        self.assertIn("Would delete 1 unreferenced blob(s)", out.getvalue())
+        self.assertTrue(StoredBlob.objects.exists())
+
+    def test_upload_session_short_circuits_known_hash(self):
+        self._upload(self.patient)
+        response = self.client.post(f"/api/patients/{self.other.id}/uploads/", {
+            "original_filename": "copy.pdf",
+            "file_type": "application/pdf",
+            "total_size": len(self.CONTENT),
+            "sha256": self.sha256.upper(),
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["status"], "committed")
+        patient_file = PatientFile.objects.get(pk=response.data["patient_file"])
+        self.assertEqual(patient_file.patient, self.other)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def _chunked_upload(self, content, sha256=""):
+        base = f"/api/patients/{self.patient.id}/uploads/"
+        upload_id = self.client.post(base, {
+            "original_filename": "big.pdf",
+            "file_type": "application/pdf",
+            "total_size": len(content),
+            "sha256": sha256,
+        }, format="json").data["id"]
+        self.client.generic(
+            "PUT", f"{base}{upload_id}/", content,
+            content_type="application/octet-stream", HTTP_UPLOAD_OFFSET="0",
+        )
+        return upload_id, self.client.post(f"{base}{upload_id}/commit/")
+
+    def test_chunked_upload_moves_under_hash(self):
+        upload_id, response = self._chunked_upload(self.CONTENT, sha256=self.sha256)
+        self.assertEqual(response.status_code, 201)
+        session = PatientFileUpload.objects.get(pk=upload_id)
+
+        blob = StoredBlob.objects.get(sha256=self.sha256)
+        self.assertEqual(PatientFile.objects.get(pk=response.data["id"]).blob, blob)
+        self.assertFalse(self.storage.exists(session.storage_name))
+        with blob.file.open("rb") as fh:
+            self.assertEqual(fh.read(), self.CONTENT)
+
+        # Same content again: dedup against the existing blob
+        _, response = self._chunked_upload(self.CONTENT)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_commit_hashes_outside_the_session_lock(self):
+        hash_stored_file = blobs.hash_stored_file
+        seen = {}
+
+        def hash_after_claim(name):
+            # The claim is already written: no row lock is held while hashing
+            session = PatientFileUpload.objects.get(storage_name=name)
+            seen["status"] = session.status
+            seen["retry"] = self.client.post(f"/api/patients/{self.patient.id}/uploads/{session.pk}/commit/")
+            return hash_stored_file(name)
+
+        with mock.patch.object(blobs, "hash_stored_file", side_effect=hash_after_claim):
+            _, response = self._chunked_upload(self.CONTENT, sha256=self.sha256)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(seen["status"], "committing")
+        self.assertEqual(seen["retry"].status_code, 409)
+
+    def test_commit_reopens_session_when_hashing_fails(self):
+        with mock.patch.object(blobs, "hash_stored_file", side_effect=OSError("storage down")), \
+                self.assertLogs("django.request", "ERROR"), self.assertRaises(OSError):
+            self._chunked_upload(self.CONTENT)
+        session = PatientFileUpload.objects.get()
+        self.assertEqual(session.status, "open")
+
+        response = self.client.post(f"/api/patients/{self.patient.id}/uploads/{session.pk}/commit/")
+        self.assertEqual(response.status_code, 201)
+
+    def test_chunked_upload_checksum_mismatch(self):
+        upload_id, response = self._chunked_upload(self.CONTENT, sha256="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PatientFileUpload.objects.get(pk=upload_id).status, "aborted")
+        self.assertFalse(PatientFile.objects.exists())
+
+
+# =========================================================================
+# Image recompression
+# =========================================================================
+@override_settings(PATIENT_FILE_PREVIEWS_ASYNC=False, IMAGE_UPLOAD_MAX_PIXELS=100_000)
+class ImageRecompressionTest(TestCase):
+    """Uploaded JPEG/PNG are stored as WebP without EXIF unless preserve_original."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_images", password="testpass123")
+        cls.patient = make_patient(cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/patients/{self.patient.id}/files/"
+
+    def _photo_with_exif(self):
+        image = Image.new("RGB", (600, 400), (30, 120, 200))
+        exif = Image.Exif()
+        exif[0x010F] = "PhoneMaker"  # Make
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", exif=exif, quality=95)
+        return buffer.getvalue()
+
+    def _upload(self, name, content, content_type, **extra):
+        upload = SimpleUploadedFile(name, content, content_type=content_type)
+        response = self.client.post(self.url, {"file": upload, **extra}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return PatientFile.objects.get(pk=response.data["id"])
+
+    def test_photo_reencoded_without_exif(self):
+        patient_file = self._upload("photo.jpg", self._photo_with_exif(), "image/jpeg")
+
+        self.assertEqual(patient_file.file_type, "image/webp")
+        self.assertEqual(patient_file.original_filename, "photo.jpg")
+        self.assertEqual(patient_file.file_size, patient_file.file.size)
+        with patient_file.file.open("rb") as fh:
+            stored = Image.open(fh)
+            self.assertEqual(stored.format, "WEBP")
+            self.assertFalse(stored.getexif())
+            self.assertLessEqual(stored.width * stored.height, 100_000)
+            # Orientation applied before the tag was dropped: portrait now
+            self.assertLess(stored.width, stored.height)
+            # Deduplicated under the hash of the re-encoded bytes
+            fh.seek(0)
+            self.assertEqual(patient_file.blob.sha256, hashlib.sha256(fh.read()).hexdigest())
+
+    def test_png_reencoded_losslessly(self):
+        image = Image.new("RGB", (200, 100), (255, 255, 255))
+        image.paste((0, 0, 0), (20, 20, 120, 40))
+        buffer = BytesIO()
+        image.save(buffer, "PNG")
+
+        patient_file = self._upload("screenshot.png", buffer.getvalue(), "image/png")
+        self.assertEqual(patient_file.file_type, "image/webp")
+        with patient_file.file.open("rb") as fh:
+            stored = Image.open(fh).convert("RGB")
+            self.assertEqual(list(stored.getdata()), list(image.getdata()))
+
+    @override_settings(IMAGE_UPLOAD_MAX_SOURCE_PIXELS=10_000)
+    def test_oversized_source_kept_as_uploaded(self):
+        buffer = BytesIO()
+        Image.new("RGB", (200, 100), (255, 255, 255)).save(buffer, "PNG")
+
+        with mock.patch("config.images.ImageOps.exif_transpose") as transpose:
+            patient_file = self._upload("scan.png", buffer.getvalue(), "image/png")
+        transpose.assert_not_called()
+        self.assertEqual(patient_file.file_type, "image/png")
+        with patient_file.file.open("rb") as fh:
+            self.assertEqual(fh.read(), buffer.getvalue())
+
+    def test_preserve_original(self):
+        content = self._photo_with_exif()
+        patient_file = self._upload("photo.jpg", content, "image/jpeg", preserve_original="true")
+
+        self.assertEqual(patient_file.file_type, "image/jpeg")
+        self.assertEqual(patient_file.original_filename, "photo.jpg")
+        with patient_file.file.open("rb") as fh:
+            self.assertEqual(fh.read(), content)
+
+    def test_non_image_untouched(self):
+        content = b"%PDF-1.4 report"
+        patient_file = self._upload("report.pdf", content, "application/pdf")
+        self.assertEqual(patient_file.file_type, "application/pdf")
+        self.assertEqual(patient_file.file_size, len(content))
+
+    @override_settings(AVATAR_MAX_PIXELS=64 * 64)
+    def test_avatar_recompressed(self):
+        profile = self.user.profile
+        profile.avatar = SimpleUploadedFile("me.jpg", make_jpeg(800, 600), content_type="image/jpeg")
+        profile.save()
+
+        profile.refresh_from_db()
+        self.assertTrue(profile.avatar.name.endswith(".webp"))
+        with profile.avatar.open("rb") as fh:
+            stored = Image.open(fh)
+            self.assertEqual(stored.format, "WEBP")
+            self.assertLessEqual(stored.width * stored.height, 64 * 64)
+
+
+# =========================================================================
+# ZIP archive
+# =========================================================================
+class PatientFileArchiveTest(TestCase):
+    """/files/archive/ streams every file (or one category) as a ZIP."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_archive", password="testpass123")
+        cls.patient = make_patient(cls.user)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/patients/{self.patient.id}/files/archive/"
+        with mock.patch("patients.services.previews.schedule_previews"):
+            for name, content, category in [
+                ("scan.pdf", b"%PDF-1.4 first" * 10000, "imaging"),
+                ("scan.pdf", b"%PDF-1.4 second", "imaging"),
+                ("nfs.pdf", b"%PDF-1.4 blood count", "lab_result"),
+            ]:
+                PatientFile.objects.create(
+                    patient=self.patient,
+                    file=SimpleUploadedFile(name, content),
+                    original_filename=name,
+                    file_size=len(content),
+                    file_type="application/pdf",
+                    category=category,
+                )
+
+    def _archive(self, query=""):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        return zipfile.ZipFile(BytesIO(b"".join(chunks)))
+
+    def test_all_files(self):
+        archive = self._archive()
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ["imaging/scan (2).pdf", "imaging/scan.pdf", "lab_result/nfs.pdf"],
+        )
+        self.assertEqual(archive.read("imaging/scan.pdf"), b"%PDF-1.4 first" * 10000)
+        self.assertEqual(archive.getinfo("lab_result/nfs.pdf").compress_type, zipfile.ZIP_STORED)
+
+    def test_category_filter(self):
+        archive = self._archive("?category=lab_result")
+        self.assertEqual(archive.namelist(), ["lab_result/nfs.pdf"])
+
+        response = self.client.get(self.url + "?category=bogus")
+        self.assertEqual(response.status_code, 400)
+
+
+# =========================================================================
+# Patient chart
+# =========================================================================
+class PatientChartTest(TestCase):
+    """/chart/ returns every section at a query count independent of history."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_chart", password="testpass123")
+        cls.patient = make_patient(cls.user)
+        cls.medication = Medication.objects.create(name="Paracetamol")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/patients/{self.patient.id}/chart/"
+
+    def _add_history(self, count):
+        now = timezone.now()
+        existing = Visit.objects.filter(patient=self.patient).count()
+        for i in range(count):
+            visit = Visit.objects.create(
+                patient=self.patient, created_by=self.user,
+                visit_date=now - timedelta(days=existing + i + 1),
+                medical_history=f"history {i}",
+            )
+            VitalSign.objects.create(visit=visit, weight_kg=20 + i)
+            VitalSign.objects.create(visit=visit, temperature_c=37)
+            rx = Prescription.objects.create(patient=self.patient, visit=visit, prescriber=self.user)
+            PrescriptionItem.objects.create(prescription=rx, medication=self.medication, dosage="1 cp")
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.user, scheduled_at=now + timedelta(days=i + 1, hours=count),
+            )
+
+    def test_query_count_is_constant(self):
+        self._add_history(2)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self._add_history(8)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url)
+        self.assertEqual(len(large), len(small))
+        self.assertLessEqual(len(large), 12)
+
+        data = response.data
+        self.assertEqual(data["patient"]["id"], self.patient.id)
+        self.assertEqual(len(data["visits"]["results"]), 10)
+        self.assertEqual(len(data["visits"]["results"][0]["vital_signs"]), 2)
+        self.assertEqual(len(data["prescriptions"]["results"][0]["items"]), 1)
+        self.assertEqual(len(data["appointments"]["results"]), 10)
+        self.assertEqual(data["files"], {"results": [], "next": None})
+        # Most recent visit with a non-empty medical history
+        self.assertEqual(data["latest_medical_history"], "history 0")
+
+    def test_section_limits_and_cursor(self):
+        self._add_history(3)
+        data = self.client.get(self.url, {"limit": 1, "visits_limit": 2}).data
+
+        self.assertEqual(len(data["visits"]["results"]), 2)
+        self.assertEqual(len(data["prescriptions"]["results"]), 1)
+        self.assertIsNotNone(data["appointments"]["next"])
+
+        # "next" continues on the visit list endpoint right after the chart rows
+        rest = self.client.get(data["visits"]["next"]).data
+        seen = [row["id"] for row in data["visits"]["results"]]
+        self.assertEqual(len(rest["results"]), 1)
+        self.assertNotIn(rest["results"][0]["id"], seen)
+        self.assertIsNone(rest["next"])
+
+    def test_unknown_patient(self):
+        self.assertEqual(self.client.get("/api/patients/999999/chart/").status_code, 404)
+
+
+# =========================================================================
+# Patient timeline
+# =========================================================================
+class PatientTimelineTest(TestCase):
+    """/timeline/ merges every source newest first, page by page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_timeline", password="testpass123")
+        cls.patient = make_patient(cls.user)
+        other = make_patient(cls.user, first_name="Paul")
+        base = timezone.now() - timedelta(days=30)
+
+        for day in range(4):
+            moment = base + timedelta(days=day)
+            visit = Visit.objects.create(patient=cls.patient, created_by=cls.user, visit_date=moment)
+            # Same timestamp as the visit: ties broken by type, then id
+            VitalSign.objects.create(visit=visit, measured_at=moment, weight_kg=20)
+            VitalSign.objects.create(visit=visit, measured_at=moment, weight_kg=21)
+            rx = Prescription.objects.create(patient=cls.patient, visit=visit, prescriber=cls.user)
+            Prescription.objects.filter(pk=rx.pk).update(created_at=moment + timedelta(hours=1))
+            appointment = Appointment.objects.create(
+                patient=cls.patient, doctor=cls.user, status="COMPLETED", scheduled_at=moment - timedelta(days=1),
+            )
+            log = AppointmentSMSLog.objects.create(appointment=appointment, phone="+243812345678", status="SUCCESS")
+            AppointmentSMSLog.objects.filter(pk=log.pk).update(created_at=moment - timedelta(days=2))
+        with mock.patch("patients.services.previews.schedule_previews"):
+            PatientFile.objects.create(
+                patient=cls.patient, file="patient_files/scan.pdf", original_filename="scan.pdf",
+                file_size=10, file_type="application/pdf",
+            )
+        Visit.objects.create(patient=other, created_by=cls.user, visit_date=base)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/patients/{self.patient.id}/timeline/"
+
+    def _walk(self, params):
+        events, url, pages = [], self.url, []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params if url == self.url else None)
+            self.assertEqual(response.status_code, 200)
+            pages.append(len(queries))
+            events.extend((event["type"], event["id"]) for event in response.data["results"])
+            url = response.data["next"]
+        return events, pages
+
+    def test_pages_cover_everything_in_order(self):
+        events, pages = self._walk({"page_size": 3})
+        # 4 x (visit, 2 vitals, prescription, appointment, sms) + 1 file
+        self.assertEqual(len(events), 25)
+        self.assertEqual(len(set(events)), 25)
+        self.assertEqual(events[0][0], "file")
+        self.assertEqual(events[-1][0], "sms")
+        # Deep pages cost the same as the first one
+        self.assertEqual(len(set(pages)), 1)
+
+        # Same as one big page
+        response = self.client.get(self.url, {"page_size": 100})
+        self.assertEqual([(event["type"], event["id"]) for event in response.data["results"]], events)
+        self.assertIsNone(response.data["next"])
+
+        newest_visit = Visit.objects.filter(patient=self.patient).order_by("-visit_date").first()
+        vitals = sorted(newest_visit.vital_signs.values_list("id", flat=True))
+        position = events.index(("visit", newest_visit.id))
+        self.assertEqual(events[position + 1:position + 3], [("vital", pk) for pk in vitals])
+
+    def test_type_filter(self):
+        events, _ = self._walk({"page_size": 2, "types": "visit,file"})
+        self.assertEqual([kind for kind, _ in events], ["file"] + ["visit"] * 4)
+
+        response = self.client.get(self.url, {"types": "visit,lab"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "garbage"}).status_code, 404)
+
+
+# =========================================================================
+# Carry-forward pointers
+# =========================================================================
+class CarryForwardTest(TestCase):
+    """Visit signals keep one pointer per (patient, field) on the latest non-empty value."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="doc_carry", password="testpass123")
+        cls.now = timezone.now()
+
+    def setUp(self):
+        self.patient = make_patient(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _visit(self, days_ago, **fields):
+        return Visit.objects.create(
+            patient=self.patient, created_by=self.user, visit_date=self.now - timedelta(days=days_ago), **fields,
+        )
+
+    def _latest(self):
+        response = self.client.get(f"/api/patients/{self.patient.id}/latest-medical-history/")
+        self.assertEqual(response.status_code, 200)
+        return response.data["medical_history"]
+
+    def test_pointer_follows_saves_backdating_and_deletes(self):
+        old = self._visit(10, medical_history="Asthme")
+        recent = self._visit(2, medical_history="Asthme, drépanocytose")
+        self._visit(1)  # empty history: ignored
+        self.assertEqual(self._latest(), "Asthme, drépanocytose")
+
+        # Backdated behind the older visit
+        recent.visit_date = self.now - timedelta(days=20)
+        recent.save()
+        self.assertEqual(self._latest(), "Asthme")
+
+        old.medical_history = ""
+        old.save()
+        self.assertEqual(self._latest(), "Asthme, drépanocytose")
+
+        recent.delete()
+        self.assertEqual(self._latest(), "")
+        self.assertFalse(CarryForwardPointer.objects.filter(patient=self.patient, field="medical_history").exists())
+
+    def test_reassigned_visit_repoints_both_patients(self):
+        visit = self._visit(1, medical_history="HTA")
+        other = make_patient(self.user, first_name="Paul")
+        visit.patient = other
+        visit.save()
+
+        self.assertEqual(self._latest(), "")
+        self.assertEqual(CarryForwardPointer.objects.get(patient=other, field="medical_history").visit, visit)
+
+    def test_read_does_not_scan_visits(self):
+        self._visit(1, medical_history="HTA")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._latest(), "HTA")
+        # Patient existence check + one pointer lookup joined to its visit
+        self.assertEqual(len(queries), 2)
+        self.assertIn("patients_carryforwardpointer", queries[1]["sql"])
+
+    def test_carry_forward_endpoint(self):
+        self._visit(5, treatment="Amoxicilline", notes="Allergie à la pénicilline")
+        visit = self._visit(1, treatment="Paracétamol", notes="RAS")
+
+        url = f"/api/patients/{self.patient.id}/carry-forward/"
+        data = self.client.get(url).data
+        self.assertEqual(data["treatment"]["value"], "Paracétamol")
+        self.assertEqual(data["treatment"]["visit"], visit.id)
+        self.assertEqual(data["allergies"]["value"], "Allergie à la pénicilline")
+        self.assertNotIn("medical_history", data)
+
+        self.assertEqual(set(self.client.get(url, {"fields": "treatment"}).data), {"treatment"})
+        self.assertEqual(self.client.get(url, {"fields": "weight"}).status_code, 400)
+
+    def test_backfill_command(self):
+        self._visit(1, medical_history="HTA")
+        CarryForwardPointer.objects.all().delete()
+
+        out = StringIO()
+        call_command("refresh_visit_summaries", "--all", stdout=out)
+        self.assertEqual(self._latest(), "HTA")
+        self.assertIn("1 carry-forward pointer(s)", out.getvalue())
+
+
+# =========================================================================
+# Duplicate detection
+# =========================================================================
+class DuplicateDetectionTest(TestCase):
+    """Blocking keys find re-registered patients without scanning the table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin_dupes", password="testpass123")
+        cls.nurse = User.objects.create_user(username="nurse_dupes", password="testpass123")
+        cls.existing = make_patient(
+            cls.admin, first_name="Jean", last_name="Tshibangu", date_of_birth="1990-05-01", phone="0812345678",
+        )
+        # Same family phone, different person: not a candidate on its own
+        make_patient(cls.admin, first_name="Grace", last_name="Lukusa", date_of_birth="2015-01-01", phone="0812345678")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.nurse)
+
+    def _payload(self, **overrides):
+        data = {
+            "first_name": "Jean",
+            "last_name": "Chibangu",
+            "sex": "M",
+            "date_of_birth": "1990-05-01",
+            "phone": "+243 81 234 5678",
+            "address": "Kinshasa",
+        }
+        data.update(overrides)
+        return data
+
+    def test_phonetic_key_folds_spellings(self):
+        for a, b in [("Tshibangu", "Chibangu"), ("Mwamba", "Mouamba"), ("Philippe", "Filipe"), ("Kabila", "Kabela")]:
+            self.assertEqual(phonetic_key(a), phonetic_key(b), (a, b))
+        self.assertNotEqual(phonetic_key("Kabila"), phonetic_key("Kasongo"))
+
+    def test_create_returns_warnings(self):
+        response = self.client.post("/api/patients/", self._payload())
+        self.assertEqual(response.status_code, 201)
+        warnings = response.data["duplicate_warnings"]
+        self.assertEqual([w["id"] for w in warnings], [self.existing.id])
+        self.assertEqual(warnings[0]["matched_on"], ["dob", "name", "phone"])
+        self.assertEqual(warnings[0]["score"], 1.0)
+
+        # Keys stored for the new patient too
+        self.assertEqual(PatientBlockingKey.objects.filter(patient_id=response.data["id"]).count(), 3)
+
+    def test_swapped_names_and_dob_plus_phone(self):
+        response = self.client.post("/api/patients/", self._payload(first_name="Tshibangou", last_name="Jean"))
+        self.assertEqual([w["id"] for w in response.data["duplicate_warnings"]], [self.existing.id])
+
+        # Different first name entirely, but same birth date and phone
+        response = self.client.post(
+            "/api/patients/duplicates/check/", self._payload(first_name="Jonathan", last_name="Tshibanda"),
+        )
+        self.assertEqual(response.data["candidates"][0]["matched_on"], ["dob", "phone"])
+
+    def test_unrelated_patient_has_no_warnings(self):
+        response = self.client.post("/api/patients/", self._payload(
+            first_name="Marie", last_name="Kasongo", date_of_birth="2001-02-03", phone="0998887766",
+        ))
+        self.assertEqual(response.data["duplicate_warnings"], [])
+
+    def test_check_does_not_create_and_costs_fixed_queries(self):
+        count = Patient.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/patients/duplicates/check/", self._payload())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["candidates"]), 1)
+        self.assertEqual(Patient.objects.count(), count)
+        self.assertLessEqual(len(queries), 3)
+
+    def test_oversized_blocks_are_ignored(self):
+        # A clinic phone typed for everyone: the phone block says nothing
+        for i in range(MAX_BLOCK_SIZE - 1):
+            make_patient(self.admin, first_name=f"P{i}", last_name="Mbala", date_of_birth="2000-01-01",
+                         phone="0999999999")
+        self.existing.phone = "0999999999"
+        self.existing.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/patients/duplicates/check/", self._payload(
+                first_name="Jonathan", last_name="Tshibanda", phone="0999999999",
+            ))
+        self.assertEqual(response.data["candidates"], [])
+        self.assertLessEqual(len(queries), 3)
+
+        # One patient fewer on that phone: back under the bound
+        Patient.objects.filter(first_name="P0").delete()
+        response = self.client.post("/api/patients/duplicates/check/", self._payload(
+            first_name="Jonathan", last_name="Tshibanda", phone="0999999999",
+        ))
+        self.assertEqual([c["id"] for c in response.data["candidates"]], [self.existing.id])
+
+    def test_keys_follow_updates(self):
+        self.existing.last_name = "Kabila"
+        self.existing.save()
+        response = self.client.post("/api/patients/duplicates/check/", self._payload(phone=""))
+        self.assertEqual(response.data["candidates"], [])
+
+    def test_report_endpoint_and_command(self):
+        make_patient(self.admin, first_name="Jean", last_name="Chibangu", date_of_birth="1990-05-01", phone="")
+
+        self.assertEqual(self.client.get("/api/patients/duplicates/").status_code, 403)
+        self.client.force_authenticate(self.admin)
+        data = self.client.get("/api/patients/duplicates/").data
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(data["results"][0]["matched_on"], ["dob", "name"])
+        self.assertIn(self.existing.id, [p["id"] for p in data["results"][0]["patients"]])
+
+        PatientBlockingKey.objects.all().delete()
+        out = StringIO()
+        call_command("find_duplicate_patients", "--rebuild-keys", stdout=out)
+        self.assertIn("Found 1 candidate duplicate pair(s).", out.getvalue())
+
+    def test_import_stores_keys(self):
+        import_patients(StringIO(IMPORT_CSV), "csv", self.admin)
+        patient = Patient.objects.get(last_name="Tshisekedi")
+        self.assertEqual(
+            set(patient.blocking_keys.values_list("kind", flat=True)), {"name", "dob", "phone"},
+        )
+
+
+# =========================================================================
+# Patient merge
+# =========================================================================
+class PatientMergeTest(TestCase):
+    """/merge/ re-points a duplicate's records with bulk UPDATEs and archives it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin_merge", password="testpass123")
+        cls.nurse = User.objects.create_user(username="nurse_merge", password="testpass123")
+
+    def setUp(self):
+        self.survivor = make_patient(self.admin, first_name="Jean", last_name="Tshibangu")
+        self.duplicate = make_patient(self.admin, first_name="Jean", last_name="Chibangu")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = f"/api/patients/{self.survivor.id}/merge/"
+
+    def _give_records(self, patient, count):
+        now = timezone.now()
+        for day in range(count):
+            visit = Visit.objects.create(
+                patient=patient, created_by=self.admin, visit_date=now - timedelta(days=day + 1),
+                medical_history=f"History {day}",
+            )
+            Prescription.objects.create(patient=patient, visit=visit, prescriber=self.admin)
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=self.admin, status="COMPLETED", scheduled_at=now - timedelta(days=day + 1),
+            )
+            AppointmentSMSLog.objects.create(appointment=appointment, phone="+243812345678", status="SUCCESS")
+        with mock.patch("patients.services.previews.schedule_previews"):
+            PatientFile.objects.create(
+                patient=patient, file="patient_files/scan.pdf", original_filename="scan.pdf",
+                file_size=10, file_type="application/pdf",
+            )
+
+    def _merge_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"duplicate_id": self.duplicate.id}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, len(queries)
+
+    def test_moves_every_record_and_records_the_merge(self):
+        self._give_records(self.survivor, 1)
+        self._give_records(self.duplicate, 3)
+
+        response, _ = self._merge_queries()
+        self.assertEqual(response.data["moved"], {
+            "visits": 3, "prescriptions": 3, "appointments": 3, "sms_logs": 3, "files": 1, "uploads": 0,
+        })
+        for model in (Visit, Prescription, Appointment, PatientFile):
+            self.assertFalse(model.objects.filter(patient=self.duplicate).exists(), model)
+        self.assertEqual(Visit.objects.filter(patient=self.survivor).count(), 4)
+        self.assertEqual(AppointmentSMSLog.objects.filter(appointment__patient=self.survivor).count(), 4)
+
+        self.duplicate.refresh_from_db()
+        self.assertFalse(self.duplicate.is_active)
+        self.assertFalse(PatientBlockingKey.objects.filter(patient=self.duplicate).exists())
+        self.assertFalse(CarryForwardPointer.objects.filter(patient=self.duplicate).exists())
+
+        merge = PatientMerge.objects.get()
+        self.assertEqual((merge.survivor, merge.merged_patient, merge.merged_by), (self.survivor, self.duplicate, self.admin))
+        self.assertEqual(merge.merged_patient_snapshot["last_name"], "Chibangu")
+
+        # Derived data follows: the duplicate's newest visit is now the survivor's
+        newest = Visit.objects.filter(patient=self.survivor).order_by("-visit_date").first()
+        self.survivor.refresh_from_db()
+        self.assertEqual(self.survivor.last_visit_at, newest.visit_date)
+        self.assertEqual(self.duplicate.last_visit_at, None)
+        pointer = CarryForwardPointer.objects.get(patient=self.survivor, field="medical_history")
+        self.assertEqual(pointer.visit, newest)
+
+        # Merged patients stay archived
+        self.assertEqual(self.client.post(f"/api/patients/{self.duplicate.id}/restore/").status_code, 400)
+
+    def test_query_count_does_not_grow_with_records(self):
+        self._give_records(self.duplicate, 2)
+        _, few = self._merge_queries()
+
+        self.survivor = make_patient(self.admin, first_name="Paul")
+        self.duplicate = make_patient(self.admin, first_name="Paul")
+        self.url = f"/api/patients/{self.survivor.id}/merge/"
+        self._give_records(self.duplicate, 20)
+        _, many = self._merge_queries()
+        self.assertEqual(few, many)
+
+    def test_refused(self):
+        self.client.force_authenticate(self.nurse)
+        self.assertEqual(self.client.post(self.url, {"duplicate_id": self.duplicate.id}).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {"duplicate_id": self.survivor.id}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"duplicate_id": "abc"}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"duplicate_id": 999999}).status_code, 400)
+
+        self._merge_queries()
+        # Already merged
+        self.assertEqual(self.client.post(self.url, {"duplicate_id": self.duplicate.id}).status_code, 400)
+        self.assertEqual(PatientMerge.objects.count(), 1)
+
+
+# =========================================================================
+# Bulk archive / restore
+# =========================================================================
+class BulkArchiveTest(TestCase):
+    """/archive/ and /restore/ check permissions on the whole set and run one UPDATE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin_bulk", password="testpass123")
+        cls.nurse = User.objects.create_user(username="nurse_bulk", password="testpass123")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.nurse)
+        self.own = [make_patient(self.nurse, first_name=f"Own{i}") for i in range(3)]
+        self.other = make_patient(self.admin, first_name="Other")
+
+    def _updates(self, queries):
+        return [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+
+    def test_archive_ids_refuses_other_users_patients(self):
+        Patient.objects.filter(pk=self.own[2].pk).update(is_active=False)
+        ids = [p.id for p in self.own] + [self.other.id, 999999]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/patients/archive/", {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            "archived": 2, "refused": sorted([self.other.id, 999999]), "skipped": [self.own[2].id],
+        })
+        self.assertEqual(len(self._updates(queries)), 1)
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(Patient.objects.filter(pk__in=[p.id for p in self.own], is_active=True).exists())
+        self.assertTrue(Patient.objects.get(pk=self.other.pk).is_active)
+
+    def test_archive_inactive_years(self):
+        now = timezone.now()
+        old = now - timedelta(days=365 * 3)
+        # Last visit 3 years ago / registered 3 years ago and never seen / seen last month
+        Patient.objects.filter(pk=self.own[0].pk).update(last_visit_at=old, created_at=old)
+        Patient.objects.filter(pk=self.own[1].pk).update(created_at=old)
+        Patient.objects.filter(pk=self.own[2].pk).update(last_visit_at=now - timedelta(days=30), created_at=old)
+        Patient.objects.filter(pk=self.other.pk).update(created_at=old)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/patients/archive/", {"inactive_years": 2}, format="json")
+        self.assertEqual(response.data["archived"], 2)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            set(Patient.objects.filter(is_active=False).values_list("pk", flat=True)),
+            {self.own[0].pk, self.own[1].pk},
+        )
+
+        # Admins sweep everyone
+        self.client.force_authenticate(self.admin)
+        response = self.client.post("/api/patients/archive/", {"inactive_years": 2}, format="json")
+        self.assertEqual(response.data["archived"], 1)
+
+    def test_archive_inactive_years_keeps_scheduled_patients(self):
+        now = timezone.now()
+        old = now - timedelta(days=365 * 3)
+        upcoming, stale_summary, idle = self.own
+        # Registered 3 years ago, never seen, but a visit is booked
+        Visit.objects.create(patient=upcoming, created_by=self.nurse, visit_date=now + timedelta(days=7))
+        upcoming.refresh_from_db()
+        self.assertIsNotNone(upcoming.next_visit_at)
+        Patient.objects.filter(pk=upcoming.pk).update(created_at=old)
+        # next_visit_at passed, not rolled over by refresh_visit_summaries yet
+        Patient.objects.filter(pk=stale_summary.pk).update(
+            created_at=old, next_visit_at=now - timedelta(hours=1)
+        )
+        Patient.objects.filter(pk=idle.pk).update(created_at=old)
+
+        response = self.client.post("/api/patients/archive/", {"inactive_years": 2}, format="json")
+        self.assertEqual(response.data["archived"], 1)
+        self.assertEqual(list(Patient.objects.filter(is_active=False).values_list("pk", flat=True)), [idle.pk])
+
+    def test_archive_bad_requests(self):
+        for payload in ({}, {"ids": []}, {"ids": "1,2"}, {"ids": ["x"]}, {"inactive_years": 0},
+                        {"inactive_years": 3000}):
+            response = self.client.post("/api/patients/archive/", payload, format="json")
+            self.assertEqual(response.status_code, 400, payload)
+
+    def test_restore_is_admin_only_and_skips_merged(self):
+        response = self.client.post("/api/patients/restore/", {"ids": [self.own[0].id]}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        Patient.objects.filter(pk__in=[self.own[0].pk, self.own[1].pk]).update(is_active=False)
+        PatientMerge.objects.create(survivor=self.other, merged_patient=self.own[1])
+
+        self.client.force_authenticate(self.admin)
+        ids = [self.own[0].id, self.own[1].id, self.own[2].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/patients/restore/", {"ids": ids}, format="json")
+        self.assertEqual(response.data, {"restored": 1, "refused": [self.own[1].id], "skipped": [self.own[2].id]})
+        self.assertEqual(len(self._updates(queries)), 1)
+        self.assertTrue(Patient.objects.get(pk=self.own[0].pk).is_active)
+        self.assertFalse(Patient.objects.get(pk=self.own[1].pk).is_active)
@@ -3,22 +3,46 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     PatientListCreateView,
     PatientDetailView,
+    patient_lookup,
+    patient_import,
+    duplicate_check,
+    duplicate_report_view,
+    export_patients,
+    bulk_archive_patients,
+    bulk_restore_patients,
     archive_patient,
     restore_patient,
+    merge_patient,
     latest_medical_history,
+    carry_forward,
+    patient_chart,
+    patient_timeline,
     PatientFileViewSet,
+    PatientFileUploadViewSet,
 )
 
 # Router for nested file resources
 file_router = DefaultRouter()
 file_router.register(r'files', PatientFileViewSet, basename='patient-files')
+file_router.register(r'uploads', PatientFileUploadViewSet, basename='patient-file-uploads')
 
 urlpatterns = [
     path("", PatientListCreateView.as_view(), name="patient_list_create"),
+    path("lookup/", patient_lookup, name="patient_lookup"),
+    path("import/", patient_import, name="patient_import"),
+    path("duplicates/", duplicate_report_view, name="patient_duplicates"),
+    path("duplicates/check/", duplicate_check, name="patient_duplicate_check"),
+    path("export/", export_patients, name="patient_export"),
+    path("archive/", bulk_archive_patients, name="patient_bulk_archive"),
+    path("restore/", bulk_restore_patients, name="patient_bulk_restore"),
     path("<int:pk>/", PatientDetailView.as_view(), name="patient_detail"),
     path("<int:pk>/archive/", archive_patient, name="patient_archive"),
     path("<int:pk>/restore/", restore_patient, name="patient_restore"),
+    path("<int:pk>/merge/", merge_patient, name="patient_merge"),
     path("<int:patient_id>/latest-medical-history/", latest_medical_history, name="patient_latest_medical_history"),
+    path("<int:patient_id>/carry-forward/", carry_forward, name="patient_carry_forward"),
+    path("<int:patient_id>/chart/", patient_chart, name="patient_chart"),
+    path("<int:patient_id>/timeline/", patient_timeline, name="patient_timeline"),
     # Nested file routes: /api/patients/<patient_id>/files/
     path("<int:patient_id>/", include(file_router.urls)),
 ]
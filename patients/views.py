@@ -1,22 +1,56 @@
 # patients/views.py
-from django.db.models import Max, Min, Q
-from django.http import FileResponse
+import io
+import shutil
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
-from rest_framework import generics, status, viewsets
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework import generics, mixins, status, viewsets
+from rest_framework.decorators import api_view, parser_classes, permission_classes, action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Patient, PatientFile
-from .serializers import PatientSerializer, PatientFileSerializer
+from .models import CarryForwardPointer, Patient, PatientFile, PatientFileUpload, PatientMerge
+from .serializers import PatientSerializer, PatientFileSerializer, PatientFileUploadSerializer
 from .pagination import PatientPagination
-from .permissions import IsPatientOwnerOrAdmin, IsPatientFileOwnerOrAdmin
+from .permissions import IsPatientOwnerOrAdmin, IsPatientFileOwnerOrAdmin, _is_admin
+from .search import PatientSearchFilter, complete_phone, patients_with_phone, phone_search_prefix, search_terms
+from .services import blobs, uploads
+from .services.archive import MAX_BULK_IDS, MAX_INACTIVE_YEARS, bulk_archive, bulk_restore
+from .services.carry_forward import CARRY_FORWARD_FIELDS, carry_forward_values
+from .services.chart import FILE_CURSOR_ORDERING, build_chart, chart_queryset, section_limits
+from .services.duplicates import duplicate_report, find_duplicate_candidates
+from .services.importer import FORMATS, first_invalid_utf8_line, guess_format, import_patients
+from .services.merge import MergeError, merge_patients
+from .services.timeline import KIND_RANK, parse_cursor, timeline_page
 
-from visits.models import Visit
+from config.downloads import presigned_url, ranged_file_response, unique_arcname, zip_stream
+from config.exports import export_filters, export_response
+
+from visits.models import VitalSign
+
+
+def with_latest_weight(qs):
+    """
+    Annotate latest_weight_kg as a correlated subquery so a page of patients
+    costs one query instead of one VitalSign lookup per row.
+    """
+    latest_weight = (
+        VitalSign.objects
+        .filter(visit__patient=OuterRef("pk"), weight_kg__isnull=False)
+        .order_by("-measured_at")
+        .values("weight_kg")[:1]
+    )
+    return qs.annotate(latest_weight_kg=Subquery(latest_weight))
 
 
 class PatientListCreateView(generics.ListCreateAPIView):
@@ -24,14 +58,11 @@ class PatientListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     pagination_class = PatientPagination
-    filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = [
-        "patient_code",
-        "first_name",
-        "last_name",
-        "phone",
-        "address",
-    ]
+    # Stable ordering for ?cursor= pagination (?ordering= is ignored in that mode)
+    cursor_ordering = ("last_name", "first_name", "id")
+    # ?search= hits the indexed search_text column and ranks by relevance
+    # (patient_code, names, phone digits, address), see patients.search
+    filter_backends = [OrderingFilter, PatientSearchFilter]
 
     ordering_fields = [
         "last_name",
@@ -44,7 +75,6 @@ class PatientListCreateView(generics.ListCreateAPIView):
     ordering = ["last_name", "first_name"]
 
     def get_queryset(self):
-        now = timezone.now()
         user = self.request.user
         is_admin = hasattr(user, 'profile') and user.profile.role == 'admin'
 
@@ -60,23 +90,24 @@ class PatientListCreateView(generics.ListCreateAPIView):
             qs = qs.filter(is_active=True)   # default: active only
 
         return (
-            qs.annotate(
-                # Latest visit that already happened (<= now)
-                last_visit_date=Max(
-                    "visits__visit_date",
-                    filter=Q(visits__visit_date__lte=now),
-                ),
-                # Next upcoming visit (> now)
-                next_visit_date=Min(
-                    "visits__visit_date",
-                    filter=Q(visits__visit_date__gt=now),
-                ),
+            # Stored columns (see patients.services.visit_summary); the aliases
+            # keep ?ordering=last_visit_date / next_visit_date working.
+            with_latest_weight(qs).alias(
+                last_visit_date=F("last_visit_at"),
+                next_visit_date=F("next_visit_at"),
             )
             .order_by("last_name", "first_name")
         )
 
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # Non-blocking: the patient is created, the receptionist decides
+        # whether to merge (see patients.services.duplicates)
+        response.data["duplicate_warnings"] = find_duplicate_candidates(self.created_patient)
+        return response
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        self.created_patient = serializer.save(created_by=self.request.user)
 
 
 class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -84,23 +115,8 @@ class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated, IsPatientOwnerOrAdmin]
 
     def get_queryset(self):
-        now = timezone.now()
-
         # All authenticated staff can access any patient
-        qs = Patient.objects.all()
-
-        return (
-            qs.annotate(
-                last_visit_date=Max(
-                    "visits__visit_date",
-                    filter=Q(visits__visit_date__lte=now),
-                ),
-                next_visit_date=Min(
-                    "visits__visit_date",
-                    filter=Q(visits__visit_date__gt=now),
-                ),
-            )
-        )
+        return with_latest_weight(Patient.objects.all())
 
     def perform_destroy(self, instance):
         # Soft delete: set is_active to False instead of deleting
@@ -108,6 +124,184 @@ class PatientDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
+LOOKUP_DEFAULT_LIMIT = 10
+LOOKUP_MAX_LIMIT = 25
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def patient_lookup(request):
+    """
+    GET /api/patients/lookup/?q=<text>&limit=<n>
+    Search-as-you-type for the appointment and prescription forms.
+
+    Every term must prefix-match the last name, first name, patient code or
+    phone digits (accent/case-insensitive). A complete phone number in any
+    format is matched exactly on phone_e164. Returns a bare list with a
+    minimal payload: no visit summary, no pagination COUNT.
+    """
+    query = request.query_params.get("q", "")
+    terms = search_terms(query)
+    if not terms:
+        return Response([])
+
+    try:
+        limit = int(request.query_params.get("limit", LOOKUP_DEFAULT_LIMIT))
+    except ValueError:
+        limit = LOOKUP_DEFAULT_LIMIT
+    limit = max(1, min(limit, LOOKUP_MAX_LIMIT))
+
+    qs = Patient.objects.filter(is_active=True)
+    if complete_phone(query):
+        # A complete phone number in any format: exact indexed match
+        qs = patients_with_phone(qs, query)
+    else:
+        for term in terms:
+            match = (
+                Q(last_name_key__startswith=term)
+                | Q(first_name_key__startswith=term)
+                | Q(patient_code__startswith=term.upper())
+            )
+            phone_prefix = phone_search_prefix(term) if term.isdigit() else None
+            if phone_prefix:
+                match |= Q(phone_e164__startswith=phone_prefix)
+            qs = qs.filter(match)
+
+    rows = (
+        qs.order_by("last_name_key", "first_name_key", "id")
+        .values("id", "patient_code", "first_name", "last_name", "date_of_birth", "phone")[:limit]
+    )
+    return Response(list(rows))
+
+
+DUPLICATE_REPORT_DEFAULT_LIMIT = 200
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def duplicate_check(request):
+    """
+    POST /api/patients/duplicates/check/  (same body as patient create)
+    Likely existing duplicates of a patient about to be registered, without
+    creating it: {"candidates": [{id, patient_code, ..., matched_on, score}]}.
+    """
+    serializer = PatientSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    patient = Patient(**serializer.validated_data)
+    patient.refresh_derived_fields()
+    return Response({"candidates": find_duplicate_candidates(patient)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def duplicate_report_view(request):
+    """
+    GET /api/patients/duplicates/?limit=200
+    Candidate duplicate pairs across all patients, best match first. Admin only.
+    """
+    if not _is_admin(request.user):
+        return Response(
+            {"detail": "Only administrators can view the duplicate report."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    try:
+        limit = int(request.query_params.get("limit", DUPLICATE_REPORT_DEFAULT_LIMIT))
+    except ValueError:
+        return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    pairs = duplicate_report(limit=max(1, limit))
+    return Response({"count": len(pairs), "results": pairs})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def patient_import(request):
+    """
+    POST /api/patients/import/  (multipart: file=<.csv|.ndjson>, file_format=csv|ndjson, dry_run=true)
+    Bulk import legacy patients. Admin only.
+
+    The upload is streamed and inserted in batches; rows that fail validation
+    are skipped and reported by line number (see patients.services.importer).
+    """
+    if not _is_admin(request.user):
+        return Response(
+            {"detail": "Only administrators can import patients."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"detail": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+    fmt = request.data.get("file_format") or guess_format(upload.name)
+    if fmt not in FORMATS:
+        return Response(
+            {"detail": "Unsupported file format. Use CSV or NDJSON."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    upload.open("rb")
+    # Checked up front: batches are committed as they are inserted
+    bad_line = first_invalid_utf8_line(upload.file)
+    if bad_line:
+        return Response(
+            {"detail": f"File must be UTF-8 encoded (line {bad_line}). Nothing was imported."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        report = import_patients(
+            lines,
+            fmt,
+            request.user,
+            dry_run=str(request.data.get("dry_run", "")).lower() == "true",
+        )
+    finally:
+        lines.detach()
+
+    return Response(report)
+
+
+PATIENT_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("patient_code", "patient_code"),
+    ("last_name", "last_name"),
+    ("first_name", "first_name"),
+    ("sex", "sex"),
+    ("date_of_birth", "date_of_birth"),
+    ("phone", "phone"),
+    ("address", "address"),
+    ("is_active", "is_active"),
+    ("created_at", "created_at"),
+    ("created_by_username", "created_by__username"),
+    ("last_visit_at", "last_visit_at"),
+    ("next_visit_at", "next_visit_at"),
+)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_patients(request):
+    """
+    GET /api/patients/export/?file_format=csv|ndjson&date_from=&date_to=&doctor=<user_id>
+    Stream every patient (archived included) as CSV or NDJSON. Admin only.
+
+    Dates filter on created_at, doctor on created_by (see config.exports).
+    """
+    if not _is_admin(request.user):
+        raise PermissionDenied("Only administrators can export patients.")
+
+    qs = (
+        Patient.objects
+        .filter(**export_filters(request, "created_at", "created_by_id"))
+        .order_by("id")
+    )
+    return export_response(request, qs, PATIENT_EXPORT_COLUMNS, "patients")
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def archive_patient(request, pk):
@@ -161,46 +355,257 @@ def restore_patient(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    if PatientMerge.objects.filter(merged_patient=patient).exists():
+        return Response(
+            {"detail": "Patient was merged into another patient and cannot be restored."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     patient.is_active = True
     patient.save()
     return Response({"detail": "Patient restored successfully."})
 
 
+def _bulk_ids(data):
+    """Parse {"ids": [...]} from a bulk request; returns (ids or None, error Response or None)."""
+    ids = data.get("ids")
+    if ids is None:
+        return None, None
+    try:
+        ids = {int(pk) for pk in ids} if isinstance(ids, list) else None
+    except (TypeError, ValueError):
+        ids = None
+    if not ids:
+        return None, Response(
+            {"detail": "ids must be a non-empty list of patient ids."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(ids) > MAX_BULK_IDS:
+        return None, Response(
+            {"detail": f"At most {MAX_BULK_IDS} ids per request."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return ids, None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_archive_patients(request):
+    """
+    POST /api/patients/archive/   {"ids": [1, 2, ...]} or {"inactive_years": N}
+    Archive many patients with a single UPDATE. Same rules as /<id>/archive/,
+    applied set-wise: admin can archive any, others only their own.
+
+    inactive_years selects active patients with no visit in N years and none scheduled.
+    Returns {"archived": n, "refused": [ids], "skipped": [already archived ids]}.
+    """
+    ids, error = _bulk_ids(request.data)
+    if error:
+        return error
+
+    inactive_years = request.data.get("inactive_years")
+    if ids is None:
+        try:
+            inactive_years = int(inactive_years)
+        except (TypeError, ValueError):
+            inactive_years = 0
+        if not 1 <= inactive_years <= MAX_INACTIVE_YEARS:
+            return Response(
+                {"detail": f"Send ids or inactive_years (between 1 and {MAX_INACTIVE_YEARS} years)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    return Response(bulk_archive(request.user, _is_admin(request.user), ids=ids, inactive_years=inactive_years))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_restore_patients(request):
+    """
+    POST /api/patients/restore/   {"ids": [1, 2, ...]}
+    Restore many archived patients with a single UPDATE. Admin only;
+    merged patients are refused.
+    Returns {"restored": n, "refused": [ids], "skipped": [already active ids]}.
+    """
+    if not _is_admin(request.user):
+        return Response(
+            {"detail": "Only administrators can restore patients."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    ids, error = _bulk_ids(request.data)
+    if error:
+        return error
+    if ids is None:
+        return Response(
+            {"detail": "ids must be a non-empty list of patient ids."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(bulk_restore(ids))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def merge_patient(request, pk):
+    """
+    POST /api/patients/<pk>/merge/   {"duplicate_id": <id>}
+    Merge a duplicate into patient <pk>: its visits, prescriptions,
+    appointments (with their SMS logs) and files move to <pk>, then it is
+    archived. One UPDATE per table, recorded in PatientMerge. Admin only.
+    """
+    if not _is_admin(request.user):
+        return Response(
+            {"detail": "Only administrators can merge patients."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    try:
+        duplicate_id = int(request.data.get("duplicate_id"))
+    except (TypeError, ValueError):
+        return Response(
+            {"detail": "duplicate_id must be a patient id."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        merge = merge_patients(pk, duplicate_id, request.user)
+    except MergeError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "id": merge.id,
+        "survivor": merge.survivor_id,
+        "merged_patient": merge.merged_patient_id,
+        "moved": merge.moved,
+        "merged_at": merge.merged_at,
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def latest_medical_history(request, patient_id):
     """
     GET /api/patients/<patient_id>/latest-medical-history/
-    Returns the most recent non-empty medical_history from the patient's visits.
+    Returns the most recent non-empty medical_history from the patient's visits
+    (read through its CarryForwardPointer, no scan of the visits).
     """
     get_object_or_404(Patient, pk=patient_id)
 
     medical_history = (
-        Visit.objects
-        .filter(patient_id=patient_id)
-        .exclude(medical_history="")
-        .order_by("-visit_date", "-created_at")
-        .values_list("medical_history", flat=True)
+        CarryForwardPointer.objects
+        .filter(patient_id=patient_id, field="medical_history")
+        .values_list("visit__medical_history", flat=True)
         .first()
     ) or ""
 
     return Response({"medical_history": medical_history})
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def carry_forward(request, patient_id):
+    """
+    GET /api/patients/<patient_id>/carry-forward/?fields=medical_history,treatment
+    Latest non-empty value of each carry-forward field, to pre-fill a new visit:
+    {"medical_history": {"value", "visit", "visit_date"}, ...}; fields without
+    a value are omitted.
+    """
+    get_object_or_404(Patient, pk=patient_id)
+
+    names = None
+    if request.query_params.get('fields'):
+        names = [name.strip() for name in request.query_params['fields'].split(',') if name.strip()]
+        unknown = set(names) - set(CARRY_FORWARD_FIELDS)
+        if unknown:
+            return Response(
+                {"detail": f"Unknown field(s): {', '.join(sorted(unknown))}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    return Response(carry_forward_values(patient_id, names))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def patient_chart(request, patient_id):
+    """
+    GET /api/patients/<patient_id>/chart/?limit=10&visits_limit=5
+    Patient, latest medical history, visits (with vitals), prescriptions,
+    appointments and files in one response, at a fixed number of queries.
+    Each section holds up to its limit (default 10, max 50) and a "next"
+    link to the matching list endpoint's ?cursor= page.
+    """
+    limits = section_limits(request.query_params)
+    patient = get_object_or_404(chart_queryset(with_latest_weight(Patient.objects.all()), limits), pk=patient_id)
+    return Response(build_chart(request, patient, limits))
+
+
+TIMELINE_DEFAULT_PAGE_SIZE = 20
+TIMELINE_MAX_PAGE_SIZE = 100
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def patient_timeline(request, patient_id):
+    """
+    GET /api/patients/<patient_id>/timeline/?page_size=20&types=visit,file&cursor=...
+    Visits, vitals, prescriptions, appointments, SMS reminders and files,
+    newest first, as {type, id, date, data} events. Follow "next" to scroll
+    back; every page costs the same whatever its depth.
+    """
+    get_object_or_404(Patient, pk=patient_id)
+
+    try:
+        page_size = int(request.query_params.get('page_size', TIMELINE_DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return Response({"detail": "page_size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = max(1, min(page_size, TIMELINE_MAX_PAGE_SIZE))
+
+    kinds = None
+    if request.query_params.get('types'):
+        kinds = {kind.strip() for kind in request.query_params['types'].split(',') if kind.strip()}
+        unknown = kinds - set(KIND_RANK)
+        if unknown:
+            return Response(
+                {"detail": f"Unknown event type(s): {', '.join(sorted(unknown))}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    token = request.query_params.get('cursor')
+    cursor = parse_cursor(token) if token else None
+    events, next_token = timeline_page(patient_id, cursor, page_size, kinds)
+
+    next_link = None
+    if next_token:
+        next_link = replace_query_param(request.build_absolute_uri(), 'cursor', next_token)
+    return Response({"next": next_link, "results": events})
+
+
+def _get_patient_for_upload(user, patient_id):
+    patient = get_object_or_404(Patient, pk=patient_id)
+
+    # Check ownership for create (object-level permission won't fire on create)
+    if not _is_admin(user) and patient.created_by != user:
+        raise PermissionDenied("You do not have permission to upload files for this patient.")
+    return patient
+
+
 class PatientFileViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing patient files.
 
     Endpoints:
     - GET    /api/patients/{patient_id}/files/          - List files
-    - POST   /api/patients/{patient_id}/files/          - Upload file
+    - POST   /api/patients/{patient_id}/files/          - Upload file (images re-encoded to WebP unless preserve_original=true)
     - GET    /api/patients/{patient_id}/files/{id}/     - Get file details
     - DELETE /api/patients/{patient_id}/files/{id}/     - Delete file
-    - GET    /api/patients/{patient_id}/files/{id}/download/ - Download file
+    - GET    /api/patients/{patient_id}/files/{id}/download/ - Download file (R2: presigned redirect)
+    - GET    /api/patients/{patient_id}/files/archive/  - All files as one streamed ZIP (?category=)
     """
     serializer_class = PatientFileSerializer
     permission_classes = [IsAuthenticated, IsPatientFileOwnerOrAdmin]
     parser_classes = [MultiPartParser, FormParser]
+    cursor_ordering = FILE_CURSOR_ORDERING
 
     def get_queryset(self):
         patient_id = self.kwargs.get('patient_id')
@@ -211,26 +616,243 @@ class PatientFileViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
-    def perform_create(self, serializer):
-        patient_id = self.kwargs.get('patient_id')
-        patient = get_object_or_404(Patient, pk=patient_id)
-
-        # Check ownership for create (object-level permission won't fire on create)
-        user = self.request.user
-        is_admin = hasattr(user, 'profile') and user.profile.role == 'admin'
-        if not is_admin and patient.created_by != user:
-            from rest_framework.exceptions import PermissionDenied
-            raise PermissionDenied("You do not have permission to upload files for this patient.")
+    def create(self, request, *args, **kwargs):
+        # Hash the file while the multipart body streams in (before request.data is parsed)
+        request.upload_handlers.insert(0, blobs.Sha256UploadHandler(request))
+        return super().create(request, *args, **kwargs)
 
-        serializer.save(patient=patient)
+    def perform_create(self, serializer):
+        patient = _get_patient_for_upload(self.request.user, self.kwargs.get('patient_id'))
+        serializer.save(patient=patient, sha256=blobs.uploaded_digest(self.request, 'file'))
 
     @action(detail=True, methods=['get'])
     def download(self, request, patient_id=None, pk=None):
-        """Download the file."""
+        """
+        Download the file.
+
+        R2 storage: 302 to a short-lived presigned URL so the transfer never
+        ties up a worker (?redirect=false returns {"url", "expires_in"} instead).
+        Local storage: served with ETag/If-None-Match and Range (resumable) support.
+        """
         file_obj = self.get_object()
-        response = FileResponse(
-            file_obj.file.open('rb'),
-            content_type=file_obj.file_type
+
+        if settings.R2_ENABLED:
+            url = presigned_url(file_obj.file, file_obj.original_filename, file_obj.file_type)
+            if request.query_params.get('redirect', '').lower() == 'false':
+                return Response({"url": url, "expires_in": settings.FILE_URL_EXPIRY_SECONDS})
+            return HttpResponseRedirect(url)
+
+        return ranged_file_response(
+            request,
+            file_obj.file,
+            file_obj.original_filename,
+            file_obj.file_type,
+            etag=f"{file_obj.pk}-{file_obj.file_size}-{file_obj.uploaded_at.timestamp():.0f}",
         )
-        response['Content-Disposition'] = f'attachment; filename="{file_obj.original_filename}"'
+
+
+    @action(detail=False, methods=['get'])
+    def archive(self, request, patient_id=None):
+        """
+        Every file of the patient (optionally ?category=) as a ZIP built while
+        it streams: one folder per category, constant memory whatever the total size.
+        """
+        patient = get_object_or_404(Patient, pk=patient_id)
+        files = self.get_queryset().order_by('category', 'uploaded_at', 'id')
+        category = request.query_params.get('category')
+        if category:
+            if category not in dict(PatientFile.CATEGORY_CHOICES):
+                return Response({"detail": f"Unknown category '{category}'."}, status=status.HTTP_400_BAD_REQUEST)
+            files = files.filter(category=category)
+
+        def entries():
+            seen = set()
+            for patient_file in files.iterator(chunk_size=200):
+                filename = patient_file.original_filename.replace('\\', '/').rsplit('/', 1)[-1] or f"file-{patient_file.pk}"
+                yield (
+                    unique_arcname(f"{patient_file.category}/{filename}", seen),
+                    patient_file.file,
+                    patient_file.file_size,
+                    timezone.localtime(patient_file.uploaded_at),
+                )
+
+        response = StreamingHttpResponse(zip_stream(entries()), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{patient.patient_code}-files.zip"'
+        response['Cache-Control'] = 'private, no-store'
         return response
+
+
+class PatientFileUploadViewSet(mixins.CreateModelMixin,
+                               mixins.RetrieveModelMixin,
+                               viewsets.GenericViewSet):
+    """
+    Chunked, resumable uploads for large patient files (see patients.services.uploads).
+
+    Endpoints:
+    - POST   /api/patients/{patient_id}/uploads/              - Open a session (already committed
+                                                                if its sha256 is stored)
+    - GET    /api/patients/{patient_id}/uploads/{id}/         - Status (offset to resume from)
+    - PUT    /api/patients/{patient_id}/uploads/{id}/         - Send a chunk (raw body, Upload-Offset header)
+    - POST   /api/patients/{patient_id}/uploads/{id}/commit/  - Create the PatientFile
+    - DELETE /api/patients/{patient_id}/uploads/{id}/         - Abort
+    """
+    serializer_class = PatientFileUploadSerializer
+    permission_classes = [IsAuthenticated, IsPatientFileOwnerOrAdmin]
+    lookup_value_regex = "[0-9a-f-]{36}"
+
+    def get_queryset(self):
+        patient_id = self.kwargs.get('patient_id')
+        return PatientFileUpload.objects.filter(patient_id=patient_id)
+
+    def perform_create(self, serializer):
+        patient = _get_patient_for_upload(self.request.user, self.kwargs.get('patient_id'))
+        sha256 = serializer.validated_data.get("sha256")
+        blob = blobs.find_blob(sha256) if sha256 else None
+
+        if blob is not None and blob.size == serializer.validated_data["total_size"]:
+            # Content already stored: nothing to transfer
+            with transaction.atomic():
+                session = serializer.save(patient=patient, uploaded_by=self.request.user)
+                self._create_patient_file(session, blob)
+            return
+
+        session = serializer.save(patient=patient, uploaded_by=self.request.user)
+        uploads.start_upload(session)
+        session.save(update_fields=["storage_name", "multipart_upload_id", "updated_at"])
+
+    def _create_patient_file(self, session, blob):
+        patient_file = PatientFile.objects.create(
+            patient_id=session.patient_id,
+            blob=blob,
+            file=blob.file.name,
+            original_filename=session.original_filename,
+            file_size=session.total_size,
+            file_type=session.file_type,
+            category=session.category,
+            description=session.description,
+            uploaded_by=session.uploaded_by,
+        )
+        session.status = "committed"
+        session.received_size = session.total_size
+        session.patient_file = patient_file
+        session.save(update_fields=["status", "received_size", "patient_file", "updated_at"])
+        return patient_file
+
+    def _chunk_error(self, detail, session, status_code=status.HTTP_400_BAD_REQUEST):
+        return Response({"detail": detail, "offset": session.received_size}, status=status_code)
+
+    def update(self, request, patient_id=None, pk=None):
+        """
+        PUT a chunk: raw bytes in the body, starting byte in the Upload-Offset
+        header (or ?offset=). A chunk that does not start at the current offset
+        is refused with 409 and the offset to resume from.
+        """
+        session = self.get_object()
+        if session.status != "open":
+            return self._chunk_error("Upload session is closed.", session, status.HTTP_409_CONFLICT)
+
+        try:
+            offset = int(request.headers.get("Upload-Offset", request.query_params.get("offset", "")))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return self._chunk_error("Upload-Offset and Content-Length must be integers.", session)
+
+        if offset != session.received_size:
+            return self._chunk_error("Chunk does not start at the current offset.", session, status.HTTP_409_CONFLICT)
+        if length <= 0:
+            return self._chunk_error("Empty chunk.", session)
+        if length > uploads.MAX_CHUNK_SIZE:
+            return self._chunk_error("Chunk is too large.", session, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        end = offset + length
+        if end > session.total_size:
+            return self._chunk_error("Chunk goes past the announced file size.", session)
+        if end < session.total_size and length < uploads.S3_MIN_PART_SIZE and uploads.requires_min_part_size():
+            return self._chunk_error(
+                f"Chunks except the last must be at least {uploads.S3_MIN_PART_SIZE} bytes.", session,
+            )
+
+        with SpooledTemporaryFile(max_size=uploads.CHUNK_SPOOL_MEMORY) as chunk:
+            # Read the body from the socket, never through request.data
+            shutil.copyfileobj(request.stream, chunk)
+            if chunk.tell() != length:
+                return self._chunk_error("Incomplete chunk, please resend it.", session)
+            chunk.seek(0)
+
+            with transaction.atomic():
+                session = PatientFileUpload.objects.select_for_update().get(pk=session.pk)
+                if offset != session.received_size:
+                    return self._chunk_error("Chunk does not start at the current offset.", session, status.HTTP_409_CONFLICT)
+                uploads.write_chunk(session, chunk, length)
+                session.received_size = end
+                session.save(update_fields=["received_size", "parts", "updated_at"])
+
+        return Response({"offset": session.received_size, "total_size": session.total_size})
+
+    def destroy(self, request, patient_id=None, pk=None):
+        """Abort the upload and discard the bytes received so far."""
+        session = self.get_object()
+        if session.status == "committed":
+            return Response(
+                {"detail": "Upload is already committed, delete the file instead."},
+                status=status.HTTP_409_CONFLICT
+            )
+        if session.status == "committing" and not uploads.is_stale_commit(session):
+            return Response(
+                {"detail": "Upload is being committed, try again later."},
+                status=status.HTTP_409_CONFLICT
+            )
+        if session.status in ("open", "committing"):
+            # Claim it so a concurrent commit or PUT cannot pick it up
+            claimed = PatientFileUpload.objects.filter(pk=session.pk, status=session.status).update(
+                status="aborted", updated_at=timezone.now()
+            )
+            if claimed:
+                uploads.abort_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, patient_id=None, pk=None):
+        """
+        Assemble the stored file, verify the announced sha256 if any, and
+        create the PatientFile row on the deduplicated blob.
+
+        The session is claimed as "committing" first: assembling and hashing
+        the stored file (up to PATIENT_FILE_UPLOAD_MAX_SIZE read back from
+        storage) then runs outside any transaction or row lock.
+        """
+        session = self.get_object()
+        claimed = PatientFileUpload.objects.filter(
+            pk=session.pk, status="open", received_size=F("total_size")
+        ).update(status="committing", updated_at=timezone.now())
+        if not claimed:
+            session.refresh_from_db()
+            if session.status != "open":
+                return self._chunk_error("Upload session is closed.", session, status.HTTP_409_CONFLICT)
+            return self._chunk_error("Upload is incomplete.", session, status.HTTP_409_CONFLICT)
+
+        try:
+            if session.multipart_upload_id:
+                uploads.finish_upload(session)
+                session.save(update_fields=["multipart_upload_id", "updated_at"])
+            sha256 = blobs.hash_stored_file(session.storage_name)
+        except Exception:
+            # Let the client retry the commit
+            PatientFileUpload.objects.filter(pk=session.pk).update(status="open", updated_at=timezone.now())
+            raise
+
+        if session.sha256 and sha256 != session.sha256:
+            uploads.file_storage().delete(session.storage_name)
+            session.status = "aborted"
+            session.save(update_fields=["status", "updated_at"])
+            return Response(
+                {"detail": "Checksum mismatch, the upload was discarded."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            # Move the assembled file under its hash (or drop it if already stored)
+            blob = blobs.adopt_stored_file(session.storage_name, session.total_size, sha256=sha256)
+            patient_file = self._create_patient_file(session, blob)
+
+        serializer = PatientFileSerializer(patient_file, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
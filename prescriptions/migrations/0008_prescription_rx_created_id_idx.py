@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patient_patient_name_id_idx'),
+        ('prescriptions', '0007_add_prescriber_to_prescription'),
+        ('visits', '0004_visit_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['-created_at', 'id'], name='rx_created_id_idx'),
+        ),
+    ]
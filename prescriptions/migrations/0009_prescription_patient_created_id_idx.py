@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0008_prescription_rx_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', '-created_at', 'id'], name='rx_patient_created_id_idx'),
+        ),
+    ]
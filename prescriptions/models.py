@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
 from visits.models import Visit
 
@@ -65,6 +67,14 @@ class Prescription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset (?cursor=) pagination of the prescription list
+            models.Index(fields=["-created_at", "id"], name="rx_created_id_idx"),
+            # Per-patient pages (patient chart, timeline)
+            models.Index(fields=["patient", "-created_at", "id"], name="rx_patient_created_id_idx"),
+        ]
+
     def __str__(self):
         return f"Rx #{self.pk} (Visit {self.visit_id})"
 
@@ -84,3 +94,20 @@ class PrescriptionItem(models.Model):
 
     def __str__(self):
         return f"{self.medication} for Rx #{self.prescription_id}"
+
+
+# Drop the cached PDF as soon as its prescription changes (documents.cache).
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+def invalidate_prescription_pdf(sender, instance, **kwargs):
+    from documents.cache import invalidate
+
+    invalidate("prescription", instance.pk)
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def invalidate_prescription_item_pdf(sender, instance, **kwargs):
+    from documents.cache import invalidate
+
+    invalidate("prescription", instance.prescription_id)
@@ -1,25 +1,26 @@
 # prescriptions/views.py
 import logging
-from io import BytesIO
 
-from django.http import HttpResponse
+from django.db.models import Prefetch
+from django.utils import timezone
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 logger = logging.getLogger(__name__)
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-from datetime import date
-from django.utils import timezone
+from config.exports import export_filters, export_response
+from documents import builders
+from documents.batch import DoctorCache, batch_filters, batch_response, bounded
+from documents.blocks import Doctor
+from documents.cache import pdf_response, prescription_fingerprint
+from documents.views import job_response
+from patients.permissions import _is_admin
+from visits.models import VitalSign
 
 from .models import Medication, Prescription, PrescriptionTemplate
 from .permissions import IsStaffOrReadOnly, IsDoctorOnly, IsAuthenticatedStaffRole
@@ -34,40 +35,6 @@ from .serializers import (
 )
 
 
-# PDF translations (French only)
-PDF_TRANSLATIONS = {
-    "title": "ORDONNANCE MÉDICALE",
-    "first_name": "Prénom :",
-    "last_name": "Nom :",
-    "age": "Âge :",
-    "weight": "Poids :",
-    "years": "ans",
-    "months": "mois",
-    "code": "Code :",
-    "visit_date": "Date de visite :",
-    "prescription_num": "Ordonnance N° :",
-    "created": "Créée le :",
-    "prescriber": "Prescripteur :",
-    "license": "N°COM :",
-    "department": "Service :",
-    "specialty": "Spécialité :",
-    "medications": "Médicaments",
-    "med_num": "N°",
-    "medication": "Médicament",
-    "dosage": "Posologie",
-    "route": "Voie",
-    "frequency": "Fréquence",
-    "duration": "Durée",
-    "instructions": "Instructions",
-    "no_medications": "Aucun médicament listé.",
-    "additional_notes": "Notes supplémentaires",
-    "signature": "Signature du prescripteur",
-    "date": "Date :",
-    "location": "Lieu :",
-    "stamp": "Cachet",
-}
-
-
 class MedicationViewSet(viewsets.ModelViewSet):
     queryset = Medication.objects.all().order_by("name")
     serializer_class = MedicationSerializer
@@ -98,6 +65,8 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         .order_by("-created_at")
     )
     permission_classes = [IsDoctorOnly]
+    # Stable ordering for ?cursor= pagination
+    cursor_ordering = ("-created_at", "id")
 
     def get_queryset(self):
         """
@@ -139,6 +108,70 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
             logger.error(f"Error creating prescription: {e}", exc_info=True)
             raise
 
+    # One row per prescribed item (prescriptions without items get one empty row)
+    EXPORT_COLUMNS = (
+        ("prescription_id", "id"),
+        ("created_at", "created_at"),
+        ("patient_id", "patient_id"),
+        ("patient_code", "patient__patient_code"),
+        ("visit_id", "visit_id"),
+        ("prescriber_id", "prescriber_id"),
+        ("prescriber_username", "prescriber__username"),
+        ("medication", "items__medication__name"),
+        ("strength", "items__medication__strength"),
+        ("form", "items__medication__form"),
+        ("dosage", "items__dosage"),
+        ("route", "items__route"),
+        ("frequency", "items__frequency"),
+        ("duration", "items__duration"),
+        ("instructions", "items__instructions"),
+    )
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """
+        GET /api/prescriptions/export/?file_format=csv|ndjson&date_from=&date_to=&doctor=<user_id>
+        Stream prescriptions flattened per item as CSV or NDJSON. Admin only.
+        Dates filter on created_at, doctor on prescriber.
+        """
+        if not _is_admin(request.user):
+            raise PermissionDenied("Only administrators can export prescriptions.")
+
+        qs = (
+            Prescription.objects
+            .filter(**export_filters(request, "created_at", "prescriber_id"))
+            .order_by("created_at", "id", "items__id")
+        )
+        return export_response(request, qs, self.EXPORT_COLUMNS, "prescriptions")
+
+    @action(detail=False, methods=["get"], url_path="pdf", permission_classes=[IsAuthenticated])
+    def batch_pdf(self, request):
+        """
+        GET /api/prescriptions/pdf/?ids=&patient=&date_from=&date_to=&doctor=<user_id>
+        Every matching prescription in one PDF, one per page, oldest first
+        (the day sheet: date_from=date_to=<day>). Dates filter on created_at,
+        doctor on prescriber. See documents.batch.
+        """
+        prescriptions = bounded(
+            Prescription.objects
+            .filter(**batch_filters(request, "created_at", "prescriber_id"))
+            .select_related("patient", "visit", "prescriber__profile")
+            .prefetch_related(
+                "items__medication",
+                Prefetch("visit__vital_signs", queryset=VitalSign.objects.order_by("-measured_at")),
+            )
+            .order_by("created_at", "id")
+        )
+        if not prescriptions:
+            return Response({"detail": "No prescriptions match."}, status=status.HTTP_404_NOT_FOUND)
+
+        doctors = DoctorCache()
+        stories = (
+            builders.prescription_flowables(rx, doctors.get(rx.prescriber or request.user))
+            for rx in prescriptions
+        )
+        return batch_response(stories, f"ordonnances_{timezone.localdate():%Y-%m-%d}.pdf")
+
     @action(detail=True, methods=["get"])
     def pdf(self, request, pk=None):
         """
@@ -147,262 +180,22 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         Uses the prescription's prescriber (doctor who created it), not the logged-in user.
         """
         rx = self.get_object()
-        t = PDF_TRANSLATIONS
-
-        # Get prescriber info from the prescription's prescriber, not the requesting user
-        # Fall back to requesting user only if prescriber is not set (for old prescriptions)
-        user = rx.prescriber if rx.prescriber else request.user
-
-        # Try to get profile info (license, department, specialty, bio, clinic_address, display_name)
-        license_number = ""
-        department = ""
-        specialty = ""
-        bio = ""
-        clinic_address = ""
-        display_name = ""
-        try:
-            if hasattr(user, 'profile'):
-                profile = user.profile
-                license_number = profile.license_number or ""
-                department = profile.department or ""
-                specialty = profile.specialization or ""
-                bio = profile.bio or ""
-                clinic_address = profile.clinic_address or ""
-                display_name = profile.display_name or ""
-        except Exception:
-            pass
-
-        # Use display_name if set, otherwise fall back to first/last name
-        if display_name:
-            prescriber_name = display_name
-        else:
-            prescriber_name = f"Dr. {user.first_name} {user.last_name}".strip()
-            if prescriber_name == "Dr.":
-                prescriber_name = f"Dr. {user.username}"
-
-        # Generate PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=20*mm,
-            leftMargin=20*mm,
-            topMargin=20*mm,
-            bottomMargin=20*mm,
+        # Prescriber of the prescription; the requesting user only for old ones without one
+        doctor = Doctor.from_user(rx.prescriber or request.user)
+
+        return pdf_response(
+            request, "prescription", rx.pk,
+            prescription_fingerprint(rx, doctor),
+            lambda: builders.prescription_pdf(rx, doctor),
+            f"ordonnance_{rx.id}.pdf",
         )
 
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=6,
-            alignment=1,  # Center
-            textColor=colors.HexColor('#1f2937'),
-        )
-        doctor_name_style = ParagraphStyle(
-            'DoctorName',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName='Helvetica-Bold',
-            spaceAfter=2,
-        )
-        doctor_info_style = ParagraphStyle(
-            'DoctorInfo',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#4b5563'),
-            spaceAfter=1,
-        )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=12,
-            spaceBefore=12,
-            spaceAfter=6,
-            textColor=colors.HexColor('#1f2937'),
-        )
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=4,
-        )
-
-        # Build content
-        content = []
-
-        # Doctor header at top left
-        # Line 1: Display name (bold, larger font)
-        content.append(Paragraph(prescriber_name, doctor_name_style))
-
-        # Line 2: Specialty (bold, normal font)
-        if specialty:
-            specialty_style = ParagraphStyle(
-                'SpecialtyStyle',
-                parent=styles['Normal'],
-                fontSize=11,
-                fontName='Helvetica-Bold',
-                spaceAfter=2,
-            )
-            content.append(Paragraph(specialty.upper(), specialty_style))
-
-        # Additional bio info (normal font) - for things like certifications, clinic hours
-        if bio:
-            for line in bio.split('\n'):
-                if line.strip():
-                    content.append(Paragraph(line.strip(), doctor_info_style))
-
-        content.append(Spacer(1, 15))
-
-        # Title centered
-        content.append(Paragraph(t["title"], title_style))
-        content.append(Spacer(1, 10))
-
-        # Prescription info
-        patient = rx.patient
-        patient_code = getattr(patient, 'patient_code', None) or "-"
-        created_date = rx.created_at.strftime("%d/%m/%Y %H:%M") if rx.created_at else "-"
-
-        # Calculate patient age
-        def calculate_age(birth_date):
-            today = date.today()
-            years = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-            if years < 2:
-                # For children under 2, show months
-                months = (today.year - birth_date.year) * 12 + today.month - birth_date.month
-                if today.day < birth_date.day:
-                    months -= 1
-                return f"{months} {t['months']}"
-            return f"{years} {t['years']}"
-
-        patient_age = calculate_age(patient.date_of_birth) if patient.date_of_birth else "-"
-
-        # Get latest weight from vitals (if visit is linked)
-        patient_weight = "-"
-        if rx.visit:
-            latest_vitals = rx.visit.vital_signs.order_by("-measured_at").first()
-            if latest_vitals and latest_vitals.weight_kg is not None:
-                patient_weight = f"{latest_vitals.weight_kg} kg"
-
-        # Patient info table with first name, last name, age, weight
-        patient_data = [
-            [t["first_name"], patient.first_name, t["last_name"], patient.last_name],
-            [t["age"], patient_age, t["weight"], patient_weight],
-            [t["created"], created_date, "", ""],
-        ]
-        patient_table = Table(patient_data, colWidths=[70, 140, 70, 120])
-        patient_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-            ('TEXTCOLOR', (2, 0), (2, -1), colors.grey),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        content.append(patient_table)
-        content.append(Spacer(1, 15))
-
-        # Medications section
-        content.append(Paragraph(t["medications"], heading_style))
-
-        items = rx.items.all()
-        if items.exists():
-            # Medications table header
-            med_data = [[t["med_num"], t["medication"], t["dosage"], t["route"], t["frequency"], t["duration"]]]
-            for i, item in enumerate(items, 1):
-                med_name = str(item.medication) if item.medication else "-"
-                med_data.append([
-                    str(i),
-                    med_name,
-                    item.dosage or "-",
-                    item.route or "-",
-                    item.frequency or "-",
-                    item.duration or "-",
-                ])
-
-            med_table = Table(med_data, colWidths=[25, 200, 80, 60, 90, 60])
-            med_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#374151')),
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ]))
-            content.append(med_table)
-
-            # Instructions for each medication
-            has_instructions = any(item.instructions for item in items)
-            if has_instructions:
-                content.append(Spacer(1, 10))
-                content.append(Paragraph(t["instructions"], heading_style))
-                for i, item in enumerate(items, 1):
-                    if item.instructions:
-                        med_name = str(item.medication) if item.medication else f"Item {i}"
-                        content.append(Paragraph(f"<b>{med_name}:</b> {item.instructions}", normal_style))
-        else:
-            content.append(Paragraph(t["no_medications"], normal_style))
-
-        # Notes section
-        if rx.notes:
-            content.append(Spacer(1, 15))
-            content.append(Paragraph(t["additional_notes"], heading_style))
-            # Handle multiline notes
-            for line in rx.notes.split('\n'):
-                if line.strip():
-                    content.append(Paragraph(line, normal_style))
-
-        # Prescriber section
-        content.append(Spacer(1, 30))
-
-        # Create prescriber info box
-        prescriber_data = [
-            [t["prescriber"], prescriber_name],
-        ]
-        if license_number:
-            prescriber_data.append([t["license"], license_number])
-        prescriber_data.append([t["date"], created_date])
-        if clinic_address:
-            # Join multiline address with commas for single-line display
-            address_single_line = ", ".join(line.strip() for line in clinic_address.split('\n') if line.strip())
-            prescriber_data.append([t["location"], address_single_line])
-
-        prescriber_table = Table(prescriber_data, colWidths=[100, 200])
-        prescriber_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        content.append(prescriber_table)
-
-        # Signature line
-        content.append(Spacer(1, 20))
-        signature_data = [
-            ["_" * 35, "_" * 25],
-            [t["signature"], t["stamp"]],
-        ]
-        signature_table = Table(signature_data, colWidths=[200, 150])
-        signature_table.setStyle(TableStyle([
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('TEXTCOLOR', (0, 1), (-1, 1), colors.grey),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        content.append(signature_table)
-
-        # Build PDF
-        doc.build(content)
-
-        # Return response
-        buffer.seek(0)
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="ordonnance_{rx.id}.pdf"'
-        return response
+    # Queuing a render only reads the prescription: anyone who can GET the PDF may
+    @action(detail=True, methods=["post"], url_path="pdf/jobs", permission_classes=[IsAuthenticated])
+    def pdf_jobs(self, request, pk=None):
+        """
+        POST /api/prescriptions/{id}/pdf/jobs/
+        Render the PDF in a worker process; poll the returned status_url.
+        """
+        rx = self.get_object()
+        return job_response(request, "prescription", rx, rx.prescriber or request.user)
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patient_patient_name_id_idx'),
+        ('visits', '0003_visit_created_by'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['-visit_date', 'id'], name='visit_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['patient', '-visit_date', 'id'], name='visit_patient_date_id_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 
@@ -45,6 +47,11 @@ class Visit(models.Model):
 
     class Meta:
         ordering = ["-visit_date"]
+        indexes = [
+            # Keyset (?cursor=) pagination of the visit list, globally and per patient
+            models.Index(fields=["-visit_date", "id"], name="visit_date_id_idx"),
+            models.Index(fields=["patient", "-visit_date", "id"], name="visit_patient_date_id_idx"),
+        ]
 
     def __str__(self):
         return f"Visit #{self.id} - {self.patient} - {self.visit_date:%Y-%m-%d}"
@@ -78,4 +85,49 @@ class VitalSign(models.Model):
         ordering = ["-measured_at"]
 
     def __str__(self):
-        return f"Vitals #{self.id} (Visit #{self.visit_id})"
\ No newline at end of file
+        return f"Vitals #{self.id} (Visit #{self.visit_id})"
+
+
+# Keep the denormalized last/next visit columns on Patient in sync.
+@receiver(pre_save, sender=Visit)
+def remember_previous_patient(sender, instance, **kwargs):
+    # A visit can be re-assigned to another patient; both need a refresh.
+    instance._previous_patient_id = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_patient_id = (
+            Visit.objects.filter(pk=instance.pk).values_list("patient_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def refresh_patient_visit_summary(sender, instance, **kwargs):
+    from patients.services.visit_summary import refresh_visit_summary
+
+    refresh_visit_summary({instance.patient_id, getattr(instance, "_previous_patient_id", None)})
+
+
+# Re-point the carry-forward fields (latest medical history, treatment...).
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def refresh_patient_carry_forward(sender, instance, **kwargs):
+    from patients.services.carry_forward import refresh_carry_forward
+
+    refresh_carry_forward({instance.patient_id, getattr(instance, "_previous_patient_id", None)})
+
+
+# Drop the cached visit summary PDF when the visit or its vitals change (documents.cache).
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def invalidate_visit_summary_pdf(sender, instance, **kwargs):
+    from documents.cache import invalidate
+
+    invalidate("visit_summary", instance.pk)
+
+
+@receiver(post_save, sender=VitalSign)
+@receiver(post_delete, sender=VitalSign)
+def invalidate_vital_sign_pdfs(sender, instance, **kwargs):
+    from documents.cache import invalidate
+
+    invalidate("visit_summary", instance.visit_id)
@@ -5,12 +5,18 @@ from .views import (
     VitalSignListCreateAPIView,
     VitalSignDetailAPIView,
     visit_summary_pdf,
+    visit_summaries_pdf,
+    visit_summary_pdf_jobs,
+    export_visits,
 )
 
 urlpatterns = [
     path("", VisitListCreateAPIView.as_view(), name="visit-list-create"),
+    path("export/", export_visits, name="visit-export"),
+    path("pdf/", visit_summaries_pdf, name="visit-summaries-pdf"),
     path("<int:pk>/", VisitDetailAPIView.as_view(), name="visit-detail"),
     path("<int:pk>/pdf/", visit_summary_pdf, name="visit-summary-pdf"),
+    path("<int:pk>/pdf/jobs/", visit_summary_pdf_jobs, name="visit-summary-pdf-jobs"),
 
     path("vitals/", VitalSignListCreateAPIView.as_view(), name="vitals-list-create"),
     path("vitals/<int:pk>/", VitalSignDetailAPIView.as_view(), name="vitals-detail"),